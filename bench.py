@@ -0,0 +1,887 @@
+import os
+import errno
+import sys
+import time
+import wave
+import base64
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from mutagen import File as MutagenFile
+from mutagen.id3 import ID3, TIT2, TPE1, TALB, APIC
+from mutagen.flac import FLAC, Picture
+from mutagen.mp4 import MP4, MP4Cover
+from mutagen.ogg import OggPage
+from mutagen.oggvorbis import OggVorbis
+
+import main
+
+# run with `python bench.py [name ...]`, no names runs everything
+BENCHMARKS = {}
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+class CountingFile:
+    # file wrapper that counts the bytes actually read
+    def __init__(self, path, counter):
+        self.f = open(path, 'rb')
+        self.name = path
+        self.counter = counter
+
+    def read(self, n=-1):
+        data = self.f.read(n)
+        self.counter[0] += len(data)
+        return data
+
+    def seek(self, *args):
+        return self.f.seek(*args)
+
+    def tell(self):
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# synthetic library files
+
+def write_mp3(path, title, artist, art=None, frames=400, album="Album"):
+    # mpeg1 layer 3, 128 kbps, 44.1 kHz frames of 417 bytes
+    with open(path, 'wb') as f:
+        for i in range(frames):
+            f.write(b'\xff\xfb\x90\x00' + bytes([i % 251]) * 413)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text=title))
+    tags.add(TPE1(encoding=3, text=artist))
+    tags.add(TALB(encoding=3, text=album))
+    if art:
+        tags.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='', data=art))
+    tags.save(path)
+
+def write_flac(path, title, artist, art=None, seconds=10, album="Album", payload=200000):
+    rate, channels, bits = 44100, 2, 16
+    info = bytearray(34)
+    info[0:2] = info[2:4] = (4096).to_bytes(2, 'big')
+    info[10:18] = ((rate << 44) | ((channels - 1) << 41) | ((bits - 1) << 36) | rate * seconds).to_bytes(8, 'big')
+    with open(path, 'wb') as f:
+        f.write(b'fLaC\x80' + (34).to_bytes(3, 'big') + bytes(info))
+        f.write(b'\xff\xf8' + os.urandom(payload))
+    audio = FLAC(path)
+    audio['title'] = title
+    audio['artist'] = artist
+    audio['album'] = album
+    if art:
+        picture = Picture()
+        picture.type = 3
+        picture.mime = 'image/jpeg'
+        picture.data = art
+        audio.add_picture(picture)
+    audio.save()
+
+def atom(kind, body):
+    return struct.pack('>I', 8 + len(body)) + kind + body
+
+def write_m4a(path, title, artist, art=None, seconds=10, album="Album", payload=200000):
+    mvhd = atom(b'mvhd', bytes(12) + struct.pack('>II', 1000, seconds * 1000) + bytes(80))
+    mdhd = atom(b'mdhd', bytes(12) + struct.pack('>II', 44100, seconds * 44100) + bytes(4))
+    hdlr = atom(b'hdlr', bytes(8) + b'soun' + bytes(13))
+    moov = atom(b'moov', mvhd + atom(b'trak', atom(b'mdia', mdhd + hdlr)))
+    with open(path, 'wb') as f:
+        f.write(atom(b'ftyp', b'M4A \0\0\0\0M4A mp42isom') + moov + atom(b'mdat', os.urandom(payload)))
+    audio = MP4(path)
+    audio['\xa9nam'] = title
+    audio['\xa9ART'] = artist
+    audio['\xa9alb'] = album
+    if art:
+        audio['covr'] = [MP4Cover(art, MP4Cover.FORMAT_JPEG)]
+    audio.save()
+
+def write_ogg(path, title, artist, art=None, seconds=10, album="Album", payload=200000):
+    ident = b'\x01vorbis' + struct.pack('<IBIiii', 0, 2, 44100, 0, 128000, 0) + b'\xb8\x01'
+    comment = b'\x03vorbis' + struct.pack('<I', 4) + b'test' + struct.pack('<I', 0) + b'\x01'
+    setup = b'\x05vorbis' + bytes(40)
+    chunk = 4000
+    count = payload // chunk
+    packets = [[ident], [comment, setup]] + [[os.urandom(chunk)] for _ in range(count)]
+    with open(path, 'wb') as f:
+        for i, page_packets in enumerate(packets):
+            page = OggPage()
+            page.packets = page_packets
+            page.serial = 1
+            page.sequence = i
+            page.first = i == 0
+            page.last = i == len(packets) - 1
+            page.position = 44100 * seconds * (i - 1) // count if i > 1 else 0
+            f.write(page.write())
+    audio = OggVorbis(path)
+    audio['title'] = title
+    audio['artist'] = artist
+    audio['album'] = album
+    if art:
+        picture = Picture()
+        picture.type = 3
+        picture.mime = 'image/jpeg'
+        picture.data = art
+        audio['metadata_block_picture'] = [base64.b64encode(picture.write()).decode('ascii')]
+    audio.save()
+
+def write_wav(path, title, artist, art=None, seconds=2, album="Album"):
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(os.urandom(44100 * 4 * seconds))
+
+    def item(kind, value):
+        value = value.encode('utf-8') + b'\0'
+        return kind + struct.pack('<I', len(value)) + value + (b'\0' if len(value) & 1 else b'')
+
+    info = b'INFO' + item(b'INAM', title) + item(b'IART', artist) + item(b'IPRD', album)
+    with open(path, 'r+b') as f:
+        f.seek(0, 2)
+        f.write(b'LIST' + struct.pack('<I', len(info)) + info)
+        size = f.tell() - 8
+        f.seek(4)
+        f.write(struct.pack('<I', size))
+
+WRITERS = {
+    'mp3': write_mp3,
+    'flac': write_flac,
+    'm4a': write_m4a,
+    'ogg': write_ogg,
+    'wav': write_wav,
+}
+
+def make_library(folder, count, art_size=2 * 1024 * 1024):
+    art = b'\xff\xd8\xff\xe0' + os.urandom(art_size)
+    paths = []
+    for i in range(count):
+        if i % 2:
+            path = os.path.join(folder, f"track{i:04d}.flac")
+            write_flac(path, f"Track {i}", f"Artist {i % 7}", art)
+        else:
+            path = os.path.join(folder, f"track{i:04d}.mp3")
+            write_mp3(path, f"Track {i}", f"Artist {i % 7}", art)
+        paths.append(path)
+    return paths
+
+def report(name, rows):
+    print(f"\n== {name}")
+    for row in rows:
+        print("  " + row)
+
+@benchmark
+def header_scan(count=40):
+    # full mutagen parse vs header-only read on files with 2 MB covers
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_library(folder, count)
+
+        full_bytes = [0]
+        start = time.perf_counter()
+        for path in paths:
+            with CountingFile(path, full_bytes) as f:
+                MutagenFile(f)
+        full_time = time.perf_counter() - start
+
+        fast_bytes = [0]
+        start = time.perf_counter()
+        for path in paths:
+            main.read_header_tags(path, opener=lambda p, mode: CountingFile(p, fast_bytes))
+        fast_time = time.perf_counter() - start
+
+    report("header_scan", [
+        f"files: {count}",
+        f"mutagen full parse: {full_bytes[0] / 1e6:8.2f} MB read, {full_time * 1000:8.1f} ms",
+        f"header-only read:   {fast_bytes[0] / 1e6:8.2f} MB read, {fast_time * 1000:8.1f} ms",
+        f"reduction: {full_bytes[0] / max(fast_bytes[0], 1):.0f}x bytes, {full_time / max(fast_time, 1e-9):.1f}x time",
+    ])
+
+@benchmark
+def format_readers(count=50):
+    # per-format throughput of the header readers against a full mutagen parse
+    art = b'\xff\xd8\xff\xe0' + os.urandom(512 * 1024)
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        for ext, writer in WRITERS.items():
+            paths = []
+            for i in range(count):
+                path = os.path.join(folder, f"{ext}{i:04d}.{ext}")
+                writer(path, f"Track {i}", "Artist", art)
+                paths.append(path)
+
+            start = time.perf_counter()
+            for path in paths:
+                MutagenFile(path)
+            full_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for path in paths:
+                main.read_header_tags(path)
+            fast_time = time.perf_counter() - start
+
+            rows.append(f"{ext:5} mutagen {count / full_time:9.0f} files/s   "
+                        f"header reader {count / fast_time:9.0f} files/s   "
+                        f"{full_time / fast_time:5.1f}x")
+    report("format_readers", rows)
+
+class ThrottledFS:
+    # stand-in for an NFS/SMB mount or a sleeping disk: the first open of a
+    # file costs `latency`, bytes not read before cost 1/`rate` s each, and
+    # anything read once stays cached like the page cache would keep it
+    def __init__(self, latency=0.2, rate=10e6):
+        self.latency = latency
+        self.rate = rate
+        self.opened = set()
+        self.warm = {}  # path -> bytes already fetched from the "server"
+        self.lock = threading.Lock()
+
+    def open(self, path, mode='rb'):
+        with self.lock:
+            first = path not in self.opened
+            self.opened.add(path)
+        if first:
+            time.sleep(self.latency)
+        return ThrottledFile(self, path)
+
+class ThrottledFile:
+    def __init__(self, fs, path):
+        self.fs = fs
+        self.f = open(path, 'rb')
+        self.path = path
+
+    def read(self, n=-1):
+        start = self.f.tell()
+        data = self.f.read(n)
+        with self.fs.lock:
+            warm = self.fs.warm.get(self.path, 0)
+            cold = max(0, start + len(data) - max(start, warm))
+            self.fs.warm[self.path] = max(warm, start + len(data))
+        time.sleep(cold / self.fs.rate)
+        return data
+
+    def seek(self, *args):
+        return self.f.seek(*args)
+
+    def tell(self):
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@benchmark
+def prefetch(tracks=4, track_size=8 * 1024 * 1024, head=2 * 1024 * 1024):
+    # time for the player's first read of the next track on a throttled mount,
+    # cold vs warmed by the prefetcher in both modes
+    def first_read(fs, path):
+        start = time.perf_counter()
+        with fs.open(path) as f:
+            f.read(head)
+        return time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for i in range(tracks):
+            path = os.path.join(folder, f"track{i}.flac")
+            with open(path, 'wb') as f:
+                f.write(os.urandom(track_size))
+            paths.append(path)
+
+        cold = first_read(ThrottledFS(), paths[1])
+
+        fs = ThrottledFS()
+        prefetcher = main.TrackPrefetcher(ahead=2, track_bytes=track_size, delay=0, opener=fs.open)
+        prefetcher.prefetch(paths[1:])
+        while prefetcher.bytes_warmed < 2 * track_size:
+            time.sleep(0.01)
+        advised = first_read(fs, paths[1])
+        prefetcher.stop()
+
+        fs = ThrottledFS()
+        prefetcher = main.TrackPrefetcher(ahead=2, mode='stage', delay=0, opener=fs.open,
+                                          stage_dir=os.path.join(folder, "staging"))
+        prefetcher.prefetch(paths[1:])
+        while prefetcher.local_path(paths[2]) == paths[2]:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        with open(prefetcher.local_path(paths[1]), 'rb') as f:
+            f.read(head)
+        staged = time.perf_counter() - start
+        prefetcher.stop()
+
+    report("prefetch", [
+        f"throttled mount: 200 ms first open, 10 MB/s, {head // (1024 * 1024)} MB read at track start",
+        f"cold:             {cold * 1000:8.1f} ms",
+        f"advise prefetch:  {advised * 1000:8.1f} ms",
+        f"staged copy:      {staged * 1000:8.1f} ms",
+    ])
+
+class LatencyFS:
+    # stand-in for a NAS: every listing and file open costs `latency` plus some
+    # jitter, and the server only works on `capacity` requests at a time, the
+    # rest queue up behind them. with `refuse` set, reads arriving while that
+    # many are queued fail with EBUSY like an overloaded share
+    def __init__(self, latency=0.01, capacity=12, refuse=None):
+        self.latency = latency
+        self.slots = threading.Semaphore(capacity)
+        self.calls = 0
+        self.refuse = refuse
+        self.queued = 0
+        self.refused = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.slots:
+            self.calls += 1
+            time.sleep(self.latency * (0.8 + 0.4 * (self.calls % 5) / 4))
+
+    def listdir(self, path):
+        self.wait()
+        return main.list_directory(path)
+
+    def read_file(self, path):
+        with self.lock:
+            busy = self.refuse is not None and self.queued >= self.refuse
+            if busy:
+                self.refused += 1
+            else:
+                self.queued += 1
+        if busy:
+            # the refusal still costs a round trip
+            time.sleep(self.latency)
+            raise OSError(errno.EBUSY, "server busy", path)
+        try:
+            self.wait()
+        finally:
+            with self.lock:
+                self.queued -= 1
+        return main.read_header_tags(path)
+
+@benchmark
+def adaptive_scan(folders=20, per_folder=30):
+    # library walk against a 10 ms round trip mount, one request at a time like
+    # os.walk did vs the self-tuning scanner, and the scanner against a share
+    # that turns reads away when too many queue up
+    def run(controller, fs=None):
+        fs = fs or LatencyFS()
+        scanner = main.AdaptiveScanner(fs.read_file, listdir=fs.listdir, controller=controller)
+        found = []
+        on_dir = lambda root, files: [(os.path.join(root, name), None) for name in files]
+        start = time.perf_counter()
+        scanner.scan(folder, on_dir, lambda path, context, result: found.append(result))
+        return time.perf_counter() - start, len(found), controller
+
+    with tempfile.TemporaryDirectory() as folder:
+        for d in range(folders):
+            sub = os.path.join(folder, f"album{d:02d}")
+            os.mkdir(sub)
+            for i in range(per_folder):
+                write_mp3(os.path.join(sub, f"track{i:02d}.mp3"), f"Track {i}", "Artist", frames=4)
+
+        serial, files, _ = run(main.ConcurrencyController(start=1, minimum=1, maximum=1))
+        adaptive, _, controller = run(main.ConcurrencyController(window=0.2))
+        busy_fs = LatencyFS(refuse=10)
+        busy, _, busy_controller = run(main.ConcurrencyController(window=0.2), busy_fs)
+
+    steps = " -> ".join(str(limit) for limit, _, _, _ in controller.history)
+    busy_steps = " -> ".join(str(limit) for limit, _, _, _ in busy_controller.history)
+    report("adaptive_scan", [
+        f"{files} files in {folders} folders, 10 ms per request, server takes 12 at once",
+        f"sequential:  {serial * 1000:8.1f} ms  {files / serial:7.0f} files/s",
+        f"adaptive:    {adaptive * 1000:8.1f} ms  {files / adaptive:7.0f} files/s  ({serial / adaptive:.1f}x)",
+        f"concurrency: {steps} -> {controller.limit}",
+        f"busy share:  {busy * 1000:8.1f} ms  {busy_fs.refused} reads refused over 10 queued",
+        f"concurrency: {busy_steps} -> {busy_controller.limit}",
+    ])
+
+@benchmark
+def library_table(rows=200000):
+    # sort clicks and page fetches on the library table, against a 16 ms frame
+    words = ["Love", "Night", "Émilie", "river", "Zero", "the", "Ångström", "blue", "Fire", "éclair"]
+    songs = [{
+        'title': f"{words[i % 10]} {words[i * 7 % 10]} {i}",
+        'artist': f"{words[i * 3 % 10]} Band {i % 900}",
+        'album': f"{words[i % 7]} Album {i % 9000}",
+        'duration': 120 + i % 300,
+        'format': ('MP3', 'FLAC', 'M4A')[i % 3],
+        'added_at': 1.7e9 + i * 37 % 100000,
+    } for i in range(rows)]
+    model = main.LibraryModel()
+
+    start = time.perf_counter()
+    for _, field in model.COLUMNS:
+        main.sort_keys(songs, field)
+    keys = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.set_songs(songs)
+    load = time.perf_counter() - start
+    while len(model.keys) < len(model.COLUMNS):
+        time.sleep(0.01)  # background collation
+
+    timings = []
+    for column, order in ((1, 0), (2, 0), (0, 1), (3, 1), (5, 0), (1, 1)):
+        start = time.perf_counter()
+        model.sort(column, main.Qt.SortOrder(order))
+        for row in range(40):  # one screen of rows
+            for c in range(len(model.COLUMNS)):
+                model.data(model.index(row, c))
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    while model.canFetchMore():
+        model.fetchMore()
+    fetch = (time.perf_counter() - start) / (rows / model.PAGE)
+
+    report("library_table", [
+        f"rows: {rows}",
+        f"set_songs:                 {load * 1000:8.1f} ms",
+        f"collation keys, all cols: {keys * 1000:8.1f} ms",
+        f"sort + first screen:       {max(timings) * 1000:8.1f} ms worst, {sum(timings) / len(timings) * 1000:.1f} ms mean",
+        f"fetchMore page:            {fetch * 1000:8.3f} ms",
+    ])
+
+@benchmark
+def aggregates(rows=200000, artists=100):
+    # artist/album groups kept while ingesting vs scanning the library per open
+    songs = [{
+        'path': f"/music/{i}.mp3",
+        'title': f"Track {i}",
+        'artist': f"Artist {i % artists}",
+        'album': f"Album {i % (artists * 20)}",
+        'duration': 200.0,
+        'art_key': None,
+    } for i in range(rows)]
+    groups = main.LibraryAggregates()
+
+    start = time.perf_counter()
+    for song in songs:
+        groups.add(song)
+    ingest = (time.perf_counter() - start) / rows
+
+    start = time.perf_counter()
+    scanned = [song for song in songs if song['artist'] == "Artist 7"]
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    group = groups.group('artist', main.collation_key("Artist 7"))
+    tracks, duration = len(group['tracks']), group['duration']
+    lookup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for song in songs[:rows // 10]:
+        groups.remove(song['path'])
+    remove = (time.perf_counter() - start) / (rows // 10)
+
+    report("aggregates", [
+        f"rows: {rows}, {tracks} tracks per artist ({len(scanned)} by scan)",
+        f"add per track:            {ingest * 1e6:8.2f} us",
+        f"remove per track:         {remove * 1e6:8.2f} us",
+        f"open artist, scan:        {scan * 1000:8.2f} ms",
+        f"open artist, aggregate:   {lookup * 1000:8.4f} ms ({duration / 3600:.0f} h total)",
+    ])
+
+@benchmark
+def playlist_import(entries=50000):
+    # a 50k entry m3u streamed through the event loop: total time, the longest
+    # the gui waits on one slice, and exporting it back out
+    from PyQt6.QtCore import QCoreApplication
+    app = QCoreApplication.instance() or QCoreApplication([])
+    songs = {f"/music/a{i % 500}/t{i}.mp3": {'path': f"/music/a{i % 500}/t{i}.mp3", 'title': f"T{i}",
+                                            'artist': "A", 'duration': 200} for i in range(entries)}
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, "big.m3u")
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write("#EXTM3U\n")
+            for i, path in enumerate(songs):
+                f.write(f"#EXTINF:200,A - T{i}\n{path if i % 100 else path + '.missing'}\n")
+
+        importer = main.PlaylistImporter(source, songs.get)
+        done = []
+        importer.finished.connect(done.append)
+        slices = []
+        start = time.perf_counter()
+        importer.start()
+        while not done:
+            tick = time.perf_counter()
+            app.processEvents()
+            slices.append(time.perf_counter() - tick)
+        total = time.perf_counter() - start
+        playlist = done[0]
+
+        start = time.perf_counter()
+        main.write_m3u8(os.path.join(folder, "out.m3u8"), ((song['path'], song) for song in playlist.tracks.values()))
+        export = time.perf_counter() - start
+
+    report("playlist_import", [
+        f"entries: {len(playlist.entries)}, resolved {len(playlist.tracks)}, unresolved {len(playlist.unresolved)}",
+        f"import:          {total * 1000:8.1f} ms in {len(slices)} event loop turns",
+        f"longest turn:    {max(slices) * 1000:8.1f} ms",
+        f"export m3u8:     {export * 1000:8.1f} ms",
+    ])
+
+# what every card carried before the application style sheet
+LEGACY_CARD_STYLES = {
+    'card': """
+        QWidget { background-color: #181818; border-radius: 8px; }
+        QWidget:hover { background-color: #282828; }
+    """,
+    'album_art': "background-color: #282828; border-radius: 8px; font-size: 48px;",
+    'title_label': "color: white; font-weight: bold; font-size: 13px;",
+    'artist_label': "color: #b3b3b3; font-size: 12px;",
+}
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, kB on linux
+
+def build_cards(styling, count):
+    # runs in a fresh process per styling so the memory numbers don't mix.
+    # cards are polished (style sheets applied) but not laid out, layout
+    # costs the same either way
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    if styling == "shared":
+        main.theme.apply(app)
+    cards = []
+    before = rss_mb()
+    start = time.perf_counter()
+    for i in range(count):
+        card = main.MusicCard(f"Track {i}", f"Artist {i % 50}", f"/music/{i}.mp3")
+        if styling == "per-widget":
+            card.setStyleSheet(LEGACY_CARD_STYLES['card'])
+            for name in ('album_art', 'title_label', 'artist_label'):
+                getattr(card, name).setStyleSheet(LEGACY_CARD_STYLES[name])
+        card.ensurePolished()
+        for child in (card.album_art, card.title_label, card.artist_label):
+            child.ensurePolished()
+        cards.append(card)
+    return time.perf_counter() - start, rss_mb() - before
+
+@benchmark
+def card_styles(count=5000):
+    # 5k cards styled one sheet per widget (as before) vs the shared style sheet
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    rows = []
+    for styling in ("per-widget", "shared"):
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            seconds, memory = pool.submit(build_cards, styling, count).result()
+        rows.append(f"{styling:<11} {seconds * 1000:8.1f} ms  {seconds / count * 1e6:6.0f} us/card  +{memory:6.1f} MB")
+    report("card_styles", [f"{count} cards"] + rows)
+
+@benchmark
+def navigation(rows=200000, hits=5000):
+    # a search with 5k hits, then back to it from another page: running the
+    # search again vs restoring the page state the history kept
+    import contextlib
+    import types
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    songs = [{'path': f"/music/{i}.mp3", 'title': f"Needle {i}" if i % (rows // hits) == 0 else f"Track {i}",
+              'artist': f"Artist {i % 900}", 'art_key': None} for i in range(rows)]
+    window = types.SimpleNamespace(
+        music_library=songs, visible_songs=lambda: songs,
+        watchdog=types.SimpleNamespace(action=lambda name: contextlib.nullcontext()),
+        memory=main.MemoryGovernor(budget_mb=64, loader=lambda key: None),
+    )
+    page = main.SearchPage(window)
+    page.show()
+
+    start = time.perf_counter()
+    page.search_input.setText("needle")
+    app.processEvents()
+    search = time.perf_counter() - start
+    state = page.save_state()
+    page.search_input.setText("track")
+    app.processEvents()
+
+    start = time.perf_counter()
+    page.restore_state(state)
+    app.processEvents()
+    restore = time.perf_counter() - start
+
+    report("navigation", [
+        f"{rows} songs, {len(state['results'])} hits",
+        f"search again:    {search * 1000:8.2f} ms",
+        f"restore state:   {restore * 1000:8.2f} ms",
+    ])
+
+@benchmark
+def control_batch(tracks=5000):
+    # queueing a whole album collection from a script: one request per track,
+    # one json-rpc batch array, and one enqueue call carrying every path
+    import json
+    import socket
+    from PyQt6.QtCore import QCoreApplication
+    app = QCoreApplication.instance() or QCoreApplication([])
+
+    class Handler:
+        METHODS = {'enqueue'}
+
+        def __init__(self):
+            self.queue = []
+
+        def __call__(self, method, params):
+            self.queue.extend(params['paths'])
+            return len(self.queue)
+
+    paths = [f"/music/album{i // 12:04d}/track{i % 12:02d}.flac" for i in range(tracks)]
+    request = lambda i, chunk: {'jsonrpc': '2.0', 'id': i, 'method': 'enqueue', 'params': {'paths': chunk}}
+    styles = [
+        ("one call per track", [json.dumps(request(i, [path])) for i, path in enumerate(paths)]),
+        ("one batch array", [json.dumps([request(i, [path]) for i, path in enumerate(paths)])]),
+        ("one call, all paths", [json.dumps(request(0, paths))]),
+    ]
+    with tempfile.TemporaryDirectory() as folder:
+        handler = Handler()
+        server = main.ControlServer(os.path.join(folder, "control.sock"), handler)
+        server.start()
+        while server.loop is None:
+            time.sleep(0.01)
+        rows = []
+        for label, lines in styles:
+            done = []
+
+            def client():
+                with socket.socket(socket.AF_UNIX) as sock:
+                    sock.connect(str(server.path))
+                    stream = sock.makefile('rwb')
+                    start = time.perf_counter()
+                    for line in lines:
+                        stream.write(line.encode('utf-8') + b"\n")
+                        stream.flush()
+                        stream.readline()
+                    done.append(time.perf_counter() - start)
+
+            handler.queue.clear()
+            thread = threading.Thread(target=client)
+            thread.start()
+            while not done:
+                app.processEvents()
+            thread.join()
+            rows.append(f"{label:<20} {done[0] * 1000:8.1f} ms  {len(lines):5d} round trips  queued {len(handler.queue)}")
+        server.stop()
+
+    report("control_batch", rows)
+
+@benchmark
+def startup(tracks=2000):
+    # `main.py song.mp3` and `main.py song.mp3 ~/Music` as separate processes,
+    # from launch to the first decoded position; needs an audio output
+    import subprocess
+
+    def launch(args, home):
+        env = dict(os.environ, HOME=home, MYMUSIC_TRACE_STARTUP="1", MYMUSIC_SINGLE_INSTANCE="0")
+        start = time.time()
+        proc = subprocess.Popen([sys.executable, main.__file__, *args], env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        stamps = {}
+        timer = threading.Timer(30, proc.kill)  # no audio device, no first audio
+        timer.start()
+        for line in proc.stdout:
+            if line.startswith("startup: "):
+                event, _, stamp = line[9:].rpartition(" at ")
+                stamps[event] = float(stamp) - start
+                if event == "first audio":
+                    break
+        timer.cancel()
+        proc.kill()
+        proc.wait()
+        return stamps
+
+    def row(label, stamps):
+        times = [f"{stamps[event] * 1000:8.1f} ms" if event in stamps else "     n/a   "
+                 for event in ("window shown", "first audio")]
+        return f"{label:<22} window {times[0]}   first audio {times[1]}"
+
+    with tempfile.TemporaryDirectory() as folder:
+        song = os.path.join(folder, "song.mp3")
+        write_mp3(song, "Song", "Artist", frames=2000)
+        library = os.path.join(folder, "library")
+        os.mkdir(library)
+        for i in range(tracks):
+            write_mp3(os.path.join(library, f"track{i:04d}.mp3"), f"Track {i}", f"Artist {i % 7}", frames=40)
+        home = os.path.join(folder, "home")
+        os.mkdir(home)
+        rows = [
+            row("file", launch([song], home)),
+            row(f"file + {tracks} folder", launch([song, library], home)),
+        ]
+
+    report("startup", rows)
+
+@benchmark
+def library_roots(roots=4, tracks=2400):
+    # one of several library disks goes offline and comes back. one index for
+    # everything had to rescan every disk; with a shard per root the others
+    # are untouched and the returning one is loaded from its rows. disks sit
+    # behind a 10 ms round trip mount
+    import heapq
+
+    def scan(folder):
+        fs = LatencyFS()
+        scanner = main.AdaptiveScanner(fs.read_file, listdir=fs.listdir, controller=main.ConcurrencyController(window=0.2))
+        songs = []
+
+        def on_file(path, context, tags):
+            stat = os.stat(path)
+            songs.append({'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime,
+                          'title': tags['fields'].get('title'), 'artist': tags['fields'].get('artist')})
+
+        on_dir = lambda root, files: [(os.path.join(root, name), None) for name in files]
+        scanner.scan(folder, on_dir, on_file)
+        return sorted(songs, key=lambda song: song['path'])
+
+    with tempfile.TemporaryDirectory() as folder:
+        library = main.LibraryRoots(os.path.join(folder, "roots.json"), os.path.join(folder, "shards"))
+        for r in range(roots):
+            root = os.path.join(folder, f"disk{r}")
+            os.mkdir(root)
+            for i in range(tracks // roots):
+                write_mp3(os.path.join(root, f"track{i:04d}.mp3"), f"Track {i}", f"Artist {r}", frames=4)
+            library.add(root)
+        single = main.LibraryIndex(os.path.join(folder, "library.db"))
+        songs = []
+
+        start = time.perf_counter()
+        for root in library.mounted():
+            songs.extend(scan(root))
+        single.sync(songs)
+        rescan = time.perf_counter() - start
+        library.sync(songs)
+
+        offline = library.mounted()[1]
+        prefix = main.path_prefix(offline)
+        start = time.perf_counter()
+        remaining = [song for song in songs if not song['path'].startswith(prefix)]
+        library.set_mounted(offline, False)
+        unmount = time.perf_counter() - start
+
+        start = time.perf_counter()
+        library.set_mounted(offline, True)
+        shard = library.index(offline).load()
+        merged = list(heapq.merge(remaining, shard, key=lambda song: song['path']))
+        mount = time.perf_counter() - start
+
+    report("library_roots", [
+        f"{roots} roots, {len(songs)} tracks, one root of {len(shard)} goes offline and comes back",
+        f"rescan every root:   {rescan * 1000:8.1f} ms",
+        f"unmount the root:    {unmount * 1000:8.1f} ms",
+        f"mount from shard:    {mount * 1000:8.1f} ms  ({len(merged)} tracks in the view)",
+    ])
+
+@benchmark
+def index_jsonl(tracks=500000):
+    # moving a library index to another machine: import from json lines in
+    # batched transactions, then export again. peak python memory is traced
+    # on a second export, it should not grow with the library
+    import json
+    import tracemalloc
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, "library.jsonl")
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'root': os.path.join(folder, "music")}) + "\n")
+            # in path order, as an export writes them
+            for i in range(tracks):
+                path = os.path.join(folder, "music", f"artist{i // 600:03d}", f"album{i // 15:05d}", f"track{i:06d}.flac")
+                f.write(json.dumps({
+                    'path': path, 'size': 30000000 + i, 'mtime': 1700000000.0 + i, 'title': f"Track {i}",
+                    'artist': f"Artist {i // 600}", 'album': f"Album {i // 15}", 'albumartist': '', 'tracknumber': str(i % 12 + 1),
+                    'date': '2020', 'genre': 'Rock', 'duration': 240.0, 'format': 'FLAC', 'added_at': 1700000000.0,
+                    'track_gain': -6.5, 'album_gain': -6.0, 'track_peak': 0.98, 'album_peak': 0.99, 'loudness': -11.5,
+                    'blocks': 2400, 'play_count': i % 7, 'last_played': None, 'art_key': path, 'art_offset': 1024,
+                    'art_length': 65536, 'audio_hash': [30000000 + i, 1700000000.0 + i, 29000000, f"{i:040x}"],
+                }) + "\n")
+        library = main.LibraryRoots(os.path.join(folder, "roots.json"), os.path.join(folder, "shards"))
+
+        start = time.perf_counter()
+        with open(source, encoding='utf-8') as lines:
+            imported, skipped = library.import_jsonl(lines)
+        load = time.perf_counter() - start
+
+        target = os.path.join(folder, "export.jsonl")
+        start = time.perf_counter()
+        with open(target, 'w', encoding='utf-8') as out:
+            exported = library.export_jsonl(out)
+        dump = time.perf_counter() - start
+
+        tracemalloc.start()
+        with open(os.devnull, 'w', encoding='utf-8') as out:
+            library.export_jsonl(out)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size = os.path.getsize(source)
+
+    report("index_jsonl", [
+        f"{tracks} tracks, {size / 1e6:.0f} MB of json lines",
+        f"import:  {load * 1000:8.0f} ms  {imported} tracks, {skipped} skipped",
+        f"export:  {dump * 1000:8.0f} ms  {exported} tracks, peak python memory {peak / 1024:.0f} KB",
+    ])
+
+@benchmark
+def negative_cache(files=200, size=2 * 1024 * 1024):
+    # rescanning a folder of broken downloads: parse every file again, as
+    # scans used to, vs stat them and compare with the failures the shard keeps
+    def parse(path):
+        try:
+            if main.read_header_tags(path) is None and MutagenFile(path) is None:
+                return "not an audio format mutagen knows"
+        except Exception as e:
+            return str(e)
+        return None
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for i in range(files):
+            path = os.path.join(folder, f"download{i:03d}.mp3")
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+            paths.append(path)
+        index = main.LibraryIndex(os.path.join(folder, "shard.db"))
+
+        start = time.perf_counter()
+        failures = {}
+        for path in paths:
+            reason = parse(path)
+            if reason:
+                stat = os.stat(path)
+                failures[path] = (stat.st_size, stat.st_mtime, reason, time.time())
+        index.save_failures(failures)
+        parsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        known = index.load_failures()
+        skipped = 0
+        for path in paths:
+            stat = os.stat(path)
+            skipped += known.get(path, (None, None))[:2] == (stat.st_size, stat.st_mtime)
+        cached = time.perf_counter() - start
+
+    report("negative_cache", [
+        f"{files} unreadable files of {size // (1024 * 1024)} MB, {len(failures)} failures recorded",
+        f"parse again:        {parsed * 1000:8.1f} ms",
+        f"stat + failures:    {cached * 1000:8.1f} ms  ({skipped} skipped, {parsed / cached:.0f}x)",
+    ])
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -1,123 +1,2475 @@
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
                              QWidget, QLabel, QPushButton, QSlider, QListWidget, 
                              QListWidgetItem, QScrollArea, QFrame, QFileDialog,
-                             QLineEdit, QStackedWidget)
-from PyQt6.QtCore import Qt, QTimer, QUrl
-from PyQt6.QtGui import QFont, QPixmap, QImage
+                             QLineEdit, QStackedWidget, QTableView, QAbstractItemView,
+                             QHeaderView, QDialog, QPlainTextEdit, QMenu)
+from PyQt6.QtCore import Qt, QTimer, QUrl, QObject, pyqtSignal, QAbstractTableModel, QModelIndex
+from PyQt6.QtGui import QFont, QPixmap, QImage, QPainter, QColor, QShortcut, QKeySequence
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
 import sys
 import os
 from pathlib import Path
-from mutagen import File as MutagenFile
+from mutagen import File as MutagenFile, MutagenError
 from mutagen.id3 import ID3, APIC
 from mutagen.mp4 import MP4
-from mutagen.flac import FLAC
+from mutagen.flac import FLAC, Picture
 import io
+import base64
+import hashlib
+import mmap
+import json
+import heapq
+import getpass
+import asyncio
+import re
+import queue
+import itertools
+import operator
+import unicodedata
+import bisect
+import weakref
+import threading
+import time
+import traceback
+import tracemalloc
+import sqlite3
+import shutil
+import subprocess
+import wave
+import urllib.parse
+import multiprocessing
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+import numpy as np
+
+import theme
+
+# per-user state (stall reports, caches, indexes)
+DATA_DIR = Path.home() / ".mymusic"
+
+class EventLoopWatchdog(QObject):
+    # a gui timer beats every interval, a helper thread samples the gui stack
+    # when the beat goes quiet so long stalls come with the code that caused them
+    def __init__(self, threshold_ms=200, interval_ms=50, keep=20, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.keep = keep
+        self.current_action = "idle"
+        self.stalls = []  # min-heap of (lag, seq, record), holds the worst `keep`
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._gui_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._sample = None
+        self._running = True
+        
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._beat)
+        self.timer.start(interval_ms)
+        
+        self._thread = threading.Thread(target=self._watch, name="watchdog", daemon=True)
+        self._thread.start()
+    
+    @contextmanager
+    def action(self, name):
+        previous = self.current_action
+        self.current_action = name
+        try:
+            yield
+        finally:
+            self.current_action = previous
+    
+    def _beat(self):
+        now = time.perf_counter()
+        with self._lock:
+            lag = now - self._last_beat - self.interval
+            self._last_beat = now
+            sample, self._sample = self._sample, None
+        if lag < self.threshold:
+            return
+        action, stack = sample if sample else (self.current_action, [])
+        self._seq += 1
+        record = {
+            'lag_ms': round(lag * 1000, 1),
+            'action': action,
+            'at': time.time(),
+            'stack': stack,
+        }
+        if len(self.stalls) < self.keep:
+            heapq.heappush(self.stalls, (lag, self._seq, record))
+        else:
+            heapq.heappushpop(self.stalls, (lag, self._seq, record))
+        print(f"Event loop stalled {record['lag_ms']:.0f} ms during {action}")
+    
+    def _watch(self):
+        while self._running:
+            time.sleep(self.interval / 2)
+            with self._lock:
+                quiet = time.perf_counter() - self._last_beat - self.interval
+                if quiet < self.threshold or self._sample is not None:
+                    continue
+                frame = sys._current_frames().get(self._gui_thread)
+                stack = traceback.format_stack(frame) if frame else []
+                self._sample = (self.current_action, stack)
+    
+    def worst(self):
+        return [record for _, _, record in sorted(self.stalls, reverse=True)]
+    
+    def export(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.worst(), f, indent=2)
+    
+    def stop(self):
+        self._running = False
+        self.timer.stop()
+
+class MemoryGovernor:
+    # accounts raw cover bytes, decoded pixmaps and live widgets, and keeps art
+    # and pixmaps under one budget by dropping the least recently used entries.
+    # evicted art is brought back through `loader` (usually a re-read of the file)
+    def __init__(self, budget_mb=256, loader=None, trace=False):
+        self.budget = budget_mb * 1024 * 1024
+        self.loader = loader
+        self.art = OrderedDict()      # art key -> bytes
+        self.pixmaps = OrderedDict()  # (art key, size) -> QPixmap
+        # widgets showing a cached pixmap. they are told to let go of it when it
+        # is evicted, or the copy each one holds would stay resident anyway
+        self.holders = {}  # (art key, size) -> WeakSet of widgets with drop_pixmap(key)
+        self.art_bytes = 0
+        self.pixmap_bytes = 0
+        self.widgets = Counter()
+        self.evictions = Counter()
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+    
+    def put_art(self, key, data):
+        if not data:
+            return
+        old = self.art.pop(key, None)
+        if old is not None:
+            self.art_bytes -= len(old)
+        self.art[key] = data
+        self.art_bytes += len(data)
+        self.enforce()
+    
+    def get_art(self, key):
+        if key is None:
+            return None
+        data = self.art.get(key)
+        if data is not None:
+            self.art.move_to_end(key)
+            return data
+        if self.loader is None:
+            return None
+        data = self.loader(key)
+        self.put_art(key, data)
+        return data
+    
+    def pixmap(self, key, size, holder=None):
+        if key is None:
+            return None
+        entry = (key, size)
+        pixmap = self.pixmaps.get(entry)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(entry)
+            if holder is not None:
+                self.holders.setdefault(entry, weakref.WeakSet()).add(holder)
+            return pixmap
+        data = self.get_art(key)
+        if not data:
+            return None
+        decoded = QPixmap()
+        if not decoded.loadFromData(data):
+            return None
+        pixmap = decoded.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatioByExpanding,
+                                Qt.TransformationMode.SmoothTransformation)
+        self.pixmaps[entry] = pixmap
+        self.pixmap_bytes += self.pixmap_cost(pixmap)
+        if holder is not None:
+            self.holders.setdefault(entry, weakref.WeakSet()).add(holder)
+        self.enforce()
+        return pixmap
+    
+    def pixmap_cost(self, pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+    
+    def enforce(self):
+        # decoded images are cheaper to rebuild than art that has to be re-read
+        while self.art_bytes + self.pixmap_bytes > self.budget and len(self.pixmaps) > 1:
+            entry, pixmap = self.pixmaps.popitem(last=False)
+            self.pixmap_bytes -= self.pixmap_cost(pixmap)
+            self.release(entry)
+            self.evictions['pixmap'] += 1
+        while self.art_bytes + self.pixmap_bytes > self.budget and len(self.art) > 1:
+            _, data = self.art.popitem(last=False)
+            self.art_bytes -= len(data)
+            self.evictions['art'] += 1
+    
+    def track_widget(self, widget, category):
+        self.widgets[category] += 1
+        widget.destroyed.connect(lambda *_: self.widgets.subtract([category]))
+    
+    def release(self, entry):
+        for holder in list(self.holders.pop(entry, ())):
+            holder.drop_pixmap(entry[0])
+    
+    def clear_art(self):
+        self.art.clear()
+        for entry in list(self.holders):
+            self.release(entry)
+        self.pixmaps.clear()
+        self.art_bytes = 0
+        self.pixmap_bytes = 0
+    
+    def report(self, limit=10):
+        mb = 1024 * 1024
+        lines = [
+            f"budget: {self.budget / mb:.1f} MB",
+            f"raw art: {len(self.art)} covers, {self.art_bytes / mb:.1f} MB",
+            f"decoded pixmaps: {len(self.pixmaps)} images, {self.pixmap_bytes / mb:.1f} MB",
+            f"evictions: {self.evictions['art']} art, {self.evictions['pixmap']} pixmaps",
+        ]
+        for category, count in sorted(self.widgets.items()):
+            lines.append(f"widgets ({category}): {count}")
+        
+        if not tracemalloc.is_tracing():
+            lines.append("tracemalloc: not running (set MYMUSIC_TRACEMALLOC=1)")
+            return "\n".join(lines)
+        
+        # python-side allocations grouped by where they came from
+        stats = tracemalloc.take_snapshot().statistics('traceback')
+        by_category = Counter()
+        for stat in stats:
+            by_category[self.categorize(stat.traceback)] += stat.size
+        lines.append("tracemalloc by category:")
+        for category, size in by_category.most_common():
+            lines.append(f"  {category}: {size / mb:.2f} MB")
+        lines.append(f"tracemalloc top {limit}:")
+        for stat in stats[:limit]:
+            frame = stat.traceback[-1]
+            lines.append(f"  {stat.size / mb:.2f} MB  {frame.filename}:{frame.lineno}")
+        return "\n".join(lines)
+    
+    def categorize(self, trace):
+        files = [frame.filename.replace('\\', '/') for frame in trace]
+        if any('/mutagen/' in f for f in files):
+            return "tag parsing"
+        if any('/PyQt6/' in f for f in files):
+            return "qt wrappers"
+        if any(f == __file__ for f in files):
+            return "player"
+        return "other"
+
+# fast scan: most bytes a header-only tag read may pull from one file
+SCAN_READ_LIMIT = 256 * 1024
+
+ID3_TEXT_FRAMES = {
+    'TIT2': 'title', 'TT2': 'title',
+    'TPE1': 'artist', 'TP1': 'artist',
+    'TALB': 'album', 'TAL': 'album',
+    'TPE2': 'albumartist', 'TP2': 'albumartist',
+    'TRCK': 'tracknumber', 'TRK': 'tracknumber',
+    'TDRC': 'date', 'TYER': 'date', 'TYE': 'date',
+    'TCON': 'genre', 'TCO': 'genre',
+}
+# replaygain / r128 tags, read wherever the format keeps them (TXXX, vorbis, mp4 freeform)
+LOUDNESS_FIELDS = {
+    'replaygain_track_gain', 'replaygain_album_gain',
+    'replaygain_track_peak', 'replaygain_album_peak',
+    'r128_track_gain', 'r128_album_gain',
+}
+TAG_FIELDS = set(ID3_TEXT_FRAMES.values()) | LOUDNESS_FIELDS
+
+class ReadLimitReached(Exception):
+    pass
+
+class BoundedReader:
+    # file wrapper that counts what is read and refuses to go past `limit`
+    def __init__(self, f, limit):
+        self.f = f
+        self.limit = limit
+        self.bytes_read = 0
+    
+    def read(self, n):
+        if self.bytes_read + n > self.limit:
+            raise ReadLimitReached()
+        data = self.f.read(n)
+        self.bytes_read += len(data)
+        return data
+    
+    def seek(self, pos, whence=0):
+        return self.f.seek(pos, whence)
+    
+    def skip(self, n):
+        self.f.seek(n, 1)
+    
+    def tell(self):
+        return self.f.tell()
+
+def syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+def id3_text_values(data):
+    if not data:
+        return [""]
+    codec = ('latin-1', 'utf-16', 'utf-16-be', 'utf-8')[data[0]] if data[0] < 4 else 'latin-1'
+    return [v.strip('\ufeff ') for v in data[1:].decode(codec, 'replace').split('\0')]
+
+def decode_id3_text(data):
+    return id3_text_values(data)[0]
+
+def id3_picture_offset(head, frame_id):
+    # offset of the image bytes inside an APIC/PIC body: skip encoding, mime, type, description
+    encoding = head[0]
+    if frame_id == 'PIC':
+        pos = 5
+    else:
+        pos = head.index(b'\0', 1) + 2
+    if encoding in (1, 2):
+        while head[pos:pos + 2] != b'\0\0':
+            pos += 2
+            if pos >= len(head):
+                return None
+        return pos + 2
+    return head.index(b'\0', pos) + 1
+
+def parse_id3(f, info):
+    base = f.tell()
+    header = f.read(10)
+    major, flags = header[3], header[5]
+    end = base + 10 + syncsafe(header[6:10])
+    if flags & 0x80 and major < 4:
+        return False  # whole-tag unsynchronisation, leave it to mutagen
+    if flags & 0x40:
+        ext = f.read(4)
+        f.seek(base + 10 + (syncsafe(ext) if major == 4 else int.from_bytes(ext, 'big') + 4))
+    
+    id_len, header_len = (3, 6) if major == 2 else (4, 10)
+    while f.tell() + header_len <= end:
+        frame = f.read(header_len)
+        if not frame[:id_len].strip(b'\0'):
+            break  # padding
+        frame_id = frame[:id_len].decode('latin-1')
+        if major == 2:
+            size, frame_flags = int.from_bytes(frame[3:6], 'big'), 0
+        elif major == 3:
+            size, frame_flags = int.from_bytes(frame[4:8], 'big'), int.from_bytes(frame[8:10], 'big')
+        else:
+            size, frame_flags = syncsafe(frame[4:8]), int.from_bytes(frame[8:10], 'big')
+        body = f.tell()
+        # compressed, encrypted or unsynchronised frames need the full parser
+        opaque = frame_flags & (0x00c0 if major == 3 else 0x000e)
+        skip = 4 if major == 4 and frame_flags & 0x0001 else 0
+        
+        if frame_id in ID3_TEXT_FRAMES and ID3_TEXT_FRAMES[frame_id] not in info['fields']:
+            if not opaque:
+                f.seek(body + skip)
+                info['fields'][ID3_TEXT_FRAMES[frame_id]] = decode_id3_text(f.read(size - skip))
+        elif frame_id in ('TXXX', 'TXX') and not opaque and size < 1024:
+            f.seek(body + skip)
+            values = id3_text_values(f.read(size - skip))
+            if len(values) > 1 and values[0].lower() in LOUDNESS_FIELDS:
+                info['fields'].setdefault(values[0].lower(), values[1])
+        elif frame_id in ('APIC', 'PIC') and info['art'] is None:
+            if opaque:
+                info['art'] = (None, None)
+            else:
+                f.seek(body + skip)
+                offset = id3_picture_offset(f.read(min(size - skip, 512)), frame_id)
+                info['art'] = (body + skip + offset, size - skip - offset) if offset else (None, None)
+        f.seek(body + size)
+    f.seek(end + (10 if major == 4 and flags & 0x10 else 0))
+    return True
+
+def parse_vorbis_comment(stream, info):
+    # stream needs read(n) and skip(n); values we don't keep (pictures above
+    # all) are skipped rather than read
+    vendor = int.from_bytes(stream.read(4), 'little')
+    stream.skip(vendor)
+    count = int.from_bytes(stream.read(4), 'little')
+    for _ in range(count):
+        length = int.from_bytes(stream.read(4), 'little')
+        head = stream.read(min(length, 32))
+        key, eq, value = head.partition(b'=')
+        key = key.decode('ascii', 'replace').lower()
+        rest = length - len(head)
+        if eq and key in TAG_FIELDS and key not in info['fields']:
+            value += stream.read(rest)
+            info['fields'][key] = value.decode('utf-8', 'replace').strip()
+        else:
+            if key == 'metadata_block_picture':
+                # base64 inside the comment, no plain byte range to point at
+                info['art'] = info['art'] or (None, None)
+            stream.skip(rest)
+
+def parse_flac(f, info):
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            break
+        block_type, size = header[0] & 0x7f, int.from_bytes(header[1:4], 'big')
+        start = f.tell()
+        if block_type == 0:
+            data = f.read(34)
+            rate = (data[10] << 12) | (data[11] << 4) | (data[12] >> 4)
+            samples = ((data[13] & 0x0f) << 32) | int.from_bytes(data[14:18], 'big')
+            if rate:
+                info['duration'] = samples / rate
+        elif block_type == 4:
+            parse_vorbis_comment(f, info)
+        elif block_type == 6 and info['art'] is None:
+            head = f.read(min(size, 1024))
+            pos = 8 + int.from_bytes(head[4:8], 'big')
+            pos += 4 + int.from_bytes(head[pos:pos + 4], 'big') + 16
+            length = int.from_bytes(head[pos:pos + 4], 'big')
+            info['art'] = (start + pos + 4, length) if pos + 4 <= len(head) else (None, None)
+        f.seek(start + size)
+        if header[0] & 0x80:
+            break
+
+# per-format header readers, picked by magic bytes (extension only breaks ties)
+TAG_READERS = {}
+
+def tag_reader(fmt):
+    def register(func):
+        TAG_READERS[fmt] = func
+        return func
+    return register
+
+def sniff_format(head, ext):
+    if head[:3] == b'ID3':
+        return 'id3'
+    if head[:4] == b'fLaC':
+        return 'flac'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[4:8] == b'ftyp':
+        return 'mp4'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if len(head) > 1 and head[0] == 0xff and head[1] & 0xe0 == 0xe0 and ext == '.mp3':
+        return 'mpeg'
+    return None
+
+MPEG_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_RATES = (44100, 48000, 32000)
+
+def mpeg_duration(f, info, start):
+    # layer 3 only: xing/info frame count when present, otherwise constant bitrate
+    f.seek(start)
+    head = f.read(256)
+    pos = head.find(b'\xff')
+    while pos != -1 and pos + 4 <= len(head) and head[pos + 1] & 0xe0 != 0xe0:
+        pos = head.find(b'\xff', pos + 1)
+    if pos == -1 or pos + 40 > len(head):
+        return
+    b1, b2, b3 = head[pos + 1], head[pos + 2], head[pos + 3]
+    version = (b1 >> 3) & 0x03  # 3 = mpeg1, 2 = mpeg2, 0 = mpeg2.5
+    if (b1 >> 1) & 0x03 != 1 or version == 1 or b2 >> 4 in (0, 15) or (b2 >> 2) & 0x03 == 3:
+        return
+    bitrate = MPEG_BITRATES[1 if version == 3 else 2][b2 >> 4] * 1000
+    rate = MPEG_RATES[(b2 >> 2) & 0x03] >> {3: 0, 2: 1, 0: 2}[version]
+    samples_per_frame = 1152 if version == 3 else 576
+    mono = b3 >> 6 == 3
+    side = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+    xing = head[pos + 4 + side:pos + 4 + side + 12]
+    if xing[:4] in (b'Xing', b'Info') and xing[7] & 0x01:
+        info['duration'] = int.from_bytes(xing[8:12], 'big') * samples_per_frame / rate
+    else:
+        f.seek(0, 2)
+        info['duration'] = (f.tell() - start - pos) * 8 / bitrate
+
+@tag_reader('id3')
+def read_id3_file(f, info):
+    if not parse_id3(f, info):
+        return False
+    audio_start = f.tell()
+    if f.read(4) == b'fLaC':
+        parse_flac(f, info)
+    else:
+        mpeg_duration(f, info, audio_start)
+    return True
+
+@tag_reader('mpeg')
+def read_mpeg_file(f, info):
+    mpeg_duration(f, info, 0)
+    return True
+
+@tag_reader('flac')
+def read_flac_file(f, info):
+    f.seek(4)
+    parse_flac(f, info)
+    return True
+
+MP4_FIELDS = {
+    b'\xa9nam': 'title', b'\xa9ART': 'artist', b'\xa9alb': 'album', b'aART': 'albumartist',
+    b'\xa9day': 'date', b'\xa9gen': 'genre', b'trkn': 'tracknumber',
+}
+MP4_CONTAINERS = {b'moov', b'udta', b'meta', b'ilst'}
+
+def mp4_atoms(f, start, end):
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        size, kind = int.from_bytes(header[:4], 'big'), header[4:8]
+        body = pos + 8
+        if size == 1:
+            size = int.from_bytes(f.read(8), 'big')
+            body += 8
+        elif size == 0:
+            size = end - pos
+        if size < 8:
+            return
+        yield kind, body, pos + size
+        pos += size
+
+def parse_mp4(f, info, start, end, parent=b''):
+    for kind, body, atom_end in mp4_atoms(f, start, end):
+        if kind in MP4_CONTAINERS:
+            # meta carries a version/flags word before its children
+            parse_mp4(f, info, body + 4 if kind == b'meta' else body, atom_end, kind)
+        elif kind == b'mvhd':
+            f.seek(body)
+            head = f.read(32)
+            if head[0] == 1:
+                scale, length = int.from_bytes(head[20:24], 'big'), int.from_bytes(head[24:32], 'big')
+            else:
+                scale, length = int.from_bytes(head[12:16], 'big'), int.from_bytes(head[16:20], 'big')
+            if scale:
+                info['duration'] = length / scale
+        elif parent == b'ilst' and kind == b'----':
+            # freeform item: mean, name, data children
+            name = value = None
+            for child, child_body, child_end in mp4_atoms(f, body, atom_end):
+                if child in (b'name', b'data') and child_end - child_body < 1024:
+                    f.seek(child_body)
+                    payload = f.read(child_end - child_body)
+                    if child == b'name':
+                        name = payload[4:].decode('utf-8', 'replace').lower()
+                    else:
+                        value = payload[8:].decode('utf-8', 'replace').strip()
+            if name in LOUDNESS_FIELDS and value is not None:
+                info['fields'].setdefault(name, value)
+        elif parent == b'ilst' and (kind in MP4_FIELDS or kind == b'covr'):
+            # each item holds a data atom: size, 'data', type, locale, payload
+            f.seek(body)
+            data_header = f.read(16)
+            data_size = int.from_bytes(data_header[:4], 'big')
+            if data_header[4:8] != b'data' or data_size < 16:
+                continue
+            if kind == b'covr':
+                if info['art'] is None:
+                    info['art'] = (body + 16, data_size - 16)
+            elif MP4_FIELDS[kind] not in info['fields']:
+                payload = f.read(min(data_size - 16, 1024))
+                if kind == b'trkn':
+                    value = str(int.from_bytes(payload[2:4], 'big'))
+                else:
+                    value = payload.decode('utf-8', 'replace').strip()
+                info['fields'][MP4_FIELDS[kind]] = value
+
+@tag_reader('mp4')
+def read_mp4_file(f, info):
+    # mdat is seeked over, so a moov stored after the audio costs nothing extra
+    f.seek(0, 2)
+    parse_mp4(f, info, 0, f.tell())
+    return True
+
+class OggStream:
+    # packet bytes across page boundaries; skip() seeks over page bodies
+    def __init__(self, f):
+        self.f = f
+        self.remaining = 0
+    
+    def next_page(self):
+        header = self.f.read(27)
+        if len(header) < 27 or header[:4] != b'OggS':
+            raise EOFError()
+        self.remaining = sum(self.f.read(header[26]))
+    
+    def read(self, n):
+        data = b''
+        while len(data) < n:
+            if not self.remaining:
+                self.next_page()
+            chunk = self.f.read(min(n - len(data), self.remaining))
+            self.remaining -= len(chunk)
+            data += chunk
+        return data
+    
+    def skip(self, n):
+        while n:
+            if not self.remaining:
+                self.next_page()
+            step = min(n, self.remaining)
+            self.f.skip(step)
+            self.remaining -= step
+            n -= step
+
+@tag_reader('ogg')
+def read_ogg_file(f, info):
+    f.seek(0, 2)
+    size = f.tell()
+    f.seek(max(0, size - 16 * 1024))
+    tail = f.read(min(size, 16 * 1024))
+    last = tail.rfind(b'OggS')
+    granule = int.from_bytes(tail[last + 6:last + 14], 'little') if last != -1 else 0
+    
+    # the identification header always sits alone on the first page
+    f.seek(0)
+    stream = OggStream(f)
+    try:
+        stream.next_page()
+        ident = stream.read(stream.remaining)
+        if ident[:7] == b'\x01vorbis':
+            rate, preskip, prefix = int.from_bytes(ident[12:16], 'little'), 0, b'\x03vorbis'
+        elif ident[:8] == b'OpusHead':
+            rate, preskip, prefix = 48000, int.from_bytes(ident[10:12], 'little'), b'OpusTags'
+        else:
+            return False
+        if rate and granule:
+            info['duration'] = max(granule - preskip, 0) / rate
+        if stream.read(len(prefix)) == prefix:
+            parse_vorbis_comment(stream, info)
+    except EOFError:
+        pass
+    return True
+
+RIFF_INFO_FIELDS = {
+    b'INAM': 'title', b'IART': 'artist', b'IPRD': 'album',
+    b'ICRD': 'date', b'IGNR': 'genre', b'ITRK': 'tracknumber', b'IPRT': 'tracknumber',
+}
+
+@tag_reader('wav')
+def read_wav_file(f, info):
+    f.seek(0, 2)
+    end = f.tell()
+    pos, byte_rate, data_size = 12, 0, 0
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        kind, size = header[:4], int.from_bytes(header[4:8], 'little')
+        body = pos + 8
+        if kind == b'fmt ':
+            byte_rate = int.from_bytes(f.read(12)[8:12], 'little')
+        elif kind == b'data':
+            data_size = size
+        elif kind == b'LIST' and f.read(4) == b'INFO':
+            items = f.read(size - 4)
+            i = 0
+            while i + 8 <= len(items):
+                item, length = items[i:i + 4], int.from_bytes(items[i + 4:i + 8], 'little')
+                field = RIFF_INFO_FIELDS.get(item)
+                if field and field not in info['fields']:
+                    value = items[i + 8:i + 8 + length].split(b'\0')[0]
+                    info['fields'][field] = value.decode('utf-8', 'replace').strip()
+                i += 8 + length + (length & 1)
+        elif kind in (b'id3 ', b'ID3 '):
+            parse_id3(f, info)
+        pos = body + size + (size & 1)
+    if byte_rate:
+        info['duration'] = data_size / byte_rate
+    return True
+
+def read_header_tags(file_path, limit=SCAN_READ_LIMIT, opener=open):
+    # text fields plus where the cover sits, without reading the cover itself.
+    # returns None for anything no reader covers so callers can fall back
+    info = {'fields': {}, 'art': None, 'duration': None, 'format': None, 'bytes_read': 0}
+    with opener(file_path, 'rb') as raw:
+        f = BoundedReader(raw, limit)
+        fmt = sniff_format(f.read(12), os.path.splitext(file_path)[1].lower())
+        reader = TAG_READERS.get(fmt)
+        if reader is None:
+            return None
+        info['format'] = fmt
+        f.seek(0)
+        try:
+            if not reader(f, info):
+                return None
+        except ReadLimitReached:
+            pass  # keep whatever was found inside the budget
+        info['bytes_read'] = f.bytes_read
+    return info
+
+# folder-level cover images, earlier names win
+SIDECAR_NAMES = ('cover', 'folder', 'front', 'album', 'albumart')
+SIDECAR_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def find_sidecar_cover(files):
+    # picks from a directory listing the caller already has, no stat calls
+    best = None
+    for name in files:
+        stem, ext = os.path.splitext(name.lower())
+        if ext in SIDECAR_EXTENSIONS and stem in SIDECAR_NAMES:
+            rank = SIDECAR_NAMES.index(stem)
+            if best is None or rank < best[0]:
+                best = (rank, name)
+    return best[1] if best else None
+
+def read_art_range(file_path, offset, length):
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+# replaygain 2.0 reference level, LUFS
+REPLAYGAIN_REFERENCE = -18.0
+# loudness_error is why an analysis failed; like the rest it is only kept while
+# the file is unchanged, so a failed track is retried once it changes
+LOUDNESS_KEYS = ('track_gain', 'album_gain', 'track_peak', 'album_peak', 'loudness', 'blocks', 'loudness_error')
+
+def parse_gain(value):
+    # "-6.52 dB" -> -6.52
+    try:
+        return float(str(value).split()[0])
+    except (ValueError, IndexError):
+        return None
+
+def loudness_from_fields(fields):
+    result = {
+        'track_gain': parse_gain(fields.get('replaygain_track_gain', '')),
+        'album_gain': parse_gain(fields.get('replaygain_album_gain', '')),
+        'track_peak': parse_gain(fields.get('replaygain_track_peak', '')),
+        'album_peak': parse_gain(fields.get('replaygain_album_peak', '')),
+    }
+    # opus r128 gains are Q7.8 dB against -23 LUFS
+    for kind in ('track', 'album'):
+        r128 = parse_gain(fields.get(f'r128_{kind}_gain', ''))
+        if result[f'{kind}_gain'] is None and r128 is not None:
+            result[f'{kind}_gain'] = r128 / 256 + (REPLAYGAIN_REFERENCE + 23)
+    return result
+
+class DecodeError(Exception):
+    pass
+
+class DecoderMissing(DecodeError):
+    # nothing wrong with the file, this machine can't decode it
+    pass
+
+def wav_blocks(w, block_frames):
+    width, channels = w.getsampwidth(), w.getnchannels()
+    with w:
+        while True:
+            raw = w.readframes(block_frames)
+            if not raw:
+                break
+            if width == 1:
+                samples = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128) / 128
+            elif width == 2:
+                samples = np.frombuffer(raw, '<i2').astype(np.float32) / 32768
+            elif width == 3:
+                b = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+                samples = (((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8) >> 8).astype(np.float32) / 8388608
+            else:
+                samples = np.frombuffer(raw, '<i4').astype(np.float32) / 2147483648
+            yield samples.reshape(-1, channels)
+
+def ffmpeg_blocks(file_path, block_frames, rate, channels):
+    process = subprocess.Popen(
+        ['ffmpeg', '-v', 'error', '-i', file_path, '-f', 'f32le', '-ac', str(channels), '-ar', str(rate), '-'],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    frame_size = channels * 4
+    try:
+        while True:
+            raw = process.stdout.read(block_frames * frame_size)
+            if not raw:
+                break
+            raw = raw[:len(raw) - len(raw) % frame_size]
+            yield np.frombuffer(raw, '<f4').reshape(-1, channels)
+    finally:
+        process.kill()
+        process.wait()
+
+def open_pcm(file_path, block_frames=48000, rate=48000, channels=2):
+    # (sample rate, iterator of float32 (frames, channels) blocks). pcm wav is
+    # read directly, everything else is streamed out of ffmpeg
+    if file_path.lower().endswith('.wav'):
+        try:
+            w = wave.open(file_path, 'rb')
+            return w.getframerate(), wav_blocks(w, block_frames)
+        except (wave.Error, EOFError):
+            pass
+    if shutil.which('ffmpeg') is None:
+        raise DecoderMissing("ffmpeg not found")
+    return rate, ffmpeg_blocks(file_path, block_frames, rate, channels)
+
+def k_weighting_power(n, rate):
+    # |H|^2 of the bs.1770 k-weighting filter at the rfft bins of an n-sample segment
+    k = np.tan(np.pi * 1681.974450955533 / rate)
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    q = 0.7071752369554196
+    a0 = 1 + k / q + k * k
+    shelf_b = ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0)
+    shelf_a = (1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0)
+    k = np.tan(np.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_b = (1, -2, 1)
+    high_a = (1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0)
+    
+    z = np.exp(-2j * np.pi * np.arange(n // 2 + 1) / n)
+    def response(b, a):
+        return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(response(shelf_b, shelf_a) * response(high_b, high_a)) ** 2
+
+def measure_loudness(file_path):
+    # bs.1770 integrated loudness with gating, plus sample peak. k-weighting is
+    # applied as a spectral weight per 100 ms segment (parseval), so every step
+    # is a vectorised numpy operation over whole blocks
+    rate, blocks = open_pcm(file_path)
+    segment = rate // 10
+    weight = k_weighting_power(segment, rate)
+    weight[1:-1] *= 2  # rfft drops the mirrored half
+    if segment % 2:
+        weight[-1] *= 2
+    energies = []
+    peak = 0.0
+    pending = None
+    for block in blocks:
+        # every sample counts for the peak, the tail shorter than a segment too
+        if len(block):
+            peak = max(peak, float(np.abs(block).max()))
+        if pending is not None:
+            block = np.concatenate((pending, block))
+        count = len(block) // segment
+        pending = block[count * segment:]
+        if not count:
+            continue
+        spectrum = np.fft.rfft(block[:count * segment].reshape(count, segment, -1), axis=1)
+        power = (np.abs(spectrum) ** 2 * weight[None, :, None]).sum(axis=1) / segment ** 2
+        energies.append(power.sum(axis=1))
+    if not energies:
+        return None
+    
+    energy = np.concatenate(energies)
+    if len(energy) >= 4:
+        # 400 ms gating blocks with 75% overlap
+        energy = (energy[:-3] + energy[1:-2] + energy[2:-1] + energy[3:]) / 4
+    energy = energy[energy > 0]
+    gated = energy[-0.691 + 10 * np.log10(energy) > -70]
+    if not len(gated):
+        return None
+    relative = -0.691 + 10 * np.log10(gated.mean()) - 10
+    gated = gated[-0.691 + 10 * np.log10(gated) > relative]
+    return {
+        'loudness': float(-0.691 + 10 * np.log10(gated.mean())),
+        'peak': peak,
+        'blocks': int(len(gated)),
+    }
+
+def analyze_loudness(file_path):
+    # runs in a worker process
+    try:
+        result = measure_loudness(file_path)
+    except DecoderMissing as e:
+        return {'path': file_path, 'error': str(e), 'retry': True}
+    except Exception as e:
+        return {'path': file_path, 'error': str(e)}
+    if result is None:
+        # silent, or shorter than one gating block. nothing to measure until it changes
+        return {'path': file_path, 'error': "no gated audio"}
+    return dict(result, path=file_path)
+
+WAVEFORM_BUCKETS = 600
+
+def compute_waveform(file_path, buckets=WAVEFORM_BUCKETS):
+    # min/max overview of the whole track in `buckets` columns. runs in a worker
+    # process; blocks are streamed and folded into at most 2 * buckets columns,
+    # which double in width whenever they fill up, so memory stays bounded
+    try:
+        rate, blocks = open_pcm(file_path, channels=1)
+        width = 256
+        mins, maxs = np.empty(0, np.float32), np.empty(0, np.float32)
+        pending = np.empty(0, np.float32)
+        # (min, max, samples) of a column a fold left half full; the samples
+        # after it fill it up, so later columns stay aligned with playback
+        carry = None
+        for block in blocks:
+            samples = np.concatenate((pending, block.mean(axis=1)))
+            if carry is not None:
+                need = width - carry[2]
+                if len(samples) < need:
+                    pending = samples
+                    continue
+                mins = np.append(mins, min(carry[0], samples[:need].min()))
+                maxs = np.append(maxs, max(carry[1], samples[:need].max()))
+                samples = samples[need:]
+                carry = None
+            count = len(samples) // width
+            pending = samples[count * width:]
+            if count:
+                columns = samples[:count * width].reshape(count, width)
+                mins = np.concatenate((mins, columns.min(axis=1)))
+                maxs = np.concatenate((maxs, columns.max(axis=1)))
+            while len(mins) > 2 * buckets:
+                if len(mins) % 2:
+                    # the odd column out becomes (the start of) the carry
+                    lo, hi, covered = mins[-1], maxs[-1], width
+                    if carry is not None:
+                        lo, hi, covered = min(lo, carry[0]), max(hi, carry[1]), covered + carry[2]
+                    carry = (lo, hi, covered)
+                    mins, maxs = mins[:-1], maxs[:-1]
+                mins = np.minimum(mins[0::2], mins[1::2])
+                maxs = np.maximum(maxs[0::2], maxs[1::2])
+                width *= 2
+        if carry is not None:
+            if len(pending):
+                carry = (min(carry[0], pending.min()), max(carry[1], pending.max()), 0)
+            mins = np.append(mins, carry[0])
+            maxs = np.append(maxs, carry[1])
+        elif len(pending):
+            mins = np.append(mins, pending.min())
+            maxs = np.append(maxs, pending.max())
+        if not len(mins):
+            return {'path': file_path, 'error': "no audio"}
+        if len(mins) > buckets:
+            edges = np.linspace(0, len(mins), buckets + 1).astype(int)[:-1]
+            mins = np.minimum.reduceat(mins, edges)
+            maxs = np.maximum.reduceat(maxs, edges)
+        # -1..1 -> 0..255, row 0 is the minimum, row 1 the maximum
+        peaks = np.clip((np.stack((mins, maxs)) + 1) * 127.5, 0, 255).astype(np.uint8)
+        return {'path': file_path, 'peaks': peaks}
+    except Exception as e:
+        return {'path': file_path, 'error': str(e)}
+
+def waveform_cache_path(song_info):
+    key = f"{song_info['path']}|{song_info.get('size')}|{song_info.get('mtime')}"
+    return DATA_DIR / "waveforms" / (hashlib.sha1(key.encode('utf-8')).hexdigest() + ".u8")
+
+def flac_audio_start(f, base):
+    f.seek(base + 4)
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            return f.tell()
+        f.seek(int.from_bytes(header[1:4], 'big'), 1)
+        if header[0] & 0x80:
+            return f.tell()
+
+def audio_payload_ranges(file_path):
+    # byte ranges holding only the audio, so copies that differ in tags match.
+    # ogg gets one range per page body since page headers carry sequence numbers
+    with open(file_path, 'rb') as f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(0)
+        head = f.read(12)
+        fmt = sniff_format(head, os.path.splitext(file_path)[1].lower())
+        start, end = 0, size
+        if fmt in ('id3', 'mpeg'):
+            if fmt == 'id3':
+                start = 10 + syncsafe(head[6:10]) + (10 if head[5] & 0x10 else 0)
+            f.seek(start)
+            if f.read(4) == b'fLaC':
+                return [(flac_audio_start(f, start), size)]
+            if end >= 128:
+                f.seek(end - 128)
+                if f.read(3) == b'TAG':
+                    end -= 128
+            if end >= 32:
+                f.seek(end - 32)
+                footer = f.read(32)
+                if footer[:8] == b'APETAGEX':
+                    has_header = int.from_bytes(footer[20:24], 'little') & 0x80000000
+                    end -= int.from_bytes(footer[12:16], 'little') + (32 if has_header else 0)
+        elif fmt == 'flac':
+            start = flac_audio_start(f, 0)
+        elif fmt == 'mp4':
+            for kind, body, atom_end in mp4_atoms(f, 0, size):
+                if kind == b'mdat':
+                    return [(body, atom_end)]
+        elif fmt == 'wav':
+            pos = 12
+            while pos + 8 <= size:
+                f.seek(pos)
+                header = f.read(8)
+                length = int.from_bytes(header[4:8], 'little')
+                if header[:4] == b'data':
+                    return [(pos + 8, min(pos + 8 + length, size))]
+                pos += 8 + length + (length & 1)
+        elif fmt == 'ogg':
+            ranges, pos, audio = [], 0, False
+            while pos + 27 <= size:
+                f.seek(pos)
+                header = f.read(27)
+                if header[:4] != b'OggS':
+                    break
+                body = pos + 27 + header[26]
+                length = sum(f.read(header[26]))
+                granule = int.from_bytes(header[6:14], 'little')
+                # header packets sit on pages with granule 0 (or -1 while a packet continues)
+                audio = audio or granule not in (0, 2 ** 64 - 1)
+                if audio:
+                    ranges.append((body, body + length))
+                pos = body + length
+            return ranges
+        return [(start, max(start, end))]
+
+def audio_payload_size(file_path):
+    # worker process: prefilter, only equal payload sizes can be duplicates
+    try:
+        return sum(end - start for start, end in audio_payload_ranges(file_path))
+    except (OSError, ValueError):
+        return None
+
+def hash_audio_payload(file_path):
+    # worker process: blake2b of the payload through an mmap, nothing is copied
+    try:
+        ranges = audio_payload_ranges(file_path)
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return digest.hexdigest()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for start, end in ranges:
+                        digest.update(view[start:end])
+                finally:
+                    view.release()
+        return digest.hexdigest()
+    except (OSError, ValueError):
+        return None
+
+class DuplicateFinder(threading.Thread):
+    # coordinates the two passes on the worker pool from a helper thread.
+    # `cached` maps path -> (size, mtime, payload_size, digest) from the index
+    def __init__(self, pool, songs, cached, bridge):
+        super().__init__(name="duplicates", daemon=True)
+        self.pool = pool
+        self.songs = [(s['path'], s.get('size'), s.get('mtime')) for s in songs]
+        self.cached = cached
+        self.bridge = bridge
+    
+    def run(self):
+        # always answers, a worker dying (BrokenProcessPool) included, or the
+        # window would wait on this search forever
+        try:
+            result = self.find()
+        except Exception as e:
+            result = {'error': str(e) or type(e).__name__}
+        self.bridge.finished.emit('duplicates', result)
+    
+    def find(self):
+        entries = {}
+        todo = []
+        for path, size, mtime in self.songs:
+            row = self.cached.get(path)
+            if row and (row[0], row[1]) == (size, mtime):
+                entries[path] = list(row)
+            else:
+                entries[path] = [size, mtime, None, None]
+                todo.append(path)
+        for path, payload in zip(todo, self.pool.map(audio_payload_size, todo, chunksize=32)):
+            entries[path][2] = payload
+        
+        by_size = {}
+        for path, entry in entries.items():
+            if entry[2]:
+                by_size.setdefault(entry[2], []).append(path)
+        candidates = [path for paths in by_size.values() if len(paths) > 1 for path in paths]
+        unhashed = [path for path in candidates if entries[path][3] is None]
+        for path, digest in zip(unhashed, self.pool.map(hash_audio_payload, unhashed, chunksize=4)):
+            entries[path][3] = digest
+        
+        by_digest = {}
+        for path in candidates:
+            if entries[path][3]:
+                by_digest.setdefault(entries[path][3], []).append(path)
+        groups = [paths for paths in by_digest.values() if len(paths) > 1]
+        return {
+            'groups': groups,
+            'entries': entries,
+            'hashed': len(unhashed),
+        }
+
+class TrackPrefetcher:
+    # warms the next queue entries on a helper thread while the current track
+    # plays. 'advise' hints the kernel (posix_fadvise WILLNEED) and reads the
+    # head of the file through so network mounts and sleeping disks fetch it
+    # into the page cache; 'stage' copies whole files of up to track_bytes into
+    # a bounded local cache and load_song plays the copy, bigger ones only get
+    # their head read like 'advise'. `opener` lets a slow filesystem stand-in
+    # replace open()
+    def __init__(self, ahead=2, track_bytes=32 * 1024 * 1024, max_bytes=512 * 1024 * 1024,
+                 mode='advise', stage_dir=None, delay=3.0, opener=open, chunk=1024 * 1024):
+        self.ahead = ahead
+        self.track_bytes = track_bytes
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.stage_dir = Path(stage_dir or DATA_DIR / "staging")
+        self.delay = delay
+        self.opener = opener
+        self.chunk = chunk
+        self.staged = OrderedDict()  # source path -> (local path, size), oldest first
+        self.staged_bytes = 0
+        self.playing = None  # source path of the track load_song asked for, its copy is kept
+        self.bytes_warmed = 0
+        self.wanted = []
+        self.generation = 0
+        self.running = True
+        self.condition = threading.Condition()
+        if mode == 'stage':
+            shutil.rmtree(self.stage_dir, ignore_errors=True)
+        self.thread = threading.Thread(target=self.run, name="prefetch", daemon=True)
+        self.thread.start()
+    
+    def prefetch(self, paths):
+        # newest request wins, anything still queued from the last one is dropped
+        with self.condition:
+            self.wanted = list(paths[:self.ahead])
+            self.generation += 1
+            self.condition.notify()
+    
+    def local_path(self, path):
+        with self.condition:
+            self.playing = path
+            entry = self.staged.get(path)
+            if entry:
+                self.staged.move_to_end(path)
+                return entry[0]
+        return path
+    
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.wanted:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation = self.generation
+                # let the track that just started get its own reads in first
+                self.condition.wait(self.delay)
+                if generation != self.generation or not self.running:
+                    continue
+                paths, self.wanted = self.wanted, []
+            for path in paths:
+                if generation != self.generation:
+                    break
+                try:
+                    if self.mode == 'stage':
+                        self.stage(path, generation)
+                    else:
+                        self.warm(path, generation)
+                except OSError as e:
+                    print(f"Prefetch failed for {path}: {e}")
+    
+    def warm(self, path, generation):
+        with self.opener(path, 'rb') as f:
+            if hasattr(os, 'posix_fadvise') and hasattr(f, 'fileno'):
+                try:
+                    os.posix_fadvise(f.fileno(), 0, self.track_bytes, os.POSIX_FADV_WILLNEED)
+                except (OSError, ValueError):
+                    pass
+            remaining = self.track_bytes
+            while remaining > 0 and generation == self.generation:
+                data = f.read(min(self.chunk, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                self.bytes_warmed += len(data)
+    
+    def stage(self, path, generation):
+        with self.condition:
+            if path in self.staged:
+                self.staged.move_to_end(path)
+                return
+        suffix = os.path.splitext(path)[1]
+        target = self.stage_dir / (hashlib.sha1(path.encode('utf-8')).hexdigest() + suffix)
+        partial = target.with_name(target.name + ".part")
+        self.stage_dir.mkdir(parents=True, exist_ok=True)
+        limit = min(self.track_bytes, self.max_bytes)
+        size = 0
+        with self.opener(path, 'rb') as src, open(partial, 'wb') as dst:
+            while generation == self.generation:
+                data = src.read(self.chunk)
+                if not data:
+                    break
+                dst.write(data)
+                size += len(data)
+                if size > limit:
+                    break
+        self.bytes_warmed += size
+        if generation != self.generation or size > limit:
+            # too big to stage, what was read still warmed its head
+            partial.unlink(missing_ok=True)
+            return
+        os.replace(partial, target)
+        with self.condition:
+            self.staged[path] = (str(target), size)
+            self.staged_bytes += size
+            # oldest copies go first, never the one just made or the one playing
+            for old_path in [p for p in self.staged if p not in (path, self.playing)]:
+                if self.staged_bytes <= self.max_bytes:
+                    break
+                old, old_size = self.staged.pop(old_path)
+                self.staged_bytes -= old_size
+                Path(old).unlink(missing_ok=True)
+
+AUDIO_EXTENSIONS = ('.mp3', '.flac', '.m4a', '.ogg', '.wav')
+
+def list_directory(path):
+    # one listing round trip, split into (subdirectories, files) like os.walk.
+    # symlinked folders are listed as files' neighbours but not descended
+    dirs, files = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    dirs.append(entry.name)
+            else:
+                files.append(entry.name)
+    return dirs, files
+
+class ConcurrencyController:
+    # hill climbs the number of operations kept in flight. every window the
+    # throughput is compared with the last one: while it keeps improving the
+    # limit grows, on a plateau it holds, when it drops it eases off. errors
+    # or a latency spike (p90 over `spike` times the best median seen) halve it
+    def __init__(self, start=4, minimum=1, maximum=32, window=0.5, spike=4.0):
+        self.limit = max(minimum, min(start, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        self.spike = spike
+        self.baseline = None
+        self.last_rate = None
+        self.history = []  # (limit, files/s, p90 latency, errors) per window
+        self.lock = threading.Lock()
+        self.reset_window()
+    
+    def reset_window(self):
+        self.window_start = time.perf_counter()
+        self.latencies = []
+        self.errors = 0
+    
+    def record(self, latency, ok=True):
+        with self.lock:
+            self.latencies.append(latency)
+            if not ok:
+                self.errors += 1
+            elapsed = time.perf_counter() - self.window_start
+            # at least one full round of the current limit, or the sample is noise
+            if elapsed >= self.window and len(self.latencies) >= self.limit:
+                self.adjust(len(self.latencies) / elapsed)
+    
+    def adjust(self, rate):
+        latencies = sorted(self.latencies)
+        median = latencies[len(latencies) // 2]
+        p90 = latencies[int(len(latencies) * 0.9)]
+        self.history.append((self.limit, rate, p90, self.errors))
+        if self.errors or (self.baseline and p90 > self.baseline * self.spike):
+            self.limit = max(self.minimum, self.limit // 2)
+            self.last_rate = None
+        else:
+            if self.baseline is None or median < self.baseline:
+                self.baseline = median
+            if self.last_rate is None or rate > self.last_rate * 1.1:
+                self.limit = min(self.maximum, self.limit + max(1, self.limit // 2))
+            elif rate < self.last_rate * 0.9:
+                self.limit = max(self.minimum, self.limit - max(1, self.limit // 4))
+            self.last_rate = rate
+        self.reset_window()
+
+class AdaptiveScanner:
+    # walks a library with directory listings and per-file reads in flight at
+    # once, as many as the controller allows. the callbacks run on the thread
+    # calling scan(): on_dir(path, files) returns the (file path, context)
+    # pairs to read, on_file(path, context, result) gets read_file's result or
+    # None when it raised. a raise counts as an error for the controller, so
+    # read_file should only raise for the mount (i/o), not for a bad file.
+    # `listdir` and `read_file` can be swapped for slow filesystem stand-ins
+    def __init__(self, read_file, listdir=list_directory, controller=None, max_workers=None):
+        self.read_file = read_file
+        self.listdir = listdir
+        self.controller = controller or ConcurrencyController()
+        self.max_workers = max_workers or self.controller.maximum
+        self.cancelled = False
+        self.failed = []  # folders that could not be listed, their files went unseen
+        self.pending = {}  # file path -> context, not handed to a worker yet
+        self.order = deque()  # discovery order for everything not prioritized
+        self.urgent = deque()
+        self.lock = threading.Lock()
+    
+    def prioritize(self, paths):
+        # read these before anything else, replaces the previous request.
+        # safe to call from another thread while scan() runs
+        with self.lock:
+            self.urgent = deque(paths)
+    
+    def next_file(self):
+        with self.lock:
+            for queue in (self.urgent, self.order):
+                while queue:
+                    path = queue.popleft()
+                    if path in self.pending:
+                        return path, self.pending.pop(path)
+        return None
+    
+    @staticmethod
+    def timed(func, path):
+        start = time.perf_counter()
+        try:
+            return time.perf_counter() - start, func(path), None
+        except Exception as e:
+            return time.perf_counter() - start, None, e
+    
+    def scan(self, root, on_dir, on_file):
+        dirs = deque([root])
+        in_flight = {}
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="scan") as pool:
+            while (dirs or self.pending or in_flight) and not self.cancelled:
+                # listings first, they are what uncovers more work
+                while (dirs or self.pending) and len(in_flight) < self.controller.limit:
+                    if dirs:
+                        path = dirs.popleft()
+                        job = ('dir', path, None, self.listdir)
+                    else:
+                        path, context = self.next_file()
+                        job = ('file', path, context, self.read_file)
+                    in_flight[pool.submit(self.timed, job[3], path)] = job
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, path, context, _ = in_flight.pop(future)
+                    # timed inside the worker, so this is the mount's latency and
+                    # not time spent queued behind other jobs
+                    latency, result, error = future.result()
+                    self.controller.record(latency, error is None)
+                    if kind == 'dir':
+                        if error:
+                            print(f"Error listing {path}: {error}")
+                            self.failed.append(path)
+                            continue
+                        subdirs, names = result
+                        dirs.extend(os.path.join(path, name) for name in sorted(subdirs))
+                        files = on_dir(path, sorted(names))
+                        with self.lock:
+                            self.pending.update(files)
+                            self.order.extend(file_path for file_path, _ in files)
+                    else:
+                        on_file(path, context, result)
+            for future in in_flight:
+                future.cancel()
+
+LRC_TIME = re.compile(r'\[(\d+):(\d{1,2}(?:[.:]\d+)?)\]')
+LRC_OFFSET = re.compile(r'\[offset:\s*([+-]?\d+)\]', re.IGNORECASE)
+
+class Lyrics:
+    # lines with start times in ms, sorted once so line_at is a bisection.
+    # unsynced lyrics have no times and a single block of text
+    def __init__(self, entries=(), text=None):
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self.times = [time_ms for time_ms, _ in entries]
+        self.lines = [line for _, line in entries]
+        self.text = text
+    
+    @property
+    def synced(self):
+        return bool(self.times)
+    
+    def line_at(self, position):
+        # index of the line showing at `position` ms, -1 before the first one
+        return bisect.bisect_right(self.times, position) - 1
+
+def parse_lrc(text):
+    # [mm:ss.xx] lines, several stamps may share one line; [offset:+/-ms]
+    # shifts everything. anything without a stamp (tags, blanks) is dropped
+    offset = LRC_OFFSET.search(text)
+    offset = int(offset.group(1)) if offset else 0
+    entries = []
+    for raw in text.splitlines():
+        stamps = LRC_TIME.findall(raw)
+        if not stamps:
+            continue
+        line = LRC_TIME.sub('', raw).strip()
+        for minutes, seconds in stamps:
+            time_ms = int(minutes) * 60000 + round(float(seconds.replace(':', '.')) * 1000) - offset
+            entries.append((max(0, time_ms), line))
+    return entries
+
+def find_lrc(file_path):
+    # only the last extension is swapped, "01. Intro.mp3" -> "01. Intro.lrc"
+    path = Path(file_path)
+    for suffix in ('.lrc', '.LRC'):
+        candidate = path.with_name(path.stem + suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+def load_lyrics(file_path):
+    # .lrc sidecar first, then SYLT, then USLT (which may be lrc text itself),
+    # then the lyrics field of other containers. None when there are none
+    lrc = find_lrc(file_path)
+    if lrc:
+        raw = lrc.read_bytes()
+        try:
+            text = raw.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            text = raw.decode('latin-1')
+        entries = parse_lrc(text)
+        return Lyrics(entries) if entries else Lyrics(text=text)
+    
+    texts = []
+    try:
+        tags = ID3(file_path)
+    except Exception:
+        tags = None
+    if tags is not None:
+        for frame in tags.getall('SYLT'):
+            if frame.format == 2:  # milliseconds; mpeg frame stamps aren't supported
+                return Lyrics((time_ms, line.strip()) for line, time_ms in frame.text)
+        texts = [frame.text for frame in tags.getall('USLT')]
+    else:
+        try:
+            audio = MutagenFile(file_path)
+        except Exception:
+            audio = None
+        if audio is not None and audio.tags:
+            for key in ('lyrics', 'unsyncedlyrics', '\xa9lyr'):
+                try:
+                    values = audio.tags.get(key) or audio.tags.get(key.upper())
+                except (KeyError, ValueError):
+                    values = None
+                if values:
+                    texts = [str(value) for value in values]
+                    break
+    for text in texts:
+        entries = parse_lrc(text)
+        return Lyrics(entries) if entries else Lyrics(text=text)
+    return None
+
+class TaskBridge(QObject):
+    # carries results from worker threads and process pools to the gui thread
+    finished = pyqtSignal(str, object)
+
+def plain_value(value):
+    # what sqlite stores as it is
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    return value is None or isinstance(value, (str, float))
+
+class LibraryIndex:
+    # sqlite store of scanned tracks, keeps what is slow to recompute (loudness
+    # analysis, first-seen dates) across scans as long as the file is unchanged
+    COLUMNS = ('path', 'size', 'mtime', 'title', 'artist', 'album', 'albumartist', 'tracknumber',
+               'date', 'genre', 'duration', 'format', 'added_at') + LOUDNESS_KEYS + (
+               'play_count', 'last_played', 'art_key', 'art_offset', 'art_length')
+    COLUMN_SET = frozenset(COLUMNS)
+    # added after the first release, created on older databases
+    LATER_COLUMNS = (('play_count', 'INTEGER DEFAULT 0'), ('last_played', 'REAL'),
+                     ('art_key', 'TEXT'), ('art_offset', 'INTEGER'), ('art_length', 'INTEGER'),
+                     ('loudness_error', 'TEXT'))
+    
+    def __init__(self, db_path):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(db_path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # smart playlist 'contains' rules, folded the same way as in python
+        self.db.create_function("contains_text", 2, contains_text, deterministic=True)
+        self.importing = False  # import_rows goes to the temp tables begin_import made
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL,
+                title TEXT, artist TEXT, album TEXT, albumartist TEXT, tracknumber TEXT,
+                date TEXT, genre TEXT, duration REAL, format TEXT, added_at REAL,
+                track_gain REAL, album_gain REAL, track_peak REAL, album_peak REAL,
+                loudness REAL, blocks INTEGER
+            )
+        """)
+        existing = {row[1] for row in self.db.execute("PRAGMA table_info(tracks)")}
+        for column, kind in self.LATER_COLUMNS:
+            if column not in existing:
+                self.db.execute(f"ALTER TABLE tracks ADD COLUMN {column} {kind}")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS audio_hashes (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL,
+                payload_size INTEGER, digest TEXT
+            )
+        """)
+        # files that could not be read, skipped by scans until size or mtime change
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS failures (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL,
+                reason TEXT, failed_at REAL
+            )
+        """)
+        self.db.commit()
+    
+    def sync(self, songs):
+        # fill songs from stored rows, then write them all back in one transaction
+        stored = {row[0]: row for row in self.db.execute(
+            "SELECT path, size, mtime, added_at, play_count, last_played, "
+            + ", ".join(LOUDNESS_KEYS) + " FROM tracks")}
+        now = time.time()
+        for song in songs:
+            row = stored.get(song['path'])
+            song['added_at'] = row[3] if row and row[3] else now
+            # plays belong to the path, even if the file was retagged
+            song['play_count'] = (row[4] or 0) if row else 0
+            song['last_played'] = row[5] if row else None
+            if row and (row[1], row[2]) == (song.get('size'), song.get('mtime')):
+                for key, value in zip(LOUDNESS_KEYS, row[6:]):
+                    if song.get(key) is None:
+                        song[key] = value
+        columns = ", ".join(self.COLUMNS)
+        marks = ", ".join("?" * len(self.COLUMNS))
+        # an existing row keeps its plays: the history thread may have counted
+        # one since the select above, writing back what was read would lose it
+        updates = ", ".join(f"{column} = excluded.{column}" for column in self.COLUMNS
+                            if column not in ('path', 'play_count', 'last_played'))
+        with self.db:
+            self.db.executemany(
+                f"INSERT INTO tracks ({columns}) VALUES ({marks}) ON CONFLICT(path) DO UPDATE SET {updates}",
+                [tuple(song.get(c) for c in self.COLUMNS) for song in songs]
+            )
+    
+    def load(self):
+        # the tracks as last scanned, in path order, without opening any file
+        columns = ", ".join(self.COLUMNS)
+        return [dict(zip(self.COLUMNS, row))
+                for row in self.db.execute(f"SELECT {columns} FROM tracks ORDER BY path")]
+    
+    def forget(self, paths):
+        with self.db:
+            for table in ('tracks', 'audio_hashes', 'failures'):
+                self.db.executemany(f"DELETE FROM {table} WHERE path = ?", [(path,) for path in paths])
+    
+    def adopt(self, db_path, prefix):
+        # rows a single-folder library.db kept for files under prefix
+        self.db.execute("ATTACH DATABASE ? AS legacy", (str(db_path),))
+        try:
+            with self.db:
+                for table in ('tracks', 'audio_hashes'):
+                    ours = [row[1] for row in self.db.execute(f"PRAGMA main.table_info({table})")]
+                    theirs = {row[1] for row in self.db.execute(f"PRAGMA legacy.table_info({table})")}
+                    columns = ", ".join(column for column in ours if column in theirs)
+                    if columns:
+                        self.db.execute(
+                            f"INSERT OR IGNORE INTO main.{table} ({columns}) SELECT {columns} "
+                            f"FROM legacy.{table} WHERE path >= ? AND path < ?",
+                            (prefix, prefix + '\U0010ffff'))
+        finally:
+            self.db.execute("DETACH DATABASE legacy")
+    
+    def load_failures(self):
+        # path -> (size, mtime, reason, failed_at)
+        return {row[0]: row[1:] for row in self.db.execute(
+            "SELECT path, size, mtime, reason, failed_at FROM failures")}
+    
+    def save_failures(self, failures, recovered=()):
+        # failures like load_failures gives them; recovered paths read fine now
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?, ?)",
+                [(path,) + tuple(entry) for path, entry in failures.items()]
+            )
+            self.db.executemany("DELETE FROM failures WHERE path = ?", [(path,) for path in recovered])
+    
+    def export_rows(self):
+        # one dict per track with its audio hash, streamed from the cursor.
+        # fields without a value are left out
+        columns = ", ".join(f"t.{column}" for column in self.COLUMNS)
+        for row in self.db.execute(
+                f"SELECT {columns}, h.size, h.mtime, h.payload_size, h.digest "
+                "FROM tracks t LEFT JOIN audio_hashes h ON h.path = t.path ORDER BY t.path"):
+            track = {column: value for column, value in zip(self.COLUMNS, row) if value is not None}
+            if row[-1] is not None:
+                track['audio_hash'] = list(row[len(self.COLUMNS):])
+            yield track
+    
+    @classmethod
+    def check_row(cls, track):
+        # what sqlite can't bind raises ValueError here, before a batch is written.
+        # only the fields the row has, exports leave the empty ones out
+        for column in track.keys() & cls.COLUMN_SET:
+            if not plain_value(track[column]):
+                raise ValueError(f"{column} is not a string or number")
+        audio_hash = track.get('audio_hash')
+        if audio_hash and not (isinstance(audio_hash, list) and len(audio_hash) == 4
+                               and all(map(plain_value, audio_hash))):
+            raise ValueError("audio_hash is not [size, mtime, payload_size, digest]")
+    
+    def begin_import(self):
+        # rows load into temp copies of the tables and replace the shard's only
+        # in end_import, so a run that dies halfway leaves the shard as it was
+        for table in ('tracks', 'audio_hashes'):
+            self.db.execute(f"CREATE TEMP TABLE import_{table} AS SELECT * FROM main.{table} WHERE 0")
+        self.importing = True
+    
+    def end_import(self, replace=True):
+        if replace:
+            with self.db:
+                for table in ('tracks', 'audio_hashes'):
+                    self.db.execute(f"DELETE FROM main.{table}")
+                    # no primary key on the copies, a path listed twice: the last one wins
+                    self.db.execute(f"INSERT OR REPLACE INTO main.{table} SELECT * FROM temp.import_{table} ORDER BY rowid")
+        for table in ('tracks', 'audio_hashes'):
+            self.db.execute(f"DROP TABLE IF EXISTS temp.import_{table}")
+        self.importing = False
+    
+    def import_rows(self, tracks):
+        # tracks as export_rows gives them, in one transaction
+        columns = ", ".join(self.COLUMNS)
+        marks = ", ".join("?" * len(self.COLUMNS))
+        schema = "temp.import_" if self.importing else "main."
+        with self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO {schema}tracks ({columns}) VALUES ({marks})",
+                [tuple(map(track.get, self.COLUMNS)) for track in tracks]
+            )
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO {schema}audio_hashes VALUES (?, ?, ?, ?, ?)",
+                [(track['path'],) + tuple(track['audio_hash']) for track in tracks if track.get('audio_hash')]
+            )
+    
+    def close(self):
+        self.db.close()
+    
+    def record_plays(self, events):
+        # (when, event, path) from the play history, in one transaction
+        with self.db:
+            self.db.executemany(
+                "UPDATE tracks SET play_count = COALESCE(play_count, 0) + ?, last_played = ? WHERE path = ?",
+                [(1 if event == 'complete' else 0, when, path) for when, event, path in events]
+            )
+    
+    def select_paths(self, where, params):
+        return [row[0] for row in self.db.execute(f"SELECT path FROM tracks WHERE {where}", params)]
+    
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+    
+    def load_audio_hashes(self):
+        return {row[0]: row[1:] for row in self.db.execute(
+            "SELECT path, size, mtime, payload_size, digest FROM audio_hashes")}
+    
+    def save_audio_hashes(self, entries):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO audio_hashes VALUES (?, ?, ?, ?, ?)",
+                [(path,) + tuple(entry) for path, entry in entries.items()]
+            )
+    
+    def save_loudness(self, songs):
+        assignments = ", ".join(f"{key} = ?" for key in LOUDNESS_KEYS)
+        with self.db:
+            self.db.executemany(
+                f"UPDATE tracks SET {assignments} WHERE path = ?",
+                [tuple(song.get(key) for key in LOUDNESS_KEYS) + (song['path'],) for song in songs]
+            )
+
+def path_prefix(folder):
+    # what every path inside folder starts with
+    return folder.rstrip(os.sep) + os.sep
+
+class LibraryRoots:
+    # the folders the library is made of. each has its own index shard, so a
+    # root is scanned, taken offline or removed without touching the others;
+    # the merged view is the union of the mounted shards, nothing is copied
+    # between them. the LibraryIndex calls the window makes are answered here
+    # from every mounted shard, writes go to the shard owning each path
+    def __init__(self, path, shard_folder, legacy_db=None):
+        self.path = Path(path)
+        self.shard_folder = Path(shard_folder)
+        self.legacy_db = legacy_db
+        self.entries = []  # {'path', 'shard', 'mounted'} in the order added
+        self.indexes = {}  # root -> LibraryIndex, opened on first use
+        try:
+            self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading {self.path}: {e}")
+    
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.entries, indent=2), encoding='utf-8')
+    
+    def entry(self, root):
+        return next((entry for entry in self.entries if entry['path'] == root), None)
+    
+    def root_of(self, file_path):
+        # roots never nest, so at most one matches
+        for entry in self.entries:
+            if file_path.startswith(path_prefix(entry['path'])):
+                return entry['path']
+        return None
+    
+    def shard_of(self, file_path):
+        # safe from other threads, they open their own connection on it
+        root = self.root_of(file_path)
+        return root and self.shard_folder / self.entry(root)['shard']
+    
+    def mounted(self):
+        return [entry['path'] for entry in self.entries if entry['mounted']]
+    
+    def index(self, root):
+        if root not in self.indexes:
+            self.indexes[root] = LibraryIndex(self.shard_folder / self.entry(root)['shard'])
+        return self.indexes[root]
+    
+    def add(self, folder):
+        # the root folder is now part of; a folder inside a root is that root
+        folder = os.path.abspath(folder)
+        for entry in self.entries:
+            if folder == entry['path'] or folder.startswith(path_prefix(entry['path'])):
+                return entry['path']
+            if entry['path'].startswith(path_prefix(folder)):
+                raise ValueError(f"it contains the library folder {entry['path']}, remove that first")
+        shard = hashlib.sha1(folder.encode('utf-8')).hexdigest()[:16] + ".db"
+        self.entries.append({'path': folder, 'shard': shard, 'mounted': True})
+        self.save()
+        if self.legacy_db and Path(self.legacy_db).exists():
+            # plays, dates added and loudness from before roots had shards
+            self.index(folder).adopt(self.legacy_db, path_prefix(folder))
+        return folder
+    
+    def set_mounted(self, root, mounted):
+        self.entry(root)['mounted'] = mounted
+        self.save()
+    
+    def remove(self, root):
+        entry = self.entry(root)
+        self.entries.remove(entry)
+        self.save()
+        index = self.indexes.pop(root, None)
+        if index:
+            index.close()
+        for suffix in ('', '-wal', '-shm'):
+            (self.shard_folder / (entry['shard'] + suffix)).unlink(missing_ok=True)
+    
+    def split(self, items, path=lambda item: item['path']):
+        by_root = {}
+        for item in items:
+            root = self.root_of(path(item))
+            if root is not None:
+                by_root.setdefault(root, []).append(item)
+        return by_root
+    
+    def sync(self, songs):
+        for root, root_songs in self.split(songs).items():
+            self.index(root).sync(root_songs)
+    
+    def export_jsonl(self, out):
+        # a {"root": ...} line, then that root's tracks one per line. rows are
+        # written as the cursor yields them, memory stays flat
+        count = 0
+        for entry in self.entries:
+            out.write(json.dumps({'root': entry['path']}) + "\n")
+            for track in self.index(entry['path']).export_rows():
+                out.write(json.dumps(track) + "\n")
+                count += 1
+        return count
+    
+    def import_jsonl(self, lines, batch_size=10000):
+        # roots this machine lacks are added, unmounted when their folder isn't
+        # here. a root's tracks replace what its shard had once they have all
+        # loaded, and no audio file is opened. returns (imported, skipped)
+        imported = skipped = 0
+        batch = []
+        replacing = set()  # a root named twice keeps the tracks of both
+        
+        def flush():
+            nonlocal imported, skipped
+            placed = 0
+            for root, tracks in self.split(batch).items():
+                self.index(root).import_rows(tracks)
+                placed += len(tracks)
+            imported += placed
+            skipped += len(batch) - placed  # outside every root
+            batch.clear()
+        
+        try:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    if not isinstance(item, dict):
+                        raise ValueError("not an object")
+                    if 'root' not in item:
+                        if not isinstance(item.get('path'), str):
+                            raise ValueError("no path")
+                        LibraryIndex.check_row(item)
+                except ValueError as e:
+                    print(f"Error reading line {number}: {e}")
+                    skipped += 1
+                    continue
+                if 'root' in item:
+                    flush()
+                    try:
+                        if not isinstance(item['root'], str):
+                            raise ValueError("not a folder path")
+                        root = self.add(item['root'])
+                    except ValueError as e:
+                        print(f"Error adding {item['root']}: {e}")
+                        continue
+                    if not os.path.isdir(root) and self.entry(root)['mounted']:
+                        self.set_mounted(root, False)
+                    if root not in replacing:
+                        self.index(root).begin_import()
+                        replacing.add(root)
+                else:
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        flush()
+            flush()
+        except BaseException:
+            # bad file, full disk, ctrl-c: the named roots keep their old tracks
+            for root in replacing:
+                self.index(root).end_import(replace=False)
+            raise
+        for root in replacing:
+            self.index(root).end_import()
+        return imported, skipped
+    
+    def select_paths(self, where, params):
+        return [path for root in self.mounted() for path in self.index(root).select_paths(where, params)]
+    
+    def load_audio_hashes(self):
+        entries = {}
+        for root in self.mounted():
+            entries.update(self.index(root).load_audio_hashes())
+        return entries
+    
+    def load_failures(self):
+        failures = {}
+        for root in self.mounted():
+            failures.update(self.index(root).load_failures())
+        return failures
+    
+    def save_audio_hashes(self, entries):
+        for root, paths in self.split(entries, path=lambda path: path).items():
+            self.index(root).save_audio_hashes({path: entries[path] for path in paths})
+    
+    def save_loudness(self, songs):
+        for root, root_songs in self.split(songs).items():
+            self.index(root).save_loudness(root_songs)
+
+def track_number(song):
+    # "3/12" -> 3, anything unparsable sorts last
+    number = (song.get('tracknumber') or '').split('/')[0].strip()
+    return int(number) if number.isdigit() else 1 << 30
+
+class LibraryAggregates:
+    # per-artist and per-album groups kept up to date one track at a time, so
+    # opening a group is a dict lookup. a group is a dict with its display
+    # name, the tracks by path, their total duration and a cover key taken
+    # from the first track that has one
+    def __init__(self):
+        self.artists = {}
+        self.albums = {}
+        # path -> (artist key, album key, duration, art key) as it was filed. song
+        # dicts are updated in place, remove takes back what add put in
+        self.keys_by_path = {}
+        self.version = 0
+    
+    @staticmethod
+    def new_group(name, artist=''):
+        return {'name': name, 'artist': artist, 'tracks': {}, 'duration': 0.0, 'cover': None}
+    
+    def clear(self):
+        self.artists.clear()
+        self.albums.clear()
+        self.keys_by_path.clear()
+        self.version += 1
+    
+    def add(self, song):
+        self.remove(song['path'])
+        artist = song.get('artist') or 'Unknown Artist'
+        artist_key = collation_key(artist)
+        album_key = None
+        groups = [self.artists.setdefault(artist_key, self.new_group(artist))]
+        if song.get('album'):
+            album_artist = song.get('albumartist') or artist
+            album_key = (collation_key(album_artist), collation_key(song['album']))
+            groups.append(self.albums.setdefault(album_key, self.new_group(song['album'], album_artist)))
+        for group in groups:
+            group['tracks'][song['path']] = song
+            group['duration'] += song.get('duration') or 0
+            if group['cover'] is None:
+                group['cover'] = song.get('art_key')
+        self.keys_by_path[song['path']] = (artist_key, album_key, song.get('duration') or 0, song.get('art_key'))
+        self.version += 1
+    
+    def remove(self, path):
+        filed = self.keys_by_path.pop(path, None)
+        if filed is None:
+            return
+        artist_key, album_key, duration, art_key = filed
+        for table, key in ((self.artists, artist_key), (self.albums, album_key)):
+            group = table.get(key)
+            if group is None:
+                continue
+            del group['tracks'][path]
+            if not group['tracks']:
+                del table[key]
+                continue
+            group['duration'] -= duration
+            if group['cover'] is not None and group['cover'] == art_key:
+                # only this group's tracks are looked at, not the library
+                group['cover'] = next((t['art_key'] for t in group['tracks'].values() if t.get('art_key')), None)
+        self.version += 1
+    
+    def groups(self, kind):
+        table = self.artists if kind == 'artist' else self.albums
+        return sorted(table.items(), key=lambda item: item[0])
+    
+    def group(self, kind, key):
+        return (self.artists if kind == 'artist' else self.albums).get(key)
+
+SMART_FIELDS = ('title', 'artist', 'album', 'albumartist', 'genre', 'date', 'format',
+                'duration', 'added_at', 'play_count', 'last_played')
+SMART_OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'contains', 'in', 'within_days', 'this_month')
+SMART_COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+DEFAULT_SMART_PLAYLISTS = [
+    {'name': "New FLAC, never played", 'match': 'all',
+     'rules': [['format', '==', 'FLAC'], ['added_at', 'this_month', None], ['play_count', '==', 0]]},
+    {'name': "Long tracks", 'match': 'all', 'rules': [['duration', '>', 480]]},
+    {'name': "Heavy rotation", 'match': 'all',
+     'rules': [['play_count', '>=', 5], ['last_played', 'within_days', 30]]},
+]
+
+def contains_text(actual, value):
+    # case-insensitive for any script; LIKE only folds ascii
+    if actual is None:
+        return False
+    return str(value).casefold() in str(actual).casefold()
+
+def month_start(now):
+    local = time.localtime(now)
+    return time.mktime((local.tm_year, local.tm_mon, 1, 0, 0, 0, 0, 0, -1))
+
+class SmartPlaylist:
+    # a rule set compiled twice: to sql for the full evaluation against the
+    # index, and to a python predicate for one track at a time. both treat a
+    # missing value as not matching. `members` is the materialized result
+    def __init__(self, name, rules, match='all'):
+        # checked here, a bad value would otherwise only fail (or quietly
+        # misbehave) when the rule is evaluated
+        plain = lambda value: isinstance(value, (str, int, float)) and not isinstance(value, bool)
+        for field, op, value in rules:
+            if field not in SMART_FIELDS or op not in SMART_OPERATORS:
+                raise ValueError(f"bad rule {field} {op}")
+            if op == 'in':
+                ok = isinstance(value, list) and value and all(map(plain, value))
+            elif op == 'within_days':
+                ok = plain(value) and not isinstance(value, str)
+            elif op == 'contains':
+                ok = isinstance(value, str)
+            else:
+                ok = op == 'this_month' or plain(value)
+            if not ok:
+                raise ValueError(f"bad value for {field} {op}: {value!r}")
+        if match not in ('all', 'any'):
+            raise ValueError(f"bad match {match}")
+        self.name = name
+        self.rules = rules
+        self.match = match
+        self.members = {}  # path -> song
+        self.duration = 0.0
+        # membership of these drifts with the clock, not only with the tracks
+        self.relative = any(op in ('within_days', 'this_month') for _, op, _ in rules)
+    
+    def bound(self, op, value, now):
+        if op == 'within_days':
+            return now - value * 86400
+        if op == 'this_month':
+            return month_start(now)
+        return value
+    
+    def where(self, now):
+        clauses, params = [], []
+        for field, op, value in self.rules:
+            column = f"COALESCE({field}, 0)" if field == 'play_count' else field
+            if op == 'contains':
+                clauses.append(f"contains_text({column}, ?)")
+                params.append(value)
+            elif op == 'in':
+                clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            elif op in ('within_days', 'this_month'):
+                clauses.append(f"{column} >= ?")
+                params.append(self.bound(op, value, now))
+            else:
+                clauses.append(f"{column} {'=' if op == '==' else op} ?")
+                params.append(value)
+        joiner = " AND " if self.match == 'all' else " OR "
+        return "(" + joiner.join(clauses or ["1"]) + ")", params
+    
+    def test(self, song, field, op, value, now):
+        actual = song.get(field)
+        if field == 'play_count':
+            actual = actual or 0
+        if actual is None:
+            return False
+        if op == 'contains':
+            return contains_text(actual, value)
+        if op == 'in':
+            return actual in value
+        if op == '==':
+            return actual == value
+        if op == '!=':
+            return actual != value
+        try:
+            if op in ('within_days', 'this_month'):
+                return actual >= self.bound(op, value, now)
+            return SMART_COMPARISONS[op](actual, value)
+        except TypeError:
+            return False
+    
+    def matches(self, song, now):
+        results = (self.test(song, field, op, value, now) for field, op, value in self.rules)
+        return all(results) if self.match == 'all' else any(results)
+    
+    def set_members(self, songs):
+        self.members = {song['path']: song for song in songs}
+        self.duration = sum(song.get('duration') or 0 for song in songs)
+    
+    def update(self, song, now):
+        # true when membership changed
+        inside = song['path'] in self.members
+        if self.matches(song, now):
+            if not inside:
+                self.members[song['path']] = song
+                self.duration += song.get('duration') or 0
+            return not inside
+        return inside and self.remove(song['path'])
+    
+    def remove(self, path):
+        song = self.members.pop(path, None)
+        if song is None:
+            return False
+        self.duration -= song.get('duration') or 0
+        return True
+
+class SmartPlaylists:
+    # the user's playlist definitions (json, edited by hand) and their members.
+    # a track that is added, retagged or played is tested against every
+    # playlist on its own, only evaluate() goes over the whole index
+    def __init__(self, path):
+        self.path = Path(path)
+        self.playlists = []
+        self.version = 0
+        self.evaluated_at = 0.0
+        try:
+            definitions = json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            definitions = DEFAULT_SMART_PLAYLISTS
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(definitions, indent=2), encoding='utf-8')
+        except Exception as e:
+            print(f"Error reading {self.path}: {e}")
+            definitions = []
+        for definition in definitions:
+            try:
+                self.playlists.append(SmartPlaylist(definition['name'], definition['rules'],
+                                                    definition.get('match', 'all')))
+            except Exception as e:
+                print(f"Skipping smart playlist {definition.get('name')}: {e}")
+    
+    def evaluate(self, index, songs_by_path, relative_only=False):
+        now = time.time()
+        for playlist in self.playlists:
+            if relative_only and not playlist.relative:
+                continue
+            where, params = playlist.where(now)
+            paths = index.select_paths(where, params)
+            playlist.set_members([songs_by_path[path] for path in paths if path in songs_by_path])
+        self.evaluated_at = now
+        self.version += 1
+    
+    def update(self, song):
+        now = time.time()
+        changed = [playlist.update(song, now) for playlist in self.playlists]
+        if any(changed):
+            self.version += 1
+    
+    def clear(self):
+        for playlist in self.playlists:
+            playlist.set_members([])
+        self.version += 1
+    
+    # same interface as LibraryAggregates for BrowsePage
+    def groups(self, kind):
+        return [(i, self.group(kind, i)) for i in range(len(self.playlists))]
+    
+    def group(self, kind, key):
+        playlist = self.playlists[key]
+        covers = (song.get('art_key') for song in playlist.members.values())
+        return {'name': playlist.name, 'artist': '', 'tracks': playlist.members,
+                'duration': playlist.duration, 'cover': next((c for c in covers if c), None)}
+
+PLAYLIST_EXTENSIONS = ('.m3u', '.m3u8', '.pls')
+
+def open_playlist_text(path):
+    # m3u8 and pls are utf-8, plain m3u is often the writer's ansi codepage
+    encoding = 'utf-8-sig'
+    if path.lower().endswith('.m3u'):
+        with open(path, 'rb') as f:
+            head = f.read(64 * 1024)
+        try:
+            head.decode('utf-8')
+        except UnicodeDecodeError as e:
+            if e.start < len(head) - 4:  # not just a character cut at the edge
+                encoding = 'latin-1'
+    return open(path, encoding=encoding, errors='replace', newline=None)
+
+def iter_playlist_entries(path):
+    # one entry at a time, the file is never held in memory
+    pls = path.lower().endswith('.pls')
+    with open_playlist_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if pls:
+                key, _, value = line.partition('=')
+                if key.lower().startswith('file') and value:
+                    yield value.strip()
+            elif not line.startswith('#'):
+                yield line
+
+def resolve_entry(entry, base_dir):
+    # absolute, normalized local path for an entry, None for streams
+    if '://' in entry:
+        if not entry.lower().startswith('file://'):
+            return None
+        entry = urllib.parse.unquote(urllib.parse.urlparse(entry).path)
+        if os.name == 'nt' and entry[:1] == '/' and entry[2:3] == ':':
+            entry = entry[1:]
+    if os.sep == '/':
+        entry = entry.replace('\\', '/')  # written on windows
+    return os.path.normpath(os.path.join(base_dir, entry))
+
+def write_m3u8(path, items):
+    # items are (path, song or None); built in memory and written in one go
+    lines = ["#EXTM3U\n"]
+    for file_path, song in items:
+        if song:
+            lines.append(f"#EXTINF:{int(song.get('duration') or 0)},{song['artist']} - {song['title']}\n")
+        lines.append(file_path + "\n")
+    Path(path).write_text("".join(lines), encoding='utf-8')
+
+class Playlist:
+    # a playlist file's entries in order, and the library tracks they resolved to
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.entries = []  # resolved local paths, or the raw entry for streams
+        self.tracks = {}  # entry position -> song
+        self.unresolved = []
+        self.duration = 0.0
+
+class PlaylistImporter(QObject):
+    # feeds a playlist through the event loop a few milliseconds at a time so
+    # a 50k entry file never blocks the gui. `lookup` maps a normalized path
+    # to its song (a dict get)
+    finished = pyqtSignal(object)
+    
+    def __init__(self, path, lookup, name=None, slice_ms=8, parent=None):
+        super().__init__(parent)
+        self.playlist = Playlist(name or Path(path).stem, path)
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.lookup = lookup
+        self.slice = slice_ms / 1000
+        self.entries = iter_playlist_entries(path)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.step)
+    
+    def start(self):
+        self.timer.start(0)
+    
+    def step(self):
+        playlist = self.playlist
+        deadline = time.perf_counter() + self.slice
+        try:
+            while time.perf_counter() < deadline:
+                chunk = list(itertools.islice(self.entries, 256))
+                for entry in chunk:
+                    path = resolve_entry(entry, self.base_dir)
+                    song = self.lookup(path) if path else None
+                    if song:
+                        playlist.tracks[len(playlist.entries)] = song
+                        playlist.duration += song.get('duration') or 0
+                    else:
+                        playlist.unresolved.append(path or entry)
+                    playlist.entries.append(path or entry)
+                if len(chunk) < 256:
+                    self.timer.stop()
+                    self.finished.emit(playlist)
+                    return
+        except Exception as e:
+            print(f"Error reading playlist {playlist.source}: {e}")
+            self.timer.stop()
+            self.finished.emit(playlist)
+
+class Playlists:
+    # smart playlists and imported files behind the BrowsePage group interface.
+    # imported ones are kept as m3u8 copies and resolved again after each scan
+    def __init__(self, smart, folder):
+        self.smart = smart
+        self.folder = Path(folder)
+        self.imported = {}  # name -> Playlist
+        self.revision = 0
+    
+    @property
+    def version(self):
+        return self.smart.version + self.revision
+    
+    def add(self, playlist, save=True):
+        self.imported[playlist.name] = playlist
+        if save:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            write_m3u8(self.folder / f"{playlist.name}.m3u8",
+                       ((entry, playlist.tracks.get(i)) for i, entry in enumerate(playlist.entries)))
+        self.revision += 1
+    
+    def saved(self):
+        return sorted(self.folder.glob("*.m3u8")) if self.folder.exists() else []
+    
+    def groups(self, kind):
+        groups = [(('smart', key), group) for key, group in self.smart.groups(kind)]
+        return groups + [(('file', name), self.group(kind, ('file', name))) for name in sorted(self.imported)]
+    
+    def group(self, kind, key):
+        kind_of, name = key
+        if kind_of == 'smart':
+            return self.smart.group(kind, name) if name < len(self.smart.playlists) else None
+        playlist = self.imported.get(name)
+        if playlist is None:
+            return None
+        covers = (song.get('art_key') for song in playlist.tracks.values())
+        return {'name': playlist.name, 'artist': '', 'tracks': playlist.tracks, 'duration': playlist.duration,
+                'cover': next((c for c in covers if c), None), 'ordered': True}
+
+def read_history_tail(path, since, block=64 * 1024):
+    # history events newest first, reading the log backwards a block at a time
+    # and stopping at the first one older than `since`
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, 2)
+        rest = b''
+        while end > 0:
+            start = max(0, end - block)
+            f.seek(start)
+            lines = (f.read(end - start) + rest).split(b'\n')
+            end = start
+            rest = lines.pop(0) if start > 0 else b''  # partial line, finished by the next block
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event['t'] < since:
+                    return
+                yield event['t'], event['e'], event['p']
+
+class PlayHistory:
+    # append-only log of track loads and completions. log() only queues the
+    # event: a writer thread appends batches to the jsonl file and folds them
+    # into the index's play_count/last_played in one transaction. the home page
+    # sections are answered from small in-memory structures kept as events
+    # arrive, seeded at start from the tail of the log
+    def __init__(self, log_path, roots, window_days=30, keep_recent=100, flush_interval=1.0):
+        self.log_path = Path(log_path)
+        self.roots = roots
+        self.window = window_days * 86400
+        self.keep_recent = keep_recent
+        self.flush_interval = flush_interval
+        self.recent = OrderedDict()  # path -> last load, oldest first
+        self.completions = deque()  # (when, path) inside the window, oldest first
+        self.counts = Counter()  # path -> completions inside the window
+        self.queue = queue.Queue()
+        
+        for when, event, path in read_history_tail(self.log_path, time.time() - self.window):
+            if event == 'load' and path not in self.recent and len(self.recent) < keep_recent:
+                self.recent[path] = when
+                self.recent.move_to_end(path, last=False)
+            elif event == 'complete':
+                self.completions.appendleft((when, path))
+                self.counts[path] += 1
+        
+        self.thread = threading.Thread(target=self.run, name="history", daemon=True)
+        self.thread.start()
+    
+    def log(self, event, path, when=None):
+        when = when or time.time()
+        if event == 'load':
+            self.recent[path] = when
+            self.recent.move_to_end(path)
+            if len(self.recent) > self.keep_recent:
+                self.recent.popitem(last=False)
+        elif event == 'complete':
+            self.completions.append((when, path))
+            self.counts[path] += 1
+            self.expire(when)
+        self.queue.put((when, event, path))
+    
+    def expire(self, now):
+        while self.completions and self.completions[0][0] < now - self.window:
+            _, path = self.completions.popleft()
+            self.counts[path] -= 1
+            if not self.counts[path]:
+                del self.counts[path]
+    
+    def recently_played(self, k):
+        # newest first, one entry per track
+        return [path for path, _ in zip(reversed(self.recent), range(k))]
+    
+    def on_repeat(self, k, minimum=2):
+        self.expire(time.time())
+        return [path for path, count in self.counts.most_common(k) if count >= minimum]
+    
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+    
+    def run(self):
+        indexes = {}  # shard path -> LibraryIndex, sqlite connections stay on their thread
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # gather whatever else arrives within the interval, one write for all
+            while batch[-1] is not None and len(batch) < 512:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            if not batch:
+                continue
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write("".join(json.dumps({'t': when, 'e': event, 'p': path}) + "\n"
+                                    for when, event, path in batch))
+                by_shard = {}
+                for event in batch:
+                    shard = self.roots.shard_of(event[2])
+                    # files outside every root, or of a root removed meanwhile, only go to the log
+                    if shard is not None and shard.exists():
+                        by_shard.setdefault(shard, []).append(event)
+                for shard, events in by_shard.items():
+                    if shard not in indexes:
+                        indexes[shard] = LibraryIndex(shard)
+                    indexes[shard].record_plays(events)
+            except Exception as e:
+                print(f"Error writing play history: {e}")
+        for index in indexes.values():
+            index.close()
 
 class Sidebar(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.main_window = parent
         self.setFixedWidth(230)
-        self.setStyleSheet("""
-            background-color: #000000;
-            color: #b3b3b3;
-        """)
+        self.setObjectName("sidebar")
+        self.setAttribute(Qt.WidgetAttribute.WA_StyledBackground)
 
         layout = QVBoxLayout()
         layout.setContentsMargins(20, 20, 20, 20)
         layout.setSpacing(10)
         #logo and title
         logo = QLabel("♫ MyMusic")
-        logo.setStyleSheet("color: white; font-size: 24px; font-weight: bold; margin-bottom: 20px;")
+        logo.setObjectName("logo")
         layout.addWidget(logo)
         #navigation
         self.home_btn = self.create_nav_button("🏠 Home")
         self.search_btn = self.create_nav_button("🔍 Search")
-        library_btn = self.create_nav_button("📚 Your Library")
+        self.library_btn = self.create_nav_button("📚 Your Library")
+        self.artists_btn = self.create_nav_button("🎤 Artists")
+        self.albums_btn = self.create_nav_button("💿 Albums")
+        self.playlists_btn = self.create_nav_button("✨ Playlists")
 
         self.home_btn.clicked.connect(lambda: self.main_window.switch_page(0))
         self.search_btn.clicked.connect(lambda: self.main_window.switch_page(1))
+        self.library_btn.clicked.connect(lambda: self.main_window.switch_page(2))
+        self.artists_btn.clicked.connect(lambda: self.main_window.switch_page(3))
+        self.albums_btn.clicked.connect(lambda: self.main_window.switch_page(4))
+        self.playlists_btn.clicked.connect(lambda: self.main_window.switch_page(5))
 
         layout.addWidget(self.home_btn)
         layout.addWidget(self.search_btn)
-        layout.addWidget(library_btn)
+        layout.addWidget(self.library_btn)
+        layout.addWidget(self.artists_btn)
+        layout.addWidget(self.albums_btn)
+        layout.addWidget(self.playlists_btn)
         
         layout.addSpacing(20)
         #
         # folder selection btn
-        self.folder_btn = QPushButton("📁 Select Music Folder")
-        self.folder_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #1db954;
-                color: white;
-                border: none;
-                padding: 10px;
-                border-radius: 20px;
-                font-size: 13px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #1ed760;
-            }
-        """)
+        self.folder_btn = QPushButton("📁 Add Music Folder")
+        self.folder_btn.setObjectName("folderButton")
         self.folder_btn.clicked.connect(self.select_folder)
         layout.addWidget(self.folder_btn)
         
+        self.duplicates_btn = self.create_nav_button("🧬 Find Duplicates")
+        self.duplicates_btn.clicked.connect(lambda: self.main_window.find_duplicates())
+        layout.addWidget(self.duplicates_btn)
+        
         layout.addStretch()
         self.setLayout(layout)
     
     def create_nav_button(self, text):
         btn = QPushButton(text)
-        btn.setStyleSheet("""
-            QPushButton {
-                background-color: transparent;
-                color: #b3b3b3;
-                border: none;
-                text-align: left;
-                padding: 8px;
-                font-size: 14px;
-            }
-            QPushButton:hover {
-                color: white;
-            }
-        """)
+        btn.setProperty("role", "nav")
         return btn
     
     def select_folder(self):
-        folder = QFileDialog.getExistingDirectory(self, "Select Music Folder")
+        folder = QFileDialog.getExistingDirectory(self, "Add Music Folder")
         if folder:
             self.main_window.load_music_folder(folder)
 
+def scroll_offsets(view):
+    return view.horizontalScrollBar().value(), view.verticalScrollBar().value()
+
+def restore_scroll(view, offsets):
+    # scroll ranges are only known once the restored page has been laid out
+    def apply():
+        view.horizontalScrollBar().setValue(offsets[0])
+        view.verticalScrollBar().setValue(offsets[1])
+    QTimer.singleShot(0, apply)
+
 class TopBar(QWidget):
     def __init__(self):
         super().__init__()
         self.setFixedHeight(60)
-        self.setStyleSheet("""
-            background-color: #121212;
-            color: white;
-        """)
         
         layout = QHBoxLayout()
         layout.setContentsMargins(20, 0, 20, 0)
         
-        # nav arrows // set nav switch later
-        back_btn = QPushButton("◀")
-        forward_btn = QPushButton("▶")
+        # nav arrows, wired to the window's page history
+        self.back_btn = back_btn = QPushButton("◀")
+        self.forward_btn = forward_btn = QPushButton("▶")
         
         for btn in [back_btn, forward_btn]:
             btn.setFixedSize(32, 32)
-            btn.setStyleSheet("""
-                QPushButton {
-                    background-color: rgba(0,0,0,0.7);
-                    border-radius: 16px;
-                    color: white;
-                    font-size: 14px;
-                }
-                QPushButton:hover {
-                    background-color: rgba(40,40,40,0.9);
-                }
-            """)
+            btn.setProperty("role", "history")
+            btn.setEnabled(False)
         
         layout.addWidget(back_btn)
         layout.addWidget(forward_btn)
@@ -126,20 +2478,12 @@ class TopBar(QWidget):
         self.setLayout(layout)
 
 class MusicCard(QWidget):
-    def __init__(self, title, artist, file_path, album_art=None, parent=None):
+    def __init__(self, title, artist, file_path, art_key=None, parent=None):
         super().__init__()
         self.file_path = file_path
         self.parent_window = parent
         self.setFixedSize(160, 220)
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #181818;
-                border-radius: 8px;
-            }
-            QWidget:hover {
-                background-color: #282828;
-            }
-        """)
+        self.setAttribute(Qt.WidgetAttribute.WA_StyledBackground)  # the card background comes from the style sheet
         
         layout = QVBoxLayout()
         layout.setContentsMargins(15, 15, 15, 15)
@@ -147,32 +2491,25 @@ class MusicCard(QWidget):
         # album art
         self.album_art = QLabel()
         self.album_art.setFixedSize(130, 130)
-        self.album_art.setStyleSheet("""
-            background-color: #282828;
-            border-radius: 8px;
-        """)
+        self.album_art.setObjectName("cardArt")
         self.album_art.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
-        if album_art:
-            pixmap = QPixmap()
-            pixmap.loadFromData(album_art)
-            scaled_pixmap = pixmap.scaled(130, 130, Qt.AspectRatioMode.KeepAspectRatioByExpanding, 
-                                         Qt.TransformationMode.SmoothTransformation)
-            self.album_art.setPixmap(scaled_pixmap)
-        else:
-            self.album_art.setText("🎵")
-            self.album_art.setStyleSheet(self.album_art.styleSheet() + "font-size: 48px;")
+        # cover is decoded on first paint, so cards scrolled out of view cost nothing
+        self.art_key = art_key
+        self.shown_key = None  # the cover on the label, until the governor evicts it
+        self.album_art.setText("🎵")
         
-        title_label = QLabel(title[:20] + "..." if len(title) > 20 else title)
-        title_label.setStyleSheet("color: white; font-weight: bold; font-size: 13px;")
-        title_label.setWordWrap(True)
+        self.title_label = QLabel()
+        self.title_label.setObjectName("cardTitle")
+        self.title_label.setWordWrap(True)
         
-        artist_label = QLabel(artist[:20] + "..." if len(artist) > 20 else artist)
-        artist_label.setStyleSheet("color: #b3b3b3; font-size: 12px;")
+        self.artist_label = QLabel()
+        self.artist_label.setProperty("role", "caption")
+        self.set_text(title, artist)
         
         layout.addWidget(self.album_art)
-        layout.addWidget(title_label)
-        layout.addWidget(artist_label)
+        layout.addWidget(self.title_label)
+        layout.addWidget(self.artist_label)
         layout.addStretch()
         
         self.setLayout(layout)
@@ -180,6 +2517,40 @@ class MusicCard(QWidget):
         # make it clickable
         self.setCursor(Qt.CursorShape.PointingHandCursor)
     
+    def set_text(self, title, artist):
+        self.title_label.setText(title[:20] + "..." if len(title) > 20 else title)
+        self.artist_label.setText(artist[:20] + "..." if len(artist) > 20 else artist)
+    
+    def set_info(self, title, artist, art_key):
+        # placeholder card getting its tags once the file has been read
+        self.set_text(title, artist)
+        self.art_key = art_key
+        if art_key:
+            self.update()
+    
+    def paintEvent(self, event):
+        if self.art_key and self.parent_window:
+            pixmap = self.parent_window.memory.pixmap(self.art_key, 130, holder=self)
+            if pixmap:
+                self.album_art.setPixmap(pixmap)
+                self.shown_key = self.art_key
+            self.art_key = None
+        super().paintEvent(event)
+    
+    def drop_pixmap(self, key):
+        # evicted from the governor: let the label's copy go too, the next paint
+        # decodes it again. not repainted now, a visible card would just evict
+        # the next one
+        if key != self.shown_key:
+            return
+        try:
+            self.album_art.clear()
+            self.album_art.setText("🎵")
+        except RuntimeError:
+            return  # the card itself is gone
+        self.shown_key = None
+        self.art_key = key
+    
     def mousePressEvent(self, event):
         if self.parent_window:
             self.parent_window.play_song(self.file_path)
@@ -188,33 +2559,36 @@ class HomePage(QWidget):
     def __init__(self, parent=None):
         super().__init__()
         self.main_window = parent
-        self.setStyleSheet("background-color: #121212;")
         
         self.main_layout = QVBoxLayout()
         self.main_layout.setContentsMargins(20, 20, 20, 100)
         
+        # history sections, hidden until something has been played
+        self.sections = {}
+        for name in ("Recently played", "On repeat"):
+            section = QWidget()
+            section_layout = QVBoxLayout()
+            section_layout.setContentsMargins(0, 0, 0, 10)
+            label = QLabel(name)
+            label.setProperty("role", "sectionTitle")
+            section_layout.addWidget(label)
+            row = QHBoxLayout()
+            row.setSpacing(20)
+            row.setAlignment(Qt.AlignmentFlag.AlignLeft)
+            section_layout.addLayout(row)
+            section.setLayout(section_layout)
+            section.hide()
+            self.sections[name] = (section, row)
+            self.main_layout.addWidget(section)
+        
         # section title
         self.title = QLabel("Your Music Library")
-        self.title.setStyleSheet("color: white; font-size: 28px; font-weight: bold; margin-bottom: 20px;")
+        self.title.setProperty("role", "pageTitle")
         self.main_layout.addWidget(self.title)
         
         # scrool for music cards
-        scroll = QScrollArea()
+        self.scroll = scroll = QScrollArea()
         scroll.setWidgetResizable(True)
-        scroll.setStyleSheet("""
-            QScrollArea {
-                border: none;
-                background-color: #121212;
-            }
-            QScrollBar:vertical {
-                background-color: #121212;
-                width: 12px;
-            }
-            QScrollBar::handle:vertical {
-                background-color: #282828;
-                border-radius: 6px;
-            }
-        """)
         
         self.cards_widget = QWidget()
         self.cards_layout = QHBoxLayout()
@@ -226,38 +2600,105 @@ class HomePage(QWidget):
         self.main_layout.addWidget(scroll)
         
         self.setLayout(self.main_layout)
+        
+        self.cards = []  # in layout order
+        self.cards_by_path = {}
+        
+        # tell the window what is on screen once scrolling settles
+        self.scroll_timer = QTimer(self)
+        self.scroll_timer.setSingleShot(True)
+        self.scroll_timer.setInterval(50)
+        self.scroll_timer.timeout.connect(self.viewport_changed)
+        scroll.horizontalScrollBar().valueChanged.connect(lambda _: self.scroll_timer.start())
+        scroll.verticalScrollBar().valueChanged.connect(lambda _: self.scroll_timer.start())
     
-    def add_song_card(self, title, artist, file_path, album_art):
-        card = MusicCard(title, artist, file_path, album_art, self.main_window)
-        self.cards_layout.addWidget(card)
+    def save_state(self):
+        return {'scroll': scroll_offsets(self.scroll)}
+    
+    def restore_state(self, state):
+        restore_scroll(self.scroll, state['scroll'])
+    
+    def set_section(self, name, songs):
+        section, row = self.sections[name]
+        while row.count():
+            child = row.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+        for song in songs:
+            card = MusicCard(song['title'], song['artist'], song['path'], song['art_key'], self.main_window)
+            self.main_window.memory.track_widget(card, "history card")
+            row.addWidget(card)
+        section.setVisible(bool(songs))
+    
+    def viewport_changed(self):
+        if self.main_window:
+            self.main_window.update_scan_priority()
+    
+    def add_song_card(self, title, artist, file_path, art_key):
+        self.insert_song_card(len(self.cards), title, artist, file_path, art_key)
+    
+    def insert_song_card(self, index, title, artist, file_path, art_key):
+        card = MusicCard(title, artist, file_path, art_key, self.main_window)
+        self.main_window.memory.track_widget(card, "card")
+        self.cards_layout.insertWidget(index, card)
+        self.cards.insert(index, card)
+        self.cards_by_path[file_path] = card
+    
+    def remove_song_card(self, file_path):
+        card = self.cards_by_path.pop(file_path, None)
+        if card:
+            self.cards.remove(card)
+            self.cards_layout.removeWidget(card)
+            card.deleteLater()
+    
+    def clear_cards(self):
+        while self.cards_layout.count():
+            child = self.cards_layout.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+        self.cards = []
+        self.cards_by_path = {}
+    
+    def paths_by_priority(self):
+        # cards on screen in layout order, then the ones within a screen of it,
+        # nearest first. cards are laid out in reading order so the first one
+        # in range is found by bisection
+        self.cards_layout.activate()  # geometry of cards inserted since the last pass
+        viewport = self.scroll.viewport()
+        view = viewport.rect().translated(-self.cards_widget.x(), -self.cards_widget.y())
+        near = view.adjusted(-view.width(), -view.height(), view.width(), view.height())
+        start = bisect.bisect_left(self.cards, True, key=lambda card: not (
+            card.geometry().bottom() < near.top() or card.geometry().right() < near.left()))
+        visible, nearby = [], []
+        center = view.center()
+        for card in self.cards[start:]:
+            rect = card.geometry()
+            if rect.top() > near.bottom() or rect.left() > near.right():
+                break
+            if rect.intersects(view):
+                visible.append(card.file_path)
+            elif rect.intersects(near):
+                distance = (rect.center() - center).manhattanLength()
+                nearby.append((distance, card.file_path))
+        return visible + [path for _, path in sorted(nearby)]
 
 class SearchPage(QWidget):
     def __init__(self, parent=None):
         super().__init__()
         self.main_window = parent
-        self.setStyleSheet("background-color: #121212;")
         
         layout = QVBoxLayout()
         layout.setContentsMargins(20, 20, 20, 100)
         
         # search title
         title = QLabel("Search")
-        title.setStyleSheet("color: white; font-size: 28px; font-weight: bold; margin-bottom: 20px;")
+        title.setProperty("role", "pageTitle")
         layout.addWidget(title)
         
         # search bar
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("What do you want to listen to?")
-        self.search_input.setStyleSheet("""
-            QLineEdit {
-                background-color: white;
-                border: none;
-                border-radius: 20px;
-                padding: 12px 20px;
-                font-size: 14px;
-                color: black;
-            }
-        """)
+        self.search_input.setObjectName("searchInput")
         self.search_input.setFixedWidth(400)
         self.search_input.textChanged.connect(self.perform_search)
         layout.addWidget(self.search_input)
@@ -266,26 +2707,12 @@ class SearchPage(QWidget):
         
         # search results
         self.results_label = QLabel("Search for songs, artists, or albums")
-        self.results_label.setStyleSheet("color: #b3b3b3; font-size: 16px;")
+        self.results_label.setObjectName("searchSummary")
         layout.addWidget(self.results_label)
         
         # scroll area for results
-        scroll = QScrollArea()
+        self.scroll = scroll = QScrollArea()
         scroll.setWidgetResizable(True)
-        scroll.setStyleSheet("""
-            QScrollArea {
-                border: none;
-                background-color: #121212;
-            }
-            QScrollBar:vertical {
-                background-color: #121212;
-                width: 12px;
-            }
-            QScrollBar::handle:vertical {
-                background-color: #282828;
-                border-radius: 6px;
-            }
-        """)
         
         self.results_widget = QWidget()
         self.results_layout = QHBoxLayout()
@@ -298,43 +2725,599 @@ class SearchPage(QWidget):
         
         layout.addStretch()
         self.setLayout(layout)
+        
+        # what is on screen, kept so history can bring it back without searching again
+        self.query = ""
+        self.results = []
+    
+    def save_state(self):
+        return {'query': self.query, 'results': self.results, 'scroll': scroll_offsets(self.scroll)}
+    
+    def restore_state(self, state):
+        if state['results'] is not self.results:
+            self.search_input.blockSignals(True)
+            self.search_input.setText(state['query'])
+            self.search_input.blockSignals(False)
+            self.show_results(state['query'], state['results'])
+        restore_scroll(self.scroll, state['scroll'])
     
     def perform_search(self, query):
+        with self.main_window.watchdog.action("search"):
+            self._perform_search(query)
+    
+    def _perform_search(self, query):
+        results = []
+        if query and self.main_window.music_library:
+            needle = query.lower()
+            for song_info in self.main_window.visible_songs():
+                if (needle in song_info['title'].lower() or 
+                    needle in song_info['artist'].lower()):
+                    results.append(song_info)
+        self.show_results(query, results)
+    
+    def show_results(self, query, results):
+        self.query = query
+        self.results = results
+        
         # clear previous results
         while self.results_layout.count():
             child = self.results_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
         
-        if not query or not self.main_window.music_library:
-            self.results_label.setText("Search for songs, artists, or albums")
-            return
+        if not query or not self.main_window.music_library:
+            self.results_label.setText("Search for songs, artists, or albums")
+            return
+        
+        if results:
+            self.results_label.setText(f"Found {len(results)} result(s)")
+            for song in results[:10]:  # Limit to 10 results
+                card = MusicCard(song['title'], song['artist'], 
+                               song['path'], song['art_key'], self.main_window)
+                self.main_window.memory.track_widget(card, "search result")
+                self.results_layout.addWidget(card)
+        else:
+            self.results_label.setText("No results found")
+
+# combining marks left over from NFKD decomposition (accents, umlauts, ...)
+COMBINING_MARKS = dict.fromkeys(
+    c for start, end in ((0x300, 0x370), (0x1AB0, 0x1B00), (0x1DC0, 0x1E00), (0x20D0, 0x2100), (0xFE20, 0xFE30))
+    for c in range(start, end)
+)
+
+def collation_key(text):
+    # case and accent insensitive, so "Émilie" sorts next to "emma"
+    text = text.casefold()
+    if text.isascii():
+        return text
+    return unicodedata.normalize('NFKD', text).translate(COMBINING_MARKS)
+
+def sort_keys(songs, field):
+    # one int per song whose order is the collation order of the field. text
+    # is ranked through its distinct values, artists and albums repeat a lot
+    values = [song.get(field) for song in songs]
+    if field in LibraryModel.NUMERIC:
+        return np.array([v or 0 for v in values], dtype=np.float64)
+    keys = [collation_key(v or '') for v in values]
+    rank = {key: i for i, key in enumerate(sorted(set(keys)))}
+    return np.fromiter((rank[key] for key in keys), dtype=np.int32, count=len(keys))
+
+class LibraryModel(QAbstractTableModel):
+    # table over a snapshot of the library. rows are exposed a page at a time
+    # through canFetchMore/fetchMore and sorting permutes `order` with numpy on
+    # precomputed keys: each sort is stable, so the previous order breaks ties
+    # and clicking artist then album gives album, artist
+    COLUMNS = (('Title', 'title'), ('Artist', 'artist'), ('Album', 'album'),
+               ('Duration', 'duration'), ('Format', 'format'), ('Date Added', 'added_at'))
+    NUMERIC = ('duration', 'added_at')
+    PAGE = 500
+    
+    keys_ready = pyqtSignal(object)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.songs = []
+        self.order = np.arange(0)
+        self.loaded = 0
+        self.keys = {}  # field -> sort keys for self.songs
+        self.sorts = []  # (column, order) applied so far, oldest first
+        self.pending = None  # (songs, keys) waiting for their keys
+        self.keys_ready.connect(self.on_keys_ready)
+    
+    def set_songs(self, songs):
+        # keys are built off the gui thread. while a sort is active the current
+        # snapshot stays up until the new one can be shown sorted, otherwise it
+        # is swapped in right away and the keys only spare the first click
+        songs, keys = list(songs), {}
+        if self.sorts:
+            self.pending = (songs, keys)
+        else:
+            self.pending = None
+            self.swap(songs, keys)
+        threading.Thread(target=self.precompute, args=(songs, keys),
+                         name="collation", daemon=True).start()
+    
+    def swap(self, songs, keys):
+        self.beginResetModel()
+        self.songs = songs
+        self.keys = keys
+        self.order = np.arange(len(songs))
+        for column, order in self.sorts:
+            self.order = self.sorted_order(column, order)
+        self.loaded = min(len(songs), max(self.loaded, self.PAGE))
+        self.endResetModel()
+    
+    def precompute(self, songs, keys):
+        for _, field in self.COLUMNS:
+            # superseded by a later set_songs, stop wasting the gil on it
+            if keys is not self.keys and not (self.pending and keys is self.pending[1]):
+                return
+            keys.setdefault(field, sort_keys(songs, field))
+        self.keys_ready.emit(keys)
+    
+    def on_keys_ready(self, keys):
+        if self.pending and keys is self.pending[1]:
+            self.swap(*self.pending)
+            self.pending = None
+    
+    def field_keys(self, column):
+        field = self.COLUMNS[column][1]
+        if field not in self.keys:
+            self.keys[field] = sort_keys(self.songs, field)
+        return self.keys[field]
+    
+    def sorted_order(self, column, order):
+        keys = self.field_keys(column)[self.order]
+        if order == Qt.SortOrder.DescendingOrder:
+            keys = -keys
+        return self.order[np.argsort(keys, kind='stable')]
+    
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if column < 0 or not self.songs:
+            return
+        self.layoutAboutToBeChanged.emit()
+        self.order = self.sorted_order(column, order)
+        self.sorts = [entry for entry in self.sorts if entry[0] != column][-3:] + [(column, order)]
+        self.layoutChanged.emit()
+    
+    def song_at(self, row):
+        return self.songs[self.order[row]]
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.songs)
+    
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(self.PAGE, len(self.songs) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        field = self.COLUMNS[index.column()][1]
+        value = self.song_at(index.row()).get(field)
+        if field == 'duration':
+            return f"{int(value or 0) // 60}:{int(value or 0) % 60:02d}"
+        if field == 'added_at':
+            return time.strftime("%Y-%m-%d", time.localtime(value)) if value else ""
+        return value or ""
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section][0]
+        return None
+
+class LibraryPage(QWidget):
+    def __init__(self, parent=None):
+        super().__init__()
+        self.main_window = parent
+        self.dirty = True
+        
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 100)
+        
+        self.title = QLabel("Your Library")
+        self.title.setProperty("role", "pageTitle")
+        layout.addWidget(self.title)
+        
+        # the library folders, each scanned and mounted on its own
+        self.roots_list = QListWidget()
+        self.roots_list.setFixedHeight(96)
+        self.roots_list.currentItemChanged.connect(lambda *_: self.update_root_buttons())
+        layout.addWidget(self.roots_list)
+        tools = QHBoxLayout()
+        self.rescan_btn = QPushButton("🔄 Rescan")
+        self.rescan_btn.clicked.connect(lambda: self.main_window.scan_root(self.selected_root()))
+        self.mount_btn = QPushButton("⏏ Unmount")
+        self.mount_btn.clicked.connect(self.toggle_mount)
+        self.remove_btn = QPushButton("🗑 Remove")
+        self.remove_btn.clicked.connect(lambda: self.main_window.remove_root(self.selected_root()))
+        problems_btn = QPushButton("⚠ Problem Files")
+        problems_btn.clicked.connect(self.show_problems)
+        for button in (self.rescan_btn, self.mount_btn, self.remove_btn, problems_btn):
+            button.setProperty("role", "pill")
+            tools.addWidget(button)
+        tools.addStretch()
+        layout.addLayout(tools)
+        
+        self.model = LibraryModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setShowGrid(False)
+        self.table.setWordWrap(False)
+        # fixed row heights, so the view never measures rows to lay them out
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(28)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        for column, width in enumerate((260, 180, 200, 70, 60)):
+            self.table.setColumnWidth(column, width)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.doubleClicked.connect(self.play_row)
+        layout.addWidget(self.table)
+        
+        self.setLayout(layout)
+        
+        # the library changes in bursts while scanning, refresh at most this often
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(500)
+        self.refresh_timer.timeout.connect(self.refresh)
+    
+    def library_changed(self):
+        self.dirty = True
+        if self.isVisible() and not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+    
+    def refresh(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        songs = self.main_window.visible_songs()
+        self.model.set_songs(songs)
+        self.title.setText(f"Your Library ({len(songs)} songs)")
+    
+    def showEvent(self, event):
+        self.refresh()
+        super().showEvent(event)
+    
+    def play_row(self, index):
+        self.main_window.play_song(self.model.song_at(index.row())['path'])
+    
+    def show_roots(self):
+        window = self.main_window
+        selected = self.selected_root()
+        self.roots_list.clear()
+        for entry in window.roots.entries:
+            root = entry['path']
+            if root == window.scanning:
+                status = "scanning…"
+            elif root in window.scan_queue:
+                status = "waiting to scan"
+            elif not entry['mounted']:
+                status = "unmounted"
+            else:
+                status = f"{len(window.root_songs(root))} songs"
+            item = QListWidgetItem(f"{root}  ·  {status}")
+            item.setData(Qt.ItemDataRole.UserRole, root)
+            self.roots_list.addItem(item)
+            if root == selected:
+                self.roots_list.setCurrentItem(item)
+        self.update_root_buttons()
+    
+    def selected_root(self):
+        item = self.roots_list.currentItem()
+        return item.data(Qt.ItemDataRole.UserRole) if item else None
+    
+    def update_root_buttons(self):
+        entry = self.main_window.roots.entry(self.selected_root())
+        mounted = bool(entry and entry['mounted'])
+        self.rescan_btn.setEnabled(mounted)
+        self.mount_btn.setEnabled(entry is not None)
+        self.mount_btn.setText("⏏ Unmount" if mounted or entry is None else "💿 Mount")
+        self.remove_btn.setEnabled(entry is not None)
+    
+    def show_problems(self):
+        # what scans could not read and why, straight from the shards
+        failures = self.main_window.roots.load_failures()
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"Problem Files ({len(failures)})")
+        dialog.resize(760, 420)
+        report = QPlainTextEdit(problem_report(failures))
+        report.setReadOnly(True)
+        layout = QVBoxLayout()
+        layout.addWidget(report)
+        dialog.setLayout(layout)
+        dialog.show()
+    
+    def toggle_mount(self):
+        root = self.selected_root()
+        if self.main_window.roots.entry(root)['mounted']:
+            self.main_window.unmount_root(root)
+        else:
+            self.main_window.mount_root(root)
+    
+    def save_state(self):
+        return {'rows': self.model.rowCount(), 'scroll': scroll_offsets(self.table)}
+    
+    def restore_state(self, state):
+        # rows come in pages, fetch down to where the view was
+        while self.model.rowCount() < state['rows'] and self.model.canFetchMore(QModelIndex()):
+            self.model.fetchMore(QModelIndex())
+        restore_scroll(self.table, state['scroll'])
+
+def problem_report(failures):
+    # failures as LibraryIndex.load_failures gives them
+    lines = []
+    for path, (size, mtime, reason, failed_at) in sorted(failures.items()):
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(failed_at))
+        lines.append(f"{path}\n    {reason}  ({size / 1e6:.1f} MB, failed {when})")
+    return "\n".join(lines) or "Every file in the library folders could be read."
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+class BrowsePage(QWidget):
+    # artists, albums or playlists on the left, the opened one's tracks on the
+    # right. groups come from the window's LibraryAggregates or SmartPlaylists
+    TITLES = {'artist': "Artists", 'album': "Albums", 'playlist': "Playlists"}
+    
+    def __init__(self, kind, parent=None):
+        super().__init__()
+        self.kind = kind
+        self.main_window = parent
+        self.version = -1
+        self.current_key = None
+        
+        layout = QVBoxLayout()
+        layout.setContentsMargins(20, 20, 20, 100)
+        
+        self.title = QLabel(self.TITLES[kind])
+        self.title.setProperty("role", "pageTitle")
+        layout.addWidget(self.title)
+        
+        if kind == 'playlist':
+            tools = QHBoxLayout()
+            import_btn = QPushButton("📥 Import M3U/PLS…")
+            import_btn.setProperty("role", "pill")
+            import_btn.clicked.connect(self.import_playlist)
+            self.export_btn = QPushButton("📤 Export M3U8…")
+            self.export_btn.setProperty("role", "pill")
+            self.export_btn.clicked.connect(self.export_playlist)
+            self.status = QLabel("")
+            self.status.setProperty("role", "caption")
+            tools.addWidget(import_btn)
+            tools.addWidget(self.export_btn)
+            tools.addWidget(self.status)
+            tools.addStretch()
+            layout.addLayout(tools)
+        
+        row = QHBoxLayout()
+        row.setSpacing(20)
+        self.group_list = QListWidget()
+        self.group_list.setFixedWidth(300)
+        self.group_list.setUniformItemSizes(True)
+        self.group_list.currentItemChanged.connect(self.open_item)
+        row.addWidget(self.group_list)
         
-        query = query.lower()
-        results = []
+        detail = QVBoxLayout()
+        header = QHBoxLayout()
+        self.cover = QLabel("🎵")
+        self.cover.setFixedSize(160, 160)
+        self.cover.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.cover.setObjectName("groupCover")
+        header.addWidget(self.cover)
+        info = QVBoxLayout()
+        self.group_name = QLabel("")
+        self.group_name.setObjectName("groupName")
+        self.group_name.setWordWrap(True)
+        self.group_stats = QLabel("")
+        self.group_stats.setObjectName("groupStats")
+        info.addStretch()
+        info.addWidget(self.group_name)
+        info.addWidget(self.group_stats)
+        header.addLayout(info)
+        header.addStretch()
+        detail.addLayout(header)
         
-        for song_info in self.main_window.music_library:
-            if (query in song_info['title'].lower() or 
-                query in song_info['artist'].lower()):
-                results.append(song_info)
+        self.track_list = QListWidget()
+        self.track_list.setUniformItemSizes(True)
+        self.track_list.itemDoubleClicked.connect(
+            lambda item: self.main_window.play_song(item.data(Qt.ItemDataRole.UserRole)))
+        detail.addWidget(self.track_list)
+        row.addLayout(detail)
+        layout.addLayout(row)
         
-        if results:
-            self.results_label.setText(f"Found {len(results)} result(s)")
-            for song in results[:10]:  # Limit to 10 results
-                card = MusicCard(song['title'], song['artist'], 
-                               song['path'], song['album_art'], self.main_window)
-                self.results_layout.addWidget(card)
+        self.setLayout(layout)
+        
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(500)
+        self.refresh_timer.timeout.connect(self.refresh)
+    
+    def library_changed(self):
+        if self.isVisible() and not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+    
+    def source(self):
+        if self.kind == 'playlist':
+            return self.main_window.playlists
+        return self.main_window.aggregates
+    
+    def import_playlist(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Playlist", "", "Playlists (*.m3u *.m3u8 *.pls)")
+        if path:
+            self.status.setText(f"Importing {Path(path).name}…")
+            self.main_window.import_playlist(path)
+    
+    def export_playlist(self):
+        # the open playlist, or the library in playback order. while tracks are
+        # queued, a menu offers the queue instead
+        group = self.source().group(self.kind, self.current_key) if self.current_key is not None else None
+        songs = list(group['tracks'].values()) if group else self.main_window.music_library
+        name = group['name'] if group else "Library"
+        items = [(song['path'], song) for song in songs]
+        queue = list(self.main_window.now_playing.queue)
+        if queue:
+            menu = QMenu(self)
+            menu.addAction(f"{name} ({len(items)} tracks)")
+            queued = menu.addAction(f"Queue ({len(queue)} tracks)")
+            chosen = menu.exec(self.export_btn.mapToGlobal(self.export_btn.rect().bottomLeft()))
+            if chosen is None:
+                return
+            if chosen is queued:
+                # queued files outside the library go out as bare paths
+                name = "Queue"
+                items = [(path, self.main_window.songs_by_path.get(path)) for path in queue]
+        path, _ = QFileDialog.getSaveFileName(self, "Export Playlist", f"{name}.m3u8", "M3U8 (*.m3u8)")
+        if path:
+            write_m3u8(path, items)
+            self.status.setText(f"Exported {len(items)} tracks to {Path(path).name}")
+    
+    def refresh(self):
+        source = self.source()
+        if source.version == self.version:
+            return
+        self.version = source.version
+        self.group_list.blockSignals(True)
+        self.group_list.clear()
+        current = None
+        for key, group in source.groups(self.kind):
+            label = f"{group['name']} — {group['artist']}" if self.kind == 'album' else group['name']
+            item = QListWidgetItem(f"{label}  ({len(group['tracks'])})")
+            item.setData(Qt.ItemDataRole.UserRole, key)
+            self.group_list.addItem(item)
+            if key == self.current_key:
+                current = item
+        self.group_list.blockSignals(False)
+        self.title.setText(f"{self.TITLES[self.kind]} ({self.group_list.count()})")
+        if current:
+            self.group_list.setCurrentItem(current)
         else:
-            self.results_label.setText("No results found")
+            self.open_group(None)
+    
+    def showEvent(self, event):
+        self.refresh()
+        super().showEvent(event)
+    
+    def open_item(self, item, previous=None):
+        self.open_group(item.data(Qt.ItemDataRole.UserRole) if item else None)
+    
+    def save_state(self):
+        return {'key': self.current_key, 'groups': scroll_offsets(self.group_list),
+                'tracks': scroll_offsets(self.track_list)}
+    
+    def restore_state(self, state):
+        if state['key'] != self.current_key:
+            for row in range(self.group_list.count()):
+                item = self.group_list.item(row)
+                if item.data(Qt.ItemDataRole.UserRole) == state['key']:
+                    self.group_list.setCurrentItem(item)
+                    break
+            else:
+                self.group_list.setCurrentItem(None)
+                self.open_group(None)
+        restore_scroll(self.group_list, state['groups'])
+        restore_scroll(self.track_list, state['tracks'])
+    
+    def open_group(self, key):
+        self.current_key = key
+        group = self.source().group(self.kind, key) if key is not None else None
+        self.track_list.clear()
+        self.cover.clear()
+        self.cover.setText("🎵")
+        if group is None:
+            self.group_name.setText("")
+            self.group_stats.setText("")
+            return
+        self.group_name.setText(group['name'])
+        self.group_stats.setText(
+            (f"{group['artist']} • " if self.kind == 'album' else "")
+            + f"{len(group['tracks'])} tracks • {format_duration(group['duration'])}")
+        pixmap = self.main_window.memory.pixmap(group['cover'], 160) if group['cover'] else None
+        if pixmap:
+            self.cover.setPixmap(pixmap)
+        tracks = list(group['tracks'].values())
+        if not group.get('ordered'):
+            tracks.sort(key=lambda song: (
+                collation_key(song.get('album') or ''), track_number(song), collation_key(song['title'])))
+        for song in tracks:
+            if self.kind == 'album':
+                text = song['title']
+            elif self.kind == 'playlist':
+                text = f"{song['title']}  ·  {song['artist']}"
+            else:
+                text = f"{song['title']}  ·  {song.get('album') or ''}"
+            item = QListWidgetItem(f"{text}  ({format_duration(song.get('duration') or 0)})")
+            item.setData(Qt.ItemDataRole.UserRole, song['path'])
+            self.track_list.addItem(item)
+
+class WaveformSlider(QSlider):
+    # seek slider with the track's peak overview painted behind the handle.
+    # the overview is rendered once per size into two pixmaps (played / not
+    # played) so position ticks only blit
+    def __init__(self, parent=None):
+        super().__init__(Qt.Orientation.Horizontal, parent)
+        self.peaks = None
+        self.rendered = None
+    
+    def set_peaks(self, peaks):
+        self.peaks = peaks
+        self.rendered = None
+        self.update()
+    
+    def render_peaks(self):
+        size = self.size()
+        pixmaps = []
+        for color in (theme.colors['accent'], theme.colors['track']):
+            pixmap = QPixmap(size)
+            pixmap.fill(Qt.GlobalColor.transparent)
+            painter = QPainter(pixmap)
+            painter.setPen(QColor(color))
+            height = size.height() - 1
+            columns = np.arange(size.width()) * self.peaks.shape[1] // max(size.width(), 1)
+            lows = (height - self.peaks[0, columns].astype(int) * height // 255).tolist()
+            highs = (height - self.peaks[1, columns].astype(int) * height // 255).tolist()
+            for x, (high, low) in enumerate(zip(highs, lows)):
+                painter.drawLine(x, high, x, low)
+            painter.end()
+            pixmaps.append(pixmap)
+        self.rendered = (size, pixmaps)
+    
+    def paintEvent(self, event):
+        if self.peaks is not None:
+            if self.rendered is None or self.rendered[0] != self.size():
+                self.render_peaks()
+            played, rest = self.rendered[1]
+            span = self.maximum() - self.minimum()
+            x = int(self.width() * (self.value() - self.minimum()) / span) if span > 0 else 0
+            painter = QPainter(self)
+            painter.drawPixmap(0, 0, rest)
+            painter.drawPixmap(0, 0, played, 0, 0, x, self.height())
+            painter.end()
+        super().paintEvent(event)
 
 class NowPlayingBar(QWidget):
     def __init__(self, parent=None):
         super().__init__()
         self.main_window = parent
-        self.setFixedHeight(90)
-        self.setStyleSheet("""
-            background-color: transparent;
-        """)
+        self.setFixedHeight(104)
         
         # main player
         self.player = QMediaPlayer()
@@ -344,6 +3327,12 @@ class NowPlayingBar(QWidget):
         
         # playlist tracking
         self.current_index = -1
+        self.current_path = None
+        self.queue = deque()  # paths queued to play next, before the library order resumes
+        
+        # replaygain: 'track', 'album' or 'off', gain is looked up once per track
+        self.gain_mode = os.environ.get("MYMUSIC_GAIN_MODE", "track")
+        self.gain = 1.0
         
         # connect signals
         self.player.positionChanged.connect(self.update_position)
@@ -363,11 +3352,7 @@ class NowPlayingBar(QWidget):
         
         self.album_thumb = QLabel("🎵")
         self.album_thumb.setFixedSize(56, 56)
-        self.album_thumb.setStyleSheet("""
-            background-color: #282828;
-            border-radius: 4px;
-            font-size: 24px;
-        """)
+        self.album_thumb.setObjectName("albumThumb")
         self.album_thumb.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         song_details = QWidget()
@@ -376,10 +3361,10 @@ class NowPlayingBar(QWidget):
         song_details_layout.setContentsMargins(0, 8, 0, 0)
         
         self.song_title = QLabel("No Song Playing")
-        self.song_title.setStyleSheet("color: white; font-size: 14px; font-weight: 500; background-color: transparent")
+        self.song_title.setObjectName("songTitle")
         
         self.song_artist = QLabel("Select a song to play")
-        self.song_artist.setStyleSheet("color: #b3b3b3; font-size: 12px;")
+        self.song_artist.setProperty("role", "caption")
         
         song_details_layout.addWidget(self.song_title)
         song_details_layout.addWidget(self.song_artist)
@@ -388,6 +3373,24 @@ class NowPlayingBar(QWidget):
         song_info_layout.addWidget(self.album_thumb)
         song_info_layout.addWidget(song_details)
         
+        # synced lyrics: the current line and the one after it
+        self.lyrics = None
+        self.lyrics_index = -1
+        self.lyrics_widget = QWidget()
+        lyrics_layout = QVBoxLayout()
+        lyrics_layout.setSpacing(2)
+        lyrics_layout.setContentsMargins(20, 8, 0, 0)
+        self.lyrics_line = QLabel("")
+        self.lyrics_line.setObjectName("lyricsLine")
+        self.lyrics_next = QLabel("")
+        self.lyrics_next.setObjectName("lyricsNext")
+        for label in (self.lyrics_line, self.lyrics_next):
+            label.setFixedWidth(320)
+            lyrics_layout.addWidget(label)
+        self.lyrics_widget.setLayout(lyrics_layout)
+        self.lyrics_widget.hide()
+        song_info_layout.addWidget(self.lyrics_widget)
+        
         # center: Controls
         controls_layout = QVBoxLayout()
         controls_layout.setSpacing(8)
@@ -399,6 +3402,7 @@ class NowPlayingBar(QWidget):
         self.prev_btn = self.create_control_button("⏮", 30)
         self.prev_btn.clicked.connect(self.play_previous)
         self.play_btn = self.create_control_button("▶", 36)
+        self.play_btn.setObjectName("playButton")
         self.play_btn.clicked.connect(self.toggle_play)
         self.next_btn = self.create_control_button("⏭", 30)
         self.next_btn.clicked.connect(self.play_next)
@@ -417,14 +3421,18 @@ class NowPlayingBar(QWidget):
         # right: Volume
         volume_layout = QHBoxLayout()
         volume_icon = QLabel("🔊")
-        volume_icon.setStyleSheet("color: #b3b3b3;")
+        volume_icon.setObjectName("volumeIcon")
         self.volume_slider = QSlider(Qt.Orientation.Horizontal)
         self.volume_slider.setFixedWidth(100)
         self.volume_slider.setValue(70)
-        self.volume_slider.setStyleSheet(self.slider_style())
         self.volume_slider.valueChanged.connect(self.change_volume)
         
+        self.gain_btn = self.create_control_button("🎚", 30)
+        self.gain_btn.setToolTip(f"Volume normalization: {self.gain_mode}")
+        self.gain_btn.clicked.connect(self.cycle_gain_mode)
+        
         volume_layout.addStretch()
+        volume_layout.addWidget(self.gain_btn)
         volume_layout.addWidget(volume_icon)
         volume_layout.addWidget(self.volume_slider)
         
@@ -438,14 +3446,14 @@ class NowPlayingBar(QWidget):
         progress_layout = QHBoxLayout()
         
         self.time_label = QLabel("0:00")
-        self.time_label.setStyleSheet("color: #b3b3b3; font-size: 11px;")
+        self.time_label.setProperty("role", "time")
         
-        self.progress_slider = QSlider(Qt.Orientation.Horizontal)
-        self.progress_slider.setStyleSheet(self.slider_style())
+        self.progress_slider = WaveformSlider()
+        self.progress_slider.setFixedHeight(24)
         self.progress_slider.sliderMoved.connect(self.seek_position)
         
         self.duration_label = QLabel("0:00")
-        self.duration_label.setStyleSheet("color: #b3b3b3; font-size: 11px;")
+        self.duration_label.setProperty("role", "time")
         
         progress_layout.addWidget(self.time_label)
         progress_layout.addWidget(self.progress_slider)
@@ -459,57 +3467,78 @@ class NowPlayingBar(QWidget):
     def create_control_button(self, icon, size):
         btn = QPushButton(icon)
         btn.setFixedSize(size, size)
-        btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: transparent;
-                border: none;
-                color: #b3b3b3;
-                font-size: {size-8}px;
-                border-radius: {size//2}px;
-            }}
-            QPushButton:hover {{
-                color: white;
-                background-color: rgba(255,255,255,0.1);
-            }}
-        """)
+        btn.setProperty("role", "control")
         return btn
     
-    def slider_style(self):
-        return """
-            QSlider::groove:horizontal {
-                background: #4d4d4d;
-                height: 4px;
-                border-radius: 2px;
-            }
-            QSlider::handle:horizontal {
-                background: white;
-                width: 12px;
-                height: 12px;
-                margin: -4px 0;
-                border-radius: 6px;
-            }
-            QSlider::sub-page:horizontal {
-                background: #1db954;
-                border-radius: 2px;
-            }
-        """
-    
-    def load_song(self, file_path, title, artist, album_art):
-        self.player.setSource(QUrl.fromLocalFile(file_path))
+    def set_waveform(self, peaks):
+        self.progress_slider.set_peaks(peaks)
+        # the style sheet clears the groove while a waveform is shown
+        if self.progress_slider.property("waveform") != (peaks is not None):
+            self.progress_slider.setProperty("waveform", peaks is not None)
+            self.progress_slider.style().unpolish(self.progress_slider)
+            self.progress_slider.style().polish(self.progress_slider)
+    
+    def load_song(self, file_path, title, artist, art_key):
+        with self.main_window.watchdog.action("track change"):
+            self._load_song(file_path, title, artist, art_key)
+    
+    def _load_song(self, file_path, title, artist, art_key):
+        self.current_path = file_path
+        self.main_window.track_loaded(file_path)
+        self.set_waveform(None)
+        self.main_window.request_waveform(file_path)
+        self.set_lyrics(None)
+        self.main_window.request_lyrics(file_path)
+        self.gain = self.playback_gain(self.main_window.songs_by_path.get(file_path))
+        self.apply_volume()
+        self.player.setSource(QUrl.fromLocalFile(self.main_window.prefetcher.local_path(file_path)))
         self.song_title.setText(title)
         self.song_artist.setText(artist)
+        self.main_window.publish('track', {'path': file_path, 'title': title, 'artist': artist})
         
-        if album_art:
-            pixmap = QPixmap()
-            pixmap.loadFromData(album_art)
-            scaled_pixmap = pixmap.scaled(56, 56, Qt.AspectRatioMode.KeepAspectRatioByExpanding,
-                                         Qt.TransformationMode.SmoothTransformation)
-            self.album_thumb.setPixmap(scaled_pixmap)
+        pixmap = self.main_window.memory.pixmap(art_key, 56)
+        if pixmap:
+            self.album_thumb.setPixmap(pixmap)
         else:
             self.album_thumb.setText("🎵")
         
         self.player.play()
         self.play_btn.setText("⏸")
+        
+        prefetcher = self.main_window.prefetcher
+        prefetcher.prefetch([song['path'] for song in self.upcoming(prefetcher.ahead)])
+    
+    def upcoming(self, count):
+        # what play_next would pick after the current track
+        songs_by_path = self.main_window.songs_by_path
+        queued = [songs_by_path.get(path) or {'path': path} for path in itertools.islice(self.queue, count)]
+        library = self.main_window.music_library
+        if not library or self.current_index < 0:
+            return queued
+        count -= len(queued)
+        return queued + [library[(self.current_index + i) % len(library)]
+                         for i in range(1, min(count, len(library) - 1) + 1)]
+    
+    def enqueue(self, paths, first=False):
+        # None clears the queue
+        if paths is None:
+            self.queue.clear()
+        elif first:
+            self.queue.extendleft(reversed(paths))
+        else:
+            self.queue.extend(paths)
+        self.main_window.publish('queue', {'length': len(self.queue)})
+        if self.current_path is not None:
+            prefetcher = self.main_window.prefetcher
+            prefetcher.prefetch([song['path'] for song in self.upcoming(prefetcher.ahead)])
+    
+    def state_name(self):
+        state = self.player.playbackState()
+        if state == QMediaPlayer.PlaybackState.PlayingState:
+            return 'playing'
+        if state == QMediaPlayer.PlaybackState.PausedState:
+            return 'paused'
+        return 'stopped'
     
     def toggle_play(self):
         if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
@@ -520,6 +3549,14 @@ class NowPlayingBar(QWidget):
             self.play_btn.setText("⏸")
     
     def play_next(self):
+        if self.queue:
+            path = self.queue.popleft()
+            self.main_window.publish('queue', {'length': len(self.queue)})
+            index = self.current_index
+            if self.main_window.play_file(path):
+                if self.current_index < 0:
+                    self.current_index = index  # not in the library, its order resumes where it was
+                return
         if self.main_window.music_library and self.current_index >= 0:
             self.current_index = (self.current_index + 1) % len(self.main_window.music_library)
             song_info = self.main_window.music_library[self.current_index]
@@ -527,7 +3564,7 @@ class NowPlayingBar(QWidget):
                 song_info['path'],
                 song_info['title'],
                 song_info['artist'],
-                song_info['album_art']
+                song_info['art_key']
             )
     
     def play_previous(self):
@@ -538,12 +3575,14 @@ class NowPlayingBar(QWidget):
                 song_info['path'],
                 song_info['title'],
                 song_info['artist'],
-                song_info['album_art']
+                song_info['art_key']
             )
     
     def on_playback_state_changed(self, state):
+        self.main_window.publish('state', {'state': self.state_name(), 'position': self.player.position()})
         # auto play next song
         if state == QMediaPlayer.PlaybackState.StoppedState and self.player.position() > 0:
+            self.main_window.track_played(self.current_path)
             self.play_next()
     
     def update_position(self, position):
@@ -553,6 +3592,32 @@ class NowPlayingBar(QWidget):
         mins = position // 60000
         secs = (position % 60000) // 1000
         self.time_label.setText(f"{mins}:{secs:02d}")
+        if self.lyrics is not None and self.lyrics.synced:
+            index = self.lyrics.line_at(position)
+            if index != self.lyrics_index:
+                self.show_lyrics_line(index)
+    
+    def set_lyrics(self, lyrics):
+        self.lyrics = lyrics
+        self.lyrics_index = None
+        if lyrics is None:
+            self.lyrics_widget.hide()
+        elif lyrics.synced:
+            self.show_lyrics_line(lyrics.line_at(self.player.position()))
+            self.lyrics_widget.show()
+        else:
+            # nothing to follow, the whole text is a hover away
+            self.lyrics_line.setText("📝 Lyrics")
+            self.lyrics_next.setText("")
+            self.lyrics_widget.setToolTip(lyrics.text)
+            self.lyrics_widget.show()
+    
+    def show_lyrics_line(self, index):
+        self.lyrics_index = index
+        lines = self.lyrics.lines
+        self.lyrics_line.setText(lines[index] if index >= 0 else "")
+        self.lyrics_next.setText(lines[index + 1] if index + 1 < len(lines) else "")
+        self.lyrics_widget.setToolTip("")
     
     def update_duration(self, duration):
         self.progress_slider.setMaximum(duration)
@@ -564,16 +3629,453 @@ class NowPlayingBar(QWidget):
         self.player.setPosition(position)
     
     def change_volume(self, value):
-        self.audio_output.setVolume(value / 100)
+        self.apply_volume()
+        self.main_window.publish('volume', {'volume': value})
+    
+    def apply_volume(self):
+        # positive gains can only use the headroom left below full volume
+        self.audio_output.setVolume(min(1.0, self.volume_slider.value() / 100 * self.gain))
+    
+    def playback_gain(self, song_info):
+        if self.gain_mode == 'off' or not song_info:
+            return 1.0
+        gain = peak = None
+        if self.gain_mode == 'album':
+            gain, peak = song_info.get('album_gain'), song_info.get('album_peak')
+        if gain is None:
+            gain, peak = song_info.get('track_gain'), song_info.get('track_peak')
+        if gain is None:
+            return 1.0
+        factor = 10 ** (gain / 20)
+        if peak:
+            factor = min(factor, 1 / peak)  # don't push peaks into clipping
+        return factor
+    
+    def cycle_gain_mode(self):
+        modes = ['track', 'album', 'off']
+        self.gain_mode = modes[(modes.index(self.gain_mode) + 1) % len(modes)] if self.gain_mode in modes else 'track'
+        self.gain_btn.setToolTip(f"Volume normalization: {self.gain_mode}")
+        if 0 <= self.current_index < len(self.main_window.music_library):
+            self.gain = self.playback_gain(self.main_window.music_library[self.current_index])
+        self.apply_volume()
+
+class SingleInstance(QObject):
+    # one player per user: a later launch hands its paths to the running one
+    # over a local socket and exits. the message is a single json list
+    received = pyqtSignal(list)
+    
+    def __init__(self, name=None):
+        super().__init__()
+        self.name = name or f"mymusic-{getpass.getuser()}"
+        self.server = None
+        self.buffers = {}
+    
+    def forward(self, paths, timeout_ms=500):
+        # true when a running instance took the paths
+        socket = QLocalSocket()
+        socket.connectToServer(self.name)
+        if not socket.waitForConnected(timeout_ms):
+            return False
+        socket.write(json.dumps(paths).encode('utf-8'))
+        socket.flush()
+        socket.waitForBytesWritten(timeout_ms)
+        socket.disconnectFromServer()
+        if socket.state() != QLocalSocket.LocalSocketState.UnconnectedState:
+            socket.waitForDisconnected(timeout_ms)
+        return True
+    
+    def listen(self):
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        if not self.server.listen(self.name):
+            # left behind by a crashed instance, nobody answered forward()
+            QLocalServer.removeServer(self.name)
+            if not self.server.listen(self.name):
+                print(f"Single instance server failed: {self.server.errorString()}")
+                return False
+        self.server.newConnection.connect(self.accept)
+        return True
+    
+    def accept(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self.buffers[socket] = bytearray()
+            socket.readyRead.connect(lambda socket=socket: self.buffers[socket].extend(socket.readAll().data()))
+            socket.disconnected.connect(lambda socket=socket: self.finish(socket))
+    
+    def finish(self, socket):
+        data = self.buffers.pop(socket, bytearray()) + socket.readAll().data()
+        socket.deleteLater()
+        try:
+            paths = json.loads(data.decode('utf-8')) if data else []
+        except ValueError:
+            print("Ignoring malformed message from another instance")
+            return
+        self.received.emit([str(path) for path in paths])
+
+def rpc_reply(request_id, result=None, error=None):
+    if error is not None:
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': error[0], 'message': error[1]}}
+    return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+class ControlServer(QObject):
+    # json-rpc 2.0 over a unix socket, one message per line. asyncio runs on its
+    # own thread; calls cross to the gui thread through `requested`, a whole
+    # batch array in one hop. events go out as "event" notifications to
+    # connections that subscribed
+    requested = pyqtSignal(object, object)  # [(method, params)], Future
+    EVENTS = {'state', 'track', 'volume', 'queue'}
+    LINE_LIMIT = 64 * 1024 * 1024  # a batch of thousands of paths is one line
+    BACKLOG_LIMIT = 4 * 1024 * 1024  # subscribers that stop reading are dropped
+    
+    def __init__(self, path, handler):
+        super().__init__()
+        self.path = Path(path)
+        self.handler = handler
+        self.loop = None
+        self.server = None
+        self.clients = {}  # writer -> subscribed event names
+        self.requested.connect(self.run_calls)  # queued, the signal is emitted from the loop thread
+    
+    def start(self):
+        threading.Thread(target=self.run, name="control", daemon=True).start()
+    
+    def run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.open())
+        except OSError as e:
+            print(f"Error starting control socket: {e}")
+            loop.close()
+            return
+        self.loop = loop
+        loop.run_forever()
+    
+    async def open(self):
+        if self.path.exists():
+            try:
+                _, writer = await asyncio.open_unix_connection(str(self.path))
+            except OSError:
+                self.path.unlink()  # left behind by a crashed instance
+            else:
+                writer.close()
+                raise OSError(f"{self.path} belongs to another running player")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.server = await asyncio.start_unix_server(self.serve, path=str(self.path), limit=self.LINE_LIMIT)
+        os.chmod(self.path, 0o600)
+    
+    def stop(self):
+        loop = self.loop
+        if loop is None:
+            return
+        self.loop = None
+        loop.call_soon_threadsafe(loop.stop)
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+    
+    def publish(self, event, data):
+        # gui thread
+        loop = self.loop
+        if loop is not None and self.clients:
+            loop.call_soon_threadsafe(self.broadcast, event, data)
+    
+    def broadcast(self, event, data):
+        line = None
+        for writer, events in list(self.clients.items()):
+            if event not in events:
+                continue
+            if writer.transport.get_write_buffer_size() > self.BACKLOG_LIMIT:
+                self.clients.pop(writer, None)
+                writer.close()
+                continue
+            if line is None:
+                message = {'jsonrpc': '2.0', 'method': 'event', 'params': {'event': event, 'data': data}}
+                line = (json.dumps(message) + "\n").encode('utf-8')
+            writer.write(line)
+    
+    async def serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write((json.dumps(rpc_reply(None, error=(-32600, "message too long"))) + "\n").encode('utf-8'))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                reply = await self.answer(line, writer)
+                if reply is not None:
+                    writer.write((json.dumps(reply) + "\n").encode('utf-8'))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.pop(writer, None)
+            writer.close()
+    
+    async def answer(self, line, writer):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return rpc_reply(None, error=(-32700, "parse error"))
+        batch = isinstance(message, list)
+        requests = message if batch else [message]
+        if not requests:
+            return rpc_reply(None, error=(-32600, "empty batch"))
+        
+        replies = [None] * len(requests)
+        calls = []  # (position, method, params) for the gui thread
+        for position, request in enumerate(requests):
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                replies[position] = rpc_reply(None, error=(-32600, "invalid request"))
+                continue
+            method, params = request['method'], request.get('params', {})
+            if method in ('subscribe', 'unsubscribe'):
+                replies[position] = self.subscription(writer, request)
+            else:
+                calls.append((position, method, params))
+        
+        if calls:
+            future = Future()
+            self.requested.emit([(method, params) for _, method, params in calls], future)
+            outcomes = await asyncio.wrap_future(future)
+            for (position, _, _), (result, error) in zip(calls, outcomes):
+                replies[position] = rpc_reply(requests[position].get('id'), result, error)
+        
+        # requests without an id are notifications and get no reply
+        replies = [reply for reply, request in zip(replies, requests)
+                   if not isinstance(request, dict) or 'id' in request]
+        if not replies:
+            return None
+        return replies if batch else replies[0]
+    
+    def subscription(self, writer, request):
+        # loop thread, the gui is not involved. no event names means all of them
+        params = request.get('params') or {}
+        events = params.get('events') if isinstance(params, dict) else params
+        if isinstance(events, str):
+            events = [events]
+        events = self.EVENTS if not events else self.EVENTS.intersection(events)
+        subscribed = self.clients.get(writer, set())
+        subscribed = subscribed | events if request['method'] == 'subscribe' else subscribed - events
+        if subscribed:
+            self.clients[writer] = subscribed
+        else:
+            self.clients.pop(writer, None)
+        return rpc_reply(request.get('id'), sorted(subscribed))
+    
+    def run_calls(self, calls, future):
+        # gui thread: a failing call doesn't stop the rest of its batch
+        outcomes = []
+        for method, params in calls:
+            if method not in self.handler.METHODS:
+                outcomes.append((None, (-32601, f"method not found: {method}")))
+                continue
+            try:
+                outcomes.append((self.handler(method, params), None))
+            except (TypeError, ValueError) as e:
+                outcomes.append((None, (-32602, f"invalid params: {e}")))
+            except Exception as e:
+                traceback.print_exc()
+                outcomes.append((None, (-32603, str(e))))
+        future.set_result(outcomes)
+
+class PlayerControl:
+    # what the control socket may call, always on the gui thread
+    METHODS = {'status', 'play', 'pause', 'toggle', 'next', 'previous', 'seek',
+               'volume', 'enqueue', 'queue', 'clear_queue', 'search', 'problems'}
+    
+    def __init__(self, window):
+        self.window = window
+        self.bar = window.now_playing
+    
+    def __call__(self, method, params):
+        if isinstance(params, dict):
+            return getattr(self, method)(**params)
+        if isinstance(params, list):
+            return getattr(self, method)(*params)
+        raise TypeError("params must be an object or an array")
+    
+    def status(self):
+        bar = self.bar
+        return {
+            'path': bar.current_path,
+            'title': bar.song_title.text() if bar.current_path else None,
+            'artist': bar.song_artist.text() if bar.current_path else None,
+            'state': bar.state_name(),
+            'position': bar.player.position(),
+            'duration': bar.progress_slider.maximum(),
+            'volume': bar.volume_slider.value(),
+            'queue': len(bar.queue),
+        }
+    
+    def play(self, path=None):
+        if path is not None:
+            if not self.window.play_file(str(path)):
+                raise ValueError(f"cannot play {path}")
+        elif self.bar.current_path is None:
+            self.bar.play_next()
+        else:
+            self.bar.player.play()
+            self.bar.play_btn.setText("⏸")
+        return self.bar.current_path
+    
+    def pause(self):
+        self.bar.player.pause()
+        self.bar.play_btn.setText("▶")
+    
+    def toggle(self):
+        self.bar.toggle_play()
+        return self.bar.state_name()
+    
+    def next(self):
+        self.bar.play_next()
+        return self.bar.current_path
+    
+    def previous(self):
+        self.bar.play_previous()
+        return self.bar.current_path
+    
+    def seek(self, position):
+        self.bar.player.setPosition(int(position))
+        return int(position)
+    
+    def volume(self, level=None):
+        if level is not None:
+            self.bar.volume_slider.setValue(int(level))
+        return self.bar.volume_slider.value()
+    
+    def enqueue(self, paths, first=False):
+        if isinstance(paths, str):
+            paths = [paths]
+        playable, skipped = [], []
+        for path in paths:
+            song = self.window.lookup_path(path)
+            if song is not None:
+                playable.append(song['path'])
+            elif isinstance(path, str) and os.path.isfile(path):
+                playable.append(path)
+            else:
+                skipped.append(path)
+        self.bar.enqueue(playable, first)
+        return {'added': len(playable), 'skipped': skipped, 'length': len(self.bar.queue)}
+    
+    def queue(self):
+        return list(self.bar.queue)
+    
+    def clear_queue(self):
+        self.bar.enqueue(None)
+        return 0
+    
+    def search(self, query, limit=50):
+        query = str(query).lower()
+        results = []
+        for song in self.window.visible_songs():
+            if query in song['title'].lower() or query in song['artist'].lower():
+                results.append({key: song.get(key) for key in ('path', 'title', 'artist', 'album', 'duration')})
+                if len(results) >= int(limit):
+                    break
+        return results
+    
+    def problems(self):
+        # files the scans could not read; nothing is parsed to answer this
+        return [{'path': path, 'reason': reason, 'size': size, 'mtime': mtime, 'failed_at': failed_at}
+                for path, (size, mtime, reason, failed_at) in sorted(self.window.roots.load_failures().items())]
+
+# read_track's answer for a file the library already has as it is on disk,
+# or already knows it can't read
+UNCHANGED = object()
+
+def is_io_error(e):
+    # the disk or share failed, not the file. mutagen re-raises the OSError it
+    # hit as a MutagenError, the original is its context
+    return isinstance(e, OSError) or (isinstance(e, MutagenError) and isinstance(e.__context__, OSError))
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("MyMusic Player")
         self.resize(1200, 700)
-        self.setStyleSheet("background-color: #121212;")
+        # one style sheet for the whole application, see theme.py
+        theme.apply(QApplication.instance(), os.environ.get("MYMUSIC_THEME", "dark"))
         
         self.music_library = []
+        self.songs_by_path = {}
+        self.aggregates = LibraryAggregates()  # artist and album groups
+        self.sidecar_covers = set()  # cover.jpg & co, shared by every track in their folder
+        
+        # scanned tracks persist in one index shard per library folder, loudness
+        # is analysed in worker processes
+        self.roots = LibraryRoots(DATA_DIR / "roots.json", DATA_DIR / "shards", legacy_db=DATA_DIR / "library.db")
+        
+        # rule based playlists, kept current track by track
+        self.smart_playlists = SmartPlaylists(DATA_DIR / "smart_playlists.json")
+        self.playlists = Playlists(self.smart_playlists, DATA_DIR / "playlists")
+        self.importers = []
+        
+        # what was played and when, feeds play counts and the home sections
+        self.history = PlayHistory(DATA_DIR / "history.jsonl", self.roots)
+        self.history_timer = QTimer(self)
+        self.history_timer.setSingleShot(True)
+        self.history_timer.setInterval(300)
+        self.history_timer.timeout.connect(self.update_history_sections)
+        self.normalized_paths = None  # normcase'd path -> song, built on first miss
+        # "this month", "within 30 days" drift with the clock alone
+        self.smart_timer = QTimer(self)
+        self.smart_timer.setInterval(3600 * 1000)
+        self.smart_timer.timeout.connect(self.refresh_relative_playlists)
+        self.smart_timer.start()
+        self.bridge = TaskBridge()
+        self.bridge.finished.connect(self.on_task_finished)
+        self.control = None  # unix socket api, started once the widgets exist
+        self.worker_pool = None
+        self.interactive_pool = None  # the playing track's work, never queued behind the library's
+        self.lyrics_cache = OrderedDict()  # path -> Lyrics or None, newest last
+        self.loudness_dirty = {}
+        self.loudness_albums = {}
+        self.loudness_pending = set()  # paths submitted for analysis, not back yet
+        
+        # duplicate copies found by audio hash, optionally left out of the views
+        self.duplicate_finder = None
+        self.duplicate_groups = None  # until the first search
+        self.duplicates_dialog = None
+        self.hide_duplicates = os.environ.get("MYMUSIC_HIDE_DUPLICATES") == "1"
+        
+        # warm the next tracks while one plays (slow or network-mounted libraries)
+        self.prefetcher = TrackPrefetcher(
+            ahead=int(os.environ.get("MYMUSIC_PREFETCH_AHEAD", 2)),
+            track_bytes=int(os.environ.get("MYMUSIC_PREFETCH_TRACK_MB", 32)) * 1024 * 1024,
+            max_bytes=int(os.environ.get("MYMUSIC_PREFETCH_MB", 512)) * 1024 * 1024,
+            mode=os.environ.get("MYMUSIC_PREFETCH_MODE", "advise")
+        )
+        
+        # read only text tags while scanning, covers are loaded when shown
+        self.fast_scan = os.environ.get("MYMUSIC_FAST_SCAN", "1") != "0"
+        
+        # folder scans run on a helper thread with self-tuning concurrency, one
+        # root at a time
+        self.scanner = None
+        self.scan_generation = 0
+        self.scanning = None  # root being scanned
+        self.scan_queue = deque()  # roots waiting for it
+        self.scan_seen = set()
+        self.scan_failed = {}  # path -> failure the shard had, (size, mtime, reason, when)
+        self.scan_failures = {}  # path -> failure found by this scan, None when it reads now
+        self.scan_workers = int(os.environ.get("MYMUSIC_SCAN_WORKERS", 32))
+        
+        # watch for gui freezes, worst ones are written out on close
+        self.watchdog = EventLoopWatchdog(parent=self)
+        
+        # cover art and pixmaps share one memory budget
+        self.memory = MemoryGovernor(
+            budget_mb=int(os.environ.get("MYMUSIC_MEMORY_BUDGET_MB", 256)),
+            loader=self.load_album_art,
+            trace=os.environ.get("MYMUSIC_TRACEMALLOC") == "1"
+        )
         
         # main container
         container = QWidget()
@@ -590,8 +4092,8 @@ class MainWindow(QMainWindow):
         content_row.setLayout(content_layout)
         
         # sidebar
-        sidebar = Sidebar(self)
-        content_layout.addWidget(sidebar)
+        self.sidebar = Sidebar(self)
+        content_layout.addWidget(self.sidebar)
         
         # right section with pages
         right_section = QWidget()
@@ -600,16 +4102,26 @@ class MainWindow(QMainWindow):
         right_layout.setSpacing(0)
         right_section.setLayout(right_layout)
         
-        topbar = TopBar()
+        self.topbar = topbar = TopBar()
+        topbar.back_btn.clicked.connect(self.go_back)
+        topbar.forward_btn.clicked.connect(self.go_forward)
         right_layout.addWidget(topbar)
         
         # stacked widget for pages
         self.pages = QStackedWidget()
         self.home_page = HomePage(self)
         self.search_page = SearchPage(self)
+        self.library_page = LibraryPage(self)
+        self.artists_page = BrowsePage('artist', self)
+        self.albums_page = BrowsePage('album', self)
+        self.playlists_page = BrowsePage('playlist', self)
         
         self.pages.addWidget(self.home_page)
         self.pages.addWidget(self.search_page)
+        self.pages.addWidget(self.library_page)
+        self.pages.addWidget(self.artists_page)
+        self.pages.addWidget(self.albums_page)
+        self.pages.addWidget(self.playlists_page)
         
         right_layout.addWidget(self.pages)
         content_layout.addWidget(right_section)
@@ -621,82 +4133,933 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(self.now_playing)
         
         self.setCentralWidget(container)
+        
+        # pages left behind, with what each showed: (index, page state)
+        self.back_history = deque(maxlen=50)
+        self.forward_history = []
+        QShortcut(QKeySequence(QKeySequence.StandardKey.Back), self, self.go_back)
+        QShortcut(QKeySequence(QKeySequence.StandardKey.Forward), self, self.go_forward)
+        
+        self.load_roots()
+        
+        # scripts and button boxes drive the player over a unix socket
+        control_path = os.environ.get("MYMUSIC_CONTROL_SOCKET", str(DATA_DIR / "control.sock"))
+        if control_path != "0" and hasattr(asyncio, 'start_unix_server'):
+            self.control = ControlServer(control_path, PlayerControl(self))
+            self.control.start()
+    
+    def publish(self, event, data):
+        if self.control:
+            self.control.publish(event, data)
     
     def switch_page(self, index):
+        if index == self.pages.currentIndex():
+            return
+        self.back_history.append(self.page_state())
+        self.forward_history.clear()
+        self.pages.setCurrentIndex(index)
+        self.update_navigation()
+    
+    def page_state(self):
+        return self.pages.currentIndex(), self.pages.currentWidget().save_state()
+    
+    def go_back(self):
+        if self.back_history:
+            self.forward_history.append(self.page_state())
+            self.show_page_state(*self.back_history.pop())
+    
+    def go_forward(self):
+        if self.forward_history:
+            self.back_history.append(self.page_state())
+            self.show_page_state(*self.forward_history.pop())
+    
+    def show_page_state(self, index, state):
+        # the page keeps its widgets, only what changed since is put back
         self.pages.setCurrentIndex(index)
+        self.pages.widget(index).restore_state(state)
+        self.update_navigation()
+    
+    def update_navigation(self):
+        self.topbar.back_btn.setEnabled(bool(self.back_history))
+        self.topbar.forward_btn.setEnabled(bool(self.forward_history))
+    
+    def library_changed(self):
+        # pages showing the library refresh now if visible, otherwise when shown
+        self.library_page.library_changed()
+        self.artists_page.library_changed()
+        self.albums_page.library_changed()
+        self.playlists_page.library_changed()
+    
+    def closeEvent(self, event):
+        self.watchdog.stop()
+        if self.control:
+            self.control.stop()
+        if self.scanner:
+            self.scanner.cancelled = True
+        self.prefetcher.stop()
+        self.history.close()
+        self.save_loudness()
+        for pool in (self.worker_pool, self.interactive_pool):
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+        if self.watchdog.stalls:
+            self.watchdog.export(DATA_DIR / "stalls.json")
+        if tracemalloc.is_tracing():
+            DATA_DIR.mkdir(parents=True, exist_ok=True)
+            (DATA_DIR / "memory.txt").write_text(self.memory.report(), encoding='utf-8')
+        super().closeEvent(event)
     
     def load_music_folder(self, folder_path):
-        self.music_library.clear()
+        # the folder joins the library as a root of its own, or rescans the
+        # root it is in. the other roots are left as they are
+        if not os.path.isdir(folder_path):
+            print(f"Error adding {folder_path}: not a folder")
+            return
+        try:
+            root = self.roots.add(folder_path)
+        except ValueError as e:
+            print(f"Error adding {folder_path}: {e}")
+            return
+        if not self.roots.entry(root)['mounted']:
+            self.mount_root(root)
+        self.scan_root(root)
+    
+    def load_roots(self):
+        # mounted roots come back from their shards, no track is opened
+        for root in self.roots.mounted():
+            if not os.path.isdir(root):
+                print(f"Library folder {root} is offline, unmounting it")
+                self.roots.set_mounted(root, False)
+                continue
+            self.add_songs(self.roots.index(root).load())
+        self.rebuild_cards()
+        self.library_settled()
+        self.schedule_loudness_analysis()
+    
+    def root_songs(self, root):
+        # the library is in path order, so a root's songs are one slice of it
+        prefix = path_prefix(root)
+        start = bisect.bisect_left(self.music_library, prefix, key=lambda song: song['path'])
+        end = bisect.bisect_left(self.music_library, prefix + '\U0010ffff', key=lambda song: song['path'])
+        return self.music_library[start:end]
+    
+    def add_songs(self, songs):
+        # songs from a shard, merged into the library by path. cards are left
+        # to the caller
+        for song in songs:
+            if song.get('art_key') and song['art_key'] != song['path']:
+                self.sidecar_covers.add(song['art_key'])
+            self.songs_by_path[song['path']] = song
+            self.aggregates.add(song)
+        current = self.now_playing.current_index
+        if 0 <= current < len(self.music_library):
+            # the playing position follows its track past the ones merged in before it
+            anchor = self.music_library[current]['path']
+            self.now_playing.current_index += bisect.bisect_left(songs, anchor, key=lambda song: song['path'])
+        self.music_library[:] = list(heapq.merge(self.music_library, songs, key=lambda song: song['path']))
+        self.normalized_paths = None
+    
+    def drop_songs(self, songs):
+        paths = {song['path'] for song in songs}
+        if not paths:
+            return
+        # the playing position moves back by the tracks removed up to it. if its
+        # own track went, it lands on the one before so next plays the follower
+        current = self.now_playing.current_index
+        if 0 <= current < len(self.music_library):
+            removed = sum(1 for song in self.music_library[:current + 1] if song['path'] in paths)
+        else:
+            current = None
+        self.music_library[:] = [song for song in self.music_library if song['path'] not in paths]
+        if current is not None:
+            self.now_playing.current_index = (current - removed) % len(self.music_library) if self.music_library else -1
+        for path in paths:
+            del self.songs_by_path[path]
+            self.aggregates.remove(path)
+            for playlist in self.smart_playlists.playlists:
+                playlist.remove(path)
+        self.smart_playlists.version += 1
+        self.normalized_paths = None
+        if len(paths) > 500:
+            # removing cards one at a time searches the layout for each
+            self.rebuild_cards()
+        else:
+            for path in paths:
+                self.home_page.remove_song_card(path)
+    
+    def library_settled(self):
+        # after a scan, mount or unmount: what looks at the whole library
+        if self.scanner is None:
+            self.home_page.title.setText(f"Your Music Library ({len(self.music_library)} songs)")
+        # date added and play counts are known now
+        self.smart_playlists.evaluate(self.roots, self.songs_by_path)
+        self.library_changed()
+        self.update_history_sections()
+        for path in self.playlists.saved():
+            self.import_playlist(str(path), save=False)
+        self.library_page.show_roots()
+    
+    def mount_root(self, root):
+        # back as it was last scanned, straight from its shard
+        if not os.path.isdir(root):
+            print(f"Error mounting {root}: folder not found")
+            return
+        if not self.roots.entry(root)['mounted']:
+            self.roots.set_mounted(root, True)
+            self.add_songs(self.roots.index(root).load())
+            self.rebuild_cards()
+        self.library_settled()
+        self.schedule_loudness_analysis()
+    
+    def unmount_root(self, root):
+        # its songs leave the view, its shard and the other roots stay as they are
+        self.cancel_scan(root)
+        self.save_loudness()
+        self.drop_songs(self.root_songs(root))
+        self.roots.set_mounted(root, False)
+        self.library_settled()
+    
+    def remove_root(self, root):
+        self.cancel_scan(root)
+        self.drop_songs(self.root_songs(root))
+        self.loudness_dirty = {path: song for path, song in self.loudness_dirty.items() if path in self.songs_by_path}
+        self.roots.remove(root)
+        self.library_settled()
+    
+    def scan_root(self, root):
+        if self.scanner:
+            if root != self.scanning and root not in self.scan_queue:
+                self.scan_queue.append(root)
+                self.library_page.show_roots()
+            return
+        with self.watchdog.action("scan"):
+            self._scan_root(root)
+    
+    def _scan_root(self, root):
+        self.scan_generation += 1
+        self.scanning = root
+        self.scan_seen = set()
+        # files with the size and mtime the library has for them keep their tags,
+        # files that failed before are not parsed again until one of them changes
+        known = {song['path']: (song.get('size'), song.get('mtime')) for song in self.root_songs(root)}
+        self.scan_failed = self.roots.index(root).load_failures()
+        self.scan_failures = {}
+        known.update((path, failure[:2]) for path, failure in self.scan_failed.items())
+        self.home_page.title.setText("Scanning…")
+        self.scanner = AdaptiveScanner(
+            lambda file_path: self.read_track(file_path, known),
+            controller=ConcurrencyController(maximum=self.scan_workers)
+        )
+        threading.Thread(
+            target=self.run_scan, args=(self.scanner, root, self.scan_generation),
+            name="scan", daemon=True
+        ).start()
+        self.library_page.show_roots()
+    
+    def cancel_scan(self, root):
+        if root in self.scan_queue:
+            self.scan_queue.remove(root)
+        if root == self.scanning:
+            self.scanner.cancelled = True
+            self.scan_generation += 1  # its leftover batches are ignored
+            self.scanner = None
+            self.scanning = None
+            self.next_scan()
+    
+    def next_scan(self):
+        if self.scan_queue:
+            self.scan_root(self.scan_queue.popleft())
+    
+    def read_track(self, file_path, known=None):
+        # worker thread: tags plus the stat the index wants, no gui objects.
+        # a file that can't be parsed comes back as {'error': reason, ...}, which
+        # is kept until it changes. i/o errors raise, the next scan tries again
+        stat = os.stat(file_path)
+        if known and known.get(file_path) == (stat.st_size, stat.st_mtime):
+            return UNCHANGED
+        try:
+            song_info = self.read_metadata(file_path)
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+            if is_io_error(e):
+                raise
+            song_info = {'error': str(e) or type(e).__name__}
+        song_info['size'], song_info['mtime'] = stat.st_size, stat.st_mtime
+        return song_info
+    
+    def run_scan(self, scanner, folder_path, generation):
+        # two phases interleaved: listings go out first as placeholder cards,
+        # tags follow in whatever order update_scan_priority asks for
+        listed = []
+        batch = []
+        flushed = [0]  # the first listing goes out right away
         
-        # cleaer existing cards
-        while self.home_page.cards_layout.count():
-            child = self.home_page.cards_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
+        def flush():
+            if listed:
+                self.bridge.finished.emit('scan_listing', (generation, list(listed)))
+                listed.clear()
+            if batch:
+                self.bridge.finished.emit('scan_batch', (generation, list(batch)))
+                batch.clear()
+            flushed[0] = time.perf_counter()
+        
+        def maybe_flush():
+            # small batches keep the gui responsive while the cards stream in
+            if len(listed) + len(batch) >= 200 or time.perf_counter() - flushed[0] > 0.25:
+                flush()
+        
+        def on_dir(root, files):
+            sidecar = find_sidecar_cover(files)
+            sidecar = os.path.join(root, sidecar) if sidecar else None
+            files = [(os.path.join(root, name), sidecar) for name in files
+                     if name.lower().endswith(AUDIO_EXTENSIONS)]
+            listed.extend(file_path for file_path, _ in files)
+            maybe_flush()
+            return files
+        
+        def on_file(file_path, sidecar, song_info):
+            batch.append((file_path, song_info, sidecar))
+            maybe_flush()
+        
+        try:
+            scanner.scan(folder_path, on_dir, on_file)
+        except Exception as e:
+            print(f"Error scanning {folder_path}: {e}")
+            scanner.failed.append(folder_path)
+        flush()
+        self.bridge.finished.emit('scan_done', (generation, scanner.controller.history, scanner.failed))
+    
+    def apply_scan_listing(self, generation, paths):
+        if generation != self.scan_generation:
+            return
+        with self.watchdog.action("scan"):
+            for file_path in paths:
+                self.scan_seen.add(file_path)
+                # shown already (from the shard or an earlier scan), or known not
+                # to be a track; it comes in with its tags if it changed
+                if file_path not in self.songs_by_path and file_path not in self.scan_failed:
+                    self.add_placeholder(file_path)
+            self.home_page.title.setText(f"Scanning… ({len(self.music_library)} songs)")
+        self.library_changed()
+        # geometry is only known after the layout has run
+        self.home_page.scroll_timer.start()
+    
+    def add_placeholder(self, file_path):
+        # folders are listed concurrently, keep the grid in path order anyway
+        song_info = {
+            'title': Path(file_path).stem,
+            'artist': '',
+            'album': '',
+            'duration': 0,
+            'format': Path(file_path).suffix[1:].upper(),
+            'path': file_path,
+            'art_key': None,
+            'placeholder': True,
+        }
+        index = bisect.bisect(self.music_library, file_path, key=lambda song: song['path'])
+        self.music_library.insert(index, song_info)
+        if 0 <= index <= self.now_playing.current_index:
+            self.now_playing.current_index += 1
+        self.songs_by_path[file_path] = song_info
+        self.home_page.insert_song_card(index, song_info['title'], '', file_path, None)
+        return song_info
+    
+    def apply_scan_batch(self, generation, batch):
+        if generation != self.scan_generation:
+            return
+        with self.watchdog.action("scan"):
+            for file_path, result, sidecar in batch:
+                if result is UNCHANGED:
+                    continue
+                song_info = self.songs_by_path.get(file_path)
+                if result is None:
+                    # gone before it could be read, or the mount failed. a track
+                    # the library had stays as it was, a new file waits for a rescan
+                    if song_info is not None and song_info.get('placeholder'):
+                        self.scan_seen.discard(file_path)
+                        self.drop_songs([song_info])
+                    continue
+                if 'error' in result:
+                    # not a track (any more). the reason is kept with the file's
+                    # stat so later scans skip it until it changes
+                    self.scan_failures[file_path] = (result['size'], result['mtime'], result['error'], time.time())
+                    if song_info is not None:
+                        self.drop_songs([song_info])
+                    continue
+                if file_path in self.scan_failed:
+                    # failed before, reads now
+                    self.scan_failures[file_path] = None
+                    song_info = song_info or self.add_placeholder(file_path)
+                if song_info is None:
+                    continue
+                self.memory.put_art(result['art_key'], result.pop('album_art'))
+                if result['art_key'] is None and sidecar:
+                    # one key per folder, so the image is read and decoded once
+                    result['art_key'] = sidecar
+                    self.sidecar_covers.add(sidecar)
+                # update in place, the dict is already in the library and the views
+                song_info.pop('placeholder', None)
+                song_info.update(result)
+                self.aggregates.add(song_info)
+                self.smart_playlists.update(song_info)
+                card = self.home_page.cards_by_path.get(file_path)
+                if card:
+                    card.set_info(song_info['title'], song_info['artist'], song_info['art_key'])
+            self.home_page.title.setText(f"Scanning… ({len(self.music_library)} songs)")
+        self.library_changed()
+    
+    def update_scan_priority(self):
+        if self.scanner is None:
+            return
+        paths = self.home_page.paths_by_priority()
+        self.scanner.prioritize([path for path in paths if self.songs_by_path[path].get('placeholder')])
+    
+    def finish_scan(self, generation, history, failed):
+        if generation != self.scan_generation:
+            return
+        root = self.scanning
+        self.scanner = None
+        self.scanning = None
+        if history:
+            print("Scan concurrency: " + ", ".join(f"{limit}@{rate:.0f}/s" for limit, rate, _, _ in history))
+        
+        index = self.roots.index(root)
+        if not self.scan_seen and (self.root_songs(root) or self.scan_failed or index.count()):
+            # a root that had tracks and lists empty is an unplugged disk or share
+            # whose mount point stayed behind. its shard is kept, Remove drops it
+            print(f"Library folder {root} is empty now, unmounting it as offline")
+            self.unmount_root(root)
+            self.next_scan()
+            return
+        
+        # tracks that were not listed are gone, unless their folder could not be
+        # listed this time (a disk or share that dropped out mid-scan)
+        unseen = tuple(path_prefix(folder) for folder in failed)
+        def gone(path):
+            return path not in self.scan_seen and not path.startswith(unseen)
+        self.drop_songs([song for song in self.root_songs(root) if gone(song['path'])])
+        stored = itertools.chain(index.select_paths("1", ()), self.scan_failed)
+        failures = {path: failure for path, failure in self.scan_failures.items() if failure}
+        index.forget([path for path in stored if gone(path)] + list(failures))
+        index.save_failures(failures, [path for path, failure in self.scan_failures.items() if failure is None])
+        index.sync(self.root_songs(root))
+        self.library_settled()
+        self.schedule_loudness_analysis()
+        self.next_scan()
+    
+    def schedule_loudness_analysis(self):
+        # only tracks without replaygain/r128 tags or a stored analysis, and not
+        # already waiting in the pool from an earlier launch, mount or scan
+        # compressed files need ffmpeg to decode, without it they are left alone
+        ffmpeg = shutil.which('ffmpeg') is not None
+        pending, undecodable = [], 0
+        for song in self.music_library:
+            if song.get('track_gain') is not None or song.get('loudness_error') or song['path'] in self.loudness_pending:
+                continue
+            if ffmpeg or song['path'].lower().endswith('.wav'):
+                pending.append(song['path'])
+            else:
+                undecodable += 1
+        if undecodable:
+            print(f"ffmpeg not found, {undecodable} tracks are left without loudness analysis")
+        if not pending:
+            return
+        self.loudness_albums = {}
+        for song in self.music_library:
+            if song.get('album'):
+                key = (song.get('albumartist') or song['artist'], song['album'])
+                self.loudness_albums.setdefault(key, []).append(song)
+        for path in pending:
+            self.loudness_pending.add(path)
+            self.submit_task('loudness', analyze_loudness, path)
+    
+    def get_worker_pool(self):
+        if self.worker_pool is None:
+            # spawn, forking a process that runs qt threads is not safe
+            self.worker_pool = ProcessPoolExecutor(
+                max_workers=max(1, (os.cpu_count() or 2) - 1),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self.worker_pool
+    
+    def get_interactive_pool(self):
+        # one process for what the user is waiting on, the library-wide jobs in
+        # the worker pool are first in first out and can take minutes to drain
+        if self.interactive_pool is None:
+            self.interactive_pool = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self.interactive_pool
+    
+    def submit_task(self, kind, func, *args, pool=None):
+        # run func in the worker pool, the result comes back through on_task_finished
+        future = (pool or self.get_worker_pool()).submit(func, *args)
+        # the callback runs on a pool thread, the bridge queues it to the gui thread
+        future.add_done_callback(
+            lambda f: f.cancelled() or f.exception() or self.bridge.finished.emit(kind, f.result()))
+        return future
+    
+    def on_task_finished(self, kind, result):
+        if kind == 'scan_listing':
+            self.apply_scan_listing(*result)
+        elif kind == 'scan_batch':
+            self.apply_scan_batch(*result)
+        elif kind == 'scan_done':
+            self.finish_scan(*result)
+        elif kind == 'loudness':
+            self.apply_loudness(result)
+        elif kind == 'waveform':
+            self.apply_waveform(result)
+        elif kind == 'duplicates':
+            self.apply_duplicates(result)
+        elif kind == 'lyrics':
+            self.apply_lyrics(*result)
+    
+    def find_duplicates(self, again=False):
+        # the first click searches, later ones show what was found
+        if self.duplicate_groups is not None and not again:
+            self.show_duplicates()
+            return
+        if not self.music_library or self.duplicate_finder is not None:
+            return
+        self.sidebar.duplicates_btn.setText("🧬 Finding Duplicates…")
+        self.duplicate_finder = DuplicateFinder(
+            self.get_worker_pool(), list(self.music_library),
+            self.roots.load_audio_hashes(), self.bridge
+        )
+        self.duplicate_finder.start()
+    
+    def apply_duplicates(self, result):
+        self.duplicate_finder = None
+        if 'error' in result:
+            print(f"Error finding duplicates: {result['error']}")
+            extra = sum(len(group) - 1 for group in self.duplicate_groups or [])
+            self.sidebar.duplicates_btn.setText(
+                f"🧬 Duplicates ({extra})" if self.duplicate_groups is not None else "🧬 Find Duplicates")
+            return
+        self.roots.save_audio_hashes(result['entries'])
+        self.duplicate_groups = []
+        for song in self.music_library:
+            song.pop('duplicate_of', None)
+        order = {song['path']: i for i, song in enumerate(self.music_library)}
+        for group in result['groups']:
+            # keep whichever copy comes first in the library
+            group = sorted((p for p in group if p in order), key=order.get)
+            if len(group) < 2:
+                continue
+            self.duplicate_groups.append(group)
+            for path in group[1:]:
+                self.songs_by_path[path]['duplicate_of'] = group[0]
+        extra = sum(len(group) - 1 for group in self.duplicate_groups)
+        self.sidebar.duplicates_btn.setText(f"🧬 Duplicates ({extra})")
+        print(f"{result['hashed']} file(s) hashed")
+        if self.hide_duplicates:
+            self.rebuild_cards()
+        self.show_duplicates()
+    
+    def duplicate_report(self):
+        lines = [f"{len(self.duplicate_groups)} duplicate group(s)"]
+        for group in self.duplicate_groups:
+            lines.append(f"  {group[0]}")
+            lines.extend(f"    = {path}" for path in group[1:])
+        return "\n".join(lines)
+    
+    def show_duplicates(self):
+        # the groups from the last search, the copy that is kept first
+        if self.duplicates_dialog is not None:
+            self.duplicates_dialog.close()
+        dialog = QDialog(self)
+        extra = sum(len(group) - 1 for group in self.duplicate_groups)
+        dialog.setWindowTitle(f"Duplicates ({extra})")
+        dialog.resize(760, 420)
+        report = QPlainTextEdit(self.duplicate_report())
+        report.setReadOnly(True)
+        tools = QHBoxLayout()
+        hide_btn = QPushButton()
+        
+        def update_hide_btn():
+            hide_btn.setText("👁 Show Copies" if self.hide_duplicates else "🙈 Hide Copies")
+        
+        def toggle_hide():
+            self.set_hide_duplicates(not self.hide_duplicates)
+            update_hide_btn()
         
-        #  formats
-        audio_extensions = ['.mp3', '.flac', '.m4a', '.ogg', '.wav']
-        
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if any(file.lower().endswith(ext) for ext in audio_extensions):
-                    file_path = os.path.join(root, file)
-                    song_info = self.extract_metadata(file_path)
-                    if song_info:
-                        self.music_library.append(song_info)
-                        self.home_page.add_song_card(
-                            song_info['title'],
-                            song_info['artist'],
-                            song_info['path'],
-                            song_info['album_art']
-                        )
-        
-        self.home_page.title.setText(f"Your Music Library ({len(self.music_library)} songs)")
+        def find_again():
+            dialog.close()
+            self.find_duplicates(again=True)
+        
+        update_hide_btn()
+        hide_btn.clicked.connect(toggle_hide)
+        again_btn = QPushButton("🔄 Find Again")
+        again_btn.clicked.connect(find_again)
+        for button in (hide_btn, again_btn):
+            button.setProperty("role", "pill")
+            tools.addWidget(button)
+        tools.addStretch()
+        layout = QVBoxLayout()
+        layout.addWidget(report)
+        layout.addLayout(tools)
+        dialog.setLayout(layout)
+        self.duplicates_dialog = dialog
+        dialog.show()
+    
+    def set_hide_duplicates(self, hide):
+        self.hide_duplicates = hide
+        self.rebuild_cards()
+    
+    def visible_songs(self):
+        if not self.hide_duplicates:
+            return self.music_library
+        return [song for song in self.music_library if 'duplicate_of' not in song]
+    
+    def rebuild_cards(self):
+        self.library_changed()
+        self.home_page.clear_cards()
+        for song_info in self.visible_songs():
+            self.home_page.add_song_card(
+                song_info['title'],
+                song_info['artist'],
+                song_info['path'],
+                song_info['art_key']
+            )
+    
+    def apply_loudness(self, result):
+        self.loudness_pending.discard(result['path'])
+        song = self.songs_by_path.get(result['path'])
+        if song is None or result.get('loudness') is None:
+            if result.get('error'):
+                print(f"Loudness analysis failed for {result['path']}: {result['error']}")
+                # stored, so it is not retried until the file changes. a missing
+                # decoder is not the file's fault
+                if song is not None and not result.get('retry'):
+                    song['loudness_error'] = result['error']
+                    self.loudness_dirty[song['path']] = song
+                    self.schedule_loudness_save()
+            return
+        song['loudness'] = result['loudness']
+        song['blocks'] = result['blocks']
+        song['track_gain'] = REPLAYGAIN_REFERENCE - result['loudness']
+        song['track_peak'] = result['peak']
+        self.loudness_dirty[song['path']] = song
+        self.update_album_gain(song)
+        self.schedule_loudness_save()
+    
+    def schedule_loudness_save(self):
+        if len(self.loudness_dirty) == 1:
+            QTimer.singleShot(2000, self.save_loudness)
+    
+    def update_album_gain(self, song):
+        # album loudness from the analysed tracks, weighted by their gated block counts
+        if not song.get('album'):
+            return
+        key = (song.get('albumartist') or song['artist'], song['album'])
+        tracks = self.loudness_albums.get(key, [])
+        analysed = [s for s in tracks if s.get('loudness') is not None and s.get('blocks')]
+        blocks = sum(s['blocks'] for s in analysed)
+        if not blocks:
+            return
+        energy = sum(s['blocks'] * 10 ** ((s['loudness'] + 0.691) / 10) for s in analysed) / blocks
+        album_gain = REPLAYGAIN_REFERENCE - (-0.691 + 10 * np.log10(energy))
+        album_peak = max(s.get('track_peak') or 0 for s in analysed)
+        for s in analysed:
+            s['album_gain'], s['album_peak'] = float(album_gain), album_peak
+            self.loudness_dirty[s['path']] = s
+    
+    def request_lyrics(self, file_path):
+        # parsed once per track, a few recent ones are kept for going back
+        if file_path in self.lyrics_cache:
+            self.lyrics_cache.move_to_end(file_path)
+            self.now_playing.set_lyrics(self.lyrics_cache[file_path])
+            return
+        
+        def load():
+            try:
+                lyrics = load_lyrics(file_path)
+            except Exception as e:
+                print(f"Error reading lyrics for {file_path}: {e}")
+                lyrics = None
+            self.bridge.finished.emit('lyrics', (file_path, lyrics))
+        
+        threading.Thread(target=load, name="lyrics", daemon=True).start()
+    
+    def apply_lyrics(self, file_path, lyrics):
+        self.lyrics_cache[file_path] = lyrics
+        while len(self.lyrics_cache) > 8:
+            self.lyrics_cache.popitem(last=False)
+        if self.now_playing.current_path == file_path:
+            self.now_playing.set_lyrics(lyrics)
+    
+    def request_waveform(self, file_path):
+        song_info = self.songs_by_path.get(file_path)
+        if song_info is None:
+            return
+        cache = waveform_cache_path(song_info)
+        try:
+            peaks = np.fromfile(cache, np.uint8)
+            if not peaks.size or peaks.size % 2 or peaks.size > 2 * WAVEFORM_BUCKETS:
+                raise ValueError(f"{peaks.size} bytes")
+            self.now_playing.set_waveform(peaks.reshape(2, -1))
+            return
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            # truncated or damaged, drop it and compute the waveform again
+            print(f"Error reading waveform cache for {file_path}: {e}")
+            cache.unlink(missing_ok=True)
+        self.submit_task('waveform', compute_waveform, file_path, pool=self.get_interactive_pool())
+    
+    def apply_waveform(self, result):
+        song_info = self.songs_by_path.get(result['path'])
+        if song_info is None or result.get('peaks') is None:
+            return
+        cache = waveform_cache_path(song_info)
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        # written aside and renamed, a crash never leaves half a cache file
+        partial = cache.with_suffix('.part')
+        result['peaks'].tofile(partial)
+        os.replace(partial, cache)
+        if self.now_playing.current_path == result['path']:
+            self.now_playing.set_waveform(result['peaks'])
+    
+    def save_loudness(self):
+        if self.loudness_dirty:
+            self.roots.save_loudness(list(self.loudness_dirty.values()))
+            self.loudness_dirty.clear()
     
     def extract_metadata(self, file_path):
         try:
-            audio = MutagenFile(file_path)
-            if audio is None:
-                return None
-            
-            title = "Unknown Title"
-            artist = "Unknown Artist"
-            album_art = None
-            
-            # extract title and artist
-            if hasattr(audio, 'tags') and audio.tags:
-                title = str(audio.tags.get('TIT2', audio.tags.get('title', [Path(file_path).stem]))[0])
-                artist = str(audio.tags.get('TPE1', audio.tags.get('artist', ['Unknown Artist']))[0])
-                
-                # extract album art
-                if isinstance(audio.tags, ID3):
-                    for tag in audio.tags.values():
-                        if isinstance(tag, APIC):
-                            album_art = tag.data
-                            break
-            elif isinstance(audio, MP4):
-                title = audio.tags.get('\xa9nam', [Path(file_path).stem])[0]
-                artist = audio.tags.get('\xa9ART', ['Unknown Artist'])[0]
-                if 'covr' in audio.tags:
-                    album_art = bytes(audio.tags['covr'][0])
-            elif isinstance(audio, FLAC):
-                title = audio.get('title', [Path(file_path).stem])[0]
-                artist = audio.get('artist', ['Unknown Artist'])[0]
-                if audio.pictures:
-                    album_art = audio.pictures[0].data
-            else:
-                title = Path(file_path).stem
-            
-            return {
-                'title': title,
-                'artist': artist,
-                'path': file_path,
-                'album_art': album_art
-            }
+            return self.read_metadata(file_path)
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+            return None
+    
+    def read_metadata(self, file_path):
+        # like extract_metadata, but an unreadable file raises with the reason
+        if self.fast_scan:
+            try:
+                tags = read_header_tags(file_path)
+            except Exception:
+                tags = None  # let the full parser decide and report
+            if tags is not None:
+                return self.song_from_tags(file_path, tags)
+        return self.read_metadata_full(file_path)
+    
+    def song_from_tags(self, file_path, tags):
+        fields = tags['fields']
+        art_offset, art_length = tags['art'] or (None, None)
+        song_info = {
+            'title': fields.get('title') or Path(file_path).stem,
+            'artist': fields.get('artist') or 'Unknown Artist',
+            'album': fields.get('album', ''),
+            'albumartist': fields.get('albumartist', ''),
+            'tracknumber': fields.get('tracknumber', ''),
+            'date': fields.get('date', ''),
+            'genre': fields.get('genre', ''),
+            'duration': tags['duration'],
+            'format': Path(file_path).suffix[1:].upper(),
+            'path': file_path,
+            'album_art': None,
+            'art_key': file_path if tags['art'] else None,
+            'art_offset': art_offset,
+            'art_length': art_length
+        }
+        song_info.update(loudness_from_fields(fields))
+        return song_info
+    
+    def extract_metadata_full(self, file_path):
+        try:
+            return self.read_metadata_full(file_path)
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
             return None
     
+    def read_metadata_full(self, file_path):
+        # mutagen fallback for anything the header readers can't take
+        audio = MutagenFile(file_path)
+        if audio is None:
+            raise ValueError("not an audio format mutagen knows")
+        
+        fields = {}
+        album_art = None
+        
+        # container-specific tags first, the generic branch would shadow them
+        if isinstance(audio, MP4):
+            tags = audio.tags or {}
+            for atom, field in MP4_FIELDS.items():
+                values = tags.get(atom.decode('latin-1'))
+                if values:
+                    value = values[0]
+                    fields[field] = str(value[0] if isinstance(value, tuple) else value)
+            for field in LOUDNESS_FIELDS:
+                values = tags.get('----:com.apple.iTunes:' + field)
+                if values:
+                    fields[field] = bytes(values[0]).decode('utf-8', 'replace')
+            if 'covr' in tags:
+                album_art = bytes(tags['covr'][0])
+        elif isinstance(audio.tags, ID3):
+            for frame_id, field in ID3_TEXT_FRAMES.items():
+                if frame_id in audio.tags and field not in fields:
+                    fields[field] = str(audio.tags[frame_id].text[0])
+            for frame in audio.tags.getall('TXXX'):
+                if frame.desc.lower() in LOUDNESS_FIELDS:
+                    fields[frame.desc.lower()] = str(frame.text[0])
+            for tag in audio.tags.values():
+                if isinstance(tag, APIC):
+                    album_art = tag.data
+                    break
+        elif audio.tags:
+            # vorbis comments (flac, ogg) and other dict-like tags
+            for field in TAG_FIELDS:
+                values = audio.tags.get(field)
+                if values:
+                    fields[field] = str(values[0])
+            pictures = audio.tags.get('metadata_block_picture')
+            if pictures:
+                album_art = Picture(base64.b64decode(pictures[0])).data
+        
+        if isinstance(audio, FLAC) and audio.pictures and not album_art:
+            album_art = audio.pictures[0].data
+        
+        song_info = self.song_from_tags(file_path, {
+            'fields': fields,
+            'art': None,
+            'duration': getattr(audio.info, 'length', None)
+        })
+        song_info['album_art'] = album_art
+        song_info['art_key'] = file_path if album_art else None
+        return song_info
+    
+    def load_album_art(self, art_key):
+        # cover bytes were skipped by the scan or evicted, read them from the file
+        if art_key in self.sidecar_covers:
+            try:
+                with open(art_key, 'rb') as f:
+                    return f.read()
+            except OSError as e:
+                print(f"Error reading {art_key}: {e}")
+                return None
+        song_info = self.songs_by_path.get(art_key)
+        if song_info and song_info.get('art_offset') is not None:
+            try:
+                return read_art_range(art_key, song_info['art_offset'], song_info['art_length'])
+            except OSError as e:
+                print(f"Error reading {art_key}: {e}")
+                return None
+        song_info = self.extract_metadata_full(art_key)
+        return song_info['album_art'] if song_info else None
+    
+    def memory_report(self):
+        return self.memory.report()
+    
+    def track_loaded(self, file_path):
+        self.history.log('load', file_path)
+        song = self.songs_by_path.get(file_path)
+        if song is not None:
+            song['last_played'] = time.time()
+        self.history_timer.start()
+    
+    def track_played(self, file_path):
+        self.history.log('complete', file_path)
+        song = self.songs_by_path.get(file_path)
+        if song is None:
+            return
+        song['play_count'] = (song.get('play_count') or 0) + 1
+        song['last_played'] = time.time()
+        self.smart_playlists.update(song)
+        self.playlists_page.library_changed()
+        self.history_timer.start()
+    
+    def update_history_sections(self):
+        # a handful of dict lookups, the log itself is never read here
+        recent = [self.songs_by_path.get(path) for path in self.history.recently_played(6)]
+        repeat = [self.songs_by_path.get(path) for path in self.history.on_repeat(6)]
+        self.home_page.set_section("Recently played", [song for song in recent if song])
+        self.home_page.set_section("On repeat", [song for song in repeat if song])
+    
+    def lookup_path(self, path):
+        song = self.songs_by_path.get(path)
+        if song is None and os.path.normcase(path) != path:
+            # case-insensitive filesystems: playlists may spell paths differently
+            if self.normalized_paths is None:
+                self.normalized_paths = {os.path.normcase(p): s for p, s in self.songs_by_path.items()}
+            song = self.normalized_paths.get(os.path.normcase(path))
+        return song
+    
+    def import_playlist(self, path, save=True):
+        importer = PlaylistImporter(path, self.lookup_path, parent=self)
+        importer.finished.connect(lambda playlist: self.finish_import(importer, playlist, save))
+        self.importers.append(importer)
+        importer.start()
+    
+    def finish_import(self, importer, playlist, save):
+        self.importers.remove(importer)
+        importer.deleteLater()
+        self.playlists.add(playlist, save=save)
+        self.playlists_page.library_changed()
+        if save:
+            message = f"Imported {len(playlist.tracks)} of {len(playlist.entries)} entries from {Path(playlist.source).name}"
+            if playlist.unresolved:
+                report = self.playlists.folder / f"{playlist.name}.unresolved.txt"
+                report.write_text("".join(entry + "\n" for entry in playlist.unresolved), encoding='utf-8')
+                message += f", {len(playlist.unresolved)} not found (listed in {report})"
+                print(message)
+            self.playlists_page.status.setText(message)
+    
+    def refresh_relative_playlists(self):
+        if self.music_library and self.scanner is None:
+            self.smart_playlists.evaluate(self.roots, self.songs_by_path, relative_only=True)
+            self.playlists_page.library_changed()
+    
+    def open_paths(self, paths):
+        # from the command line or another launch: files play, a folder is scanned
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
+        files = [path for path in paths if os.path.isfile(path)]
+        folders = [path for path in paths if os.path.isdir(path)]
+        playing = bool(files) and self.play_file(files[0])
+        if folders:
+            folder = folders[-1]
+            if playing:
+                # the scan floods the gui thread with cards, let the file get going first
+                self.after_first_audio(lambda: self.load_music_folder(folder))
+            else:
+                self.load_music_folder(folder)
+    
+    def after_first_audio(self, callback, timeout_ms=2000):
+        # once the player reports a position, or after timeout_ms if it never does
+        player = self.now_playing.player
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        done = []
+        
+        def run(position=1):
+            if position <= 0 or done:
+                return
+            done.append(True)
+            timer.stop()
+            player.positionChanged.disconnect(run)
+            callback()
+        
+        timer.timeout.connect(run)
+        player.positionChanged.connect(run)
+        timer.start(timeout_ms)
+    
+    def play_file(self, file_path):
+        if file_path in self.songs_by_path:
+            self.play_song(file_path)
+            return True
+        # not in the library (yet): only this file's tags are read
+        song_info = self.extract_metadata(file_path)
+        if song_info is None:
+            return False
+        self.memory.put_art(song_info['art_key'], song_info.pop('album_art'))
+        self.now_playing.current_index = -1
+        self.now_playing.load_song(file_path, song_info['title'], song_info['artist'], song_info['art_key'])
+        return True
+    
     def play_song(self, file_path):
         # find song info and index
         for idx, song_info in enumerate(self.music_library):
@@ -706,12 +5069,63 @@ class MainWindow(QMainWindow):
                     file_path,
                     song_info['title'],
                     song_info['artist'],
-                    song_info['album_art']
+                    song_info['art_key']
                 )
                 break
 
+def index_command(flag, path):
+    # `main.py --export-index FILE` / `--import-index FILE`, without a window.
+    # "-" is stdout/stdin
+    roots = LibraryRoots(DATA_DIR / "roots.json", DATA_DIR / "shards", legacy_db=DATA_DIR / "library.db")
+    try:
+        if flag == '--export-index':
+            if path == '-':
+                count = roots.export_jsonl(sys.stdout)
+            else:
+                with open(path, 'w', encoding='utf-8') as out:
+                    count = roots.export_jsonl(out)
+            print(f"Exported {count} tracks from {len(roots.entries)} library folders", file=sys.stderr)
+        else:
+            if path == '-':
+                imported, skipped = roots.import_jsonl(sys.stdin)
+            else:
+                with open(path, encoding='utf-8') as lines:
+                    imported, skipped = roots.import_jsonl(lines)
+            print(f"Imported {imported} tracks, skipped {skipped}", file=sys.stderr)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error with {path}: {e}")
+        return 1
+    return 0
+
 if __name__ == "__main__":
+    # the library is kept sorted with bisect's key argument (3.10). older
+    # pythons would get as far as the first mount or scan and crash there
+    if sys.version_info < (3, 10):
+        sys.exit("MyMusic needs Python 3.10 or higher")
+    if len(sys.argv) == 3 and sys.argv[1] in ('--export-index', '--import-index'):
+        sys.exit(index_command(*sys.argv[1:]))
+    paths = [os.path.abspath(arg) for arg in sys.argv[1:] if not arg.startswith('-')]
+    instance = None
+    if os.environ.get("MYMUSIC_SINGLE_INSTANCE", "1") != "0":
+        instance = SingleInstance()
+        if instance.forward(paths):
+            sys.exit(0)
     app = QApplication(sys.argv)
+    if instance:
+        instance.listen()
     window = MainWindow()
+    if instance:
+        instance.received.connect(window.open_paths)
+    if os.environ.get("MYMUSIC_TRACE_STARTUP") == "1":
+        # wall clock stamps for bench.py, which measures from before it launched us
+        def first_audio(position):
+            if position > 0:
+                window.now_playing.player.positionChanged.disconnect(first_audio)
+                print(f"startup: first audio at {time.time():.6f}", flush=True)
+        window.now_playing.player.positionChanged.connect(first_audio)
     window.show()
+    if os.environ.get("MYMUSIC_TRACE_STARTUP") == "1":
+        print(f"startup: window shown at {time.time():.6f}", flush=True)
+    # a file starts playing from its own tags before a folder scan is started
+    window.open_paths(paths)
     sys.exit(app.exec())
@@ -0,0 +1,327 @@
+from string import Template
+
+# colours live here only. widgets in main.py carry an object name or a
+# "role" property and the one application style sheet below styles them all,
+# so qt parses css once instead of once per card and button
+
+PALETTES = {
+    'dark': {
+        'window': '#121212',
+        'sidebar': '#000000',
+        'surface': '#181818',
+        'raised': '#282828',
+        'hover': '#333333',
+        'text': '#ffffff',
+        'muted': '#b3b3b3',
+        'faint': '#6a6a6a',
+        'disabled': '#535353',
+        'track': '#4d4d4d',
+        'handle': '#ffffff',
+        'accent': '#1db954',
+        'accent_hover': '#1ed760',
+        'accent_text': '#ffffff',
+        'input': '#ffffff',
+        'input_text': '#000000',
+        'overlay': 'rgba(0,0,0,0.7)',
+        'overlay_hover': 'rgba(40,40,40,0.9)',
+        'control_hover': 'rgba(255,255,255,0.1)',
+    },
+    'light': {
+        'window': '#ffffff',
+        'sidebar': '#f2f2f2',
+        'surface': '#f6f6f6',
+        'raised': '#e4e4e4',
+        'hover': '#d8d8d8',
+        'text': '#121212',
+        'muted': '#5e5e5e',
+        'faint': '#9a9a9a',
+        'disabled': '#c4c4c4',
+        'track': '#c8c8c8',
+        'handle': '#121212',
+        'accent': '#1db954',
+        'accent_hover': '#179c47',
+        'accent_text': '#ffffff',
+        'input': '#ececec',
+        'input_text': '#000000',
+        'overlay': 'rgba(0,0,0,0.06)',
+        'overlay_hover': 'rgba(0,0,0,0.12)',
+        'control_hover': 'rgba(0,0,0,0.08)',
+    },
+}
+
+STYLESHEET = Template("""
+/* only the window, sidebar, cards and views paint a background, the rest
+   shows what is behind it */
+QMainWindow {
+    background-color: $window;
+}
+QLabel {
+    color: $text;
+}
+
+/* sidebar */
+#sidebar {
+    background-color: $sidebar;
+}
+#logo {
+    color: $text;
+    font-size: 24px;
+    font-weight: bold;
+    margin-bottom: 20px;
+}
+QPushButton[role="nav"] {
+    background-color: transparent;
+    color: $muted;
+    border: none;
+    text-align: left;
+    padding: 8px;
+    font-size: 14px;
+}
+QPushButton[role="nav"]:hover {
+    color: $text;
+}
+#folderButton {
+    background-color: $accent;
+    color: $accent_text;
+    border: none;
+    padding: 10px;
+    border-radius: 20px;
+    font-size: 13px;
+    font-weight: bold;
+}
+#folderButton:hover {
+    background-color: $accent_hover;
+}
+
+/* top bar */
+QPushButton[role="history"] {
+    background-color: $overlay;
+    border-radius: 16px;
+    color: $text;
+    font-size: 14px;
+}
+QPushButton[role="history"]:hover {
+    background-color: $overlay_hover;
+}
+QPushButton[role="history"]:disabled {
+    color: $disabled;
+}
+
+/* pages */
+QLabel[role="pageTitle"] {
+    color: $text;
+    font-size: 28px;
+    font-weight: bold;
+    margin-bottom: 20px;
+}
+QLabel[role="sectionTitle"] {
+    color: $text;
+    font-size: 20px;
+    font-weight: bold;
+}
+QLabel[role="caption"] {
+    color: $muted;
+    font-size: 12px;
+}
+QScrollArea, QScrollArea > QWidget > QWidget {
+    border: none;
+    background-color: $window;
+}
+QScrollBar:vertical {
+    background-color: $window;
+    width: 12px;
+}
+QScrollBar::handle:vertical {
+    background-color: $raised;
+    border-radius: 6px;
+}
+#searchInput {
+    background-color: $input;
+    border: none;
+    border-radius: 20px;
+    padding: 12px 20px;
+    font-size: 14px;
+    color: $input_text;
+}
+#searchSummary {
+    color: $muted;
+    font-size: 16px;
+}
+QTableView {
+    background-color: $window;
+    color: $text;
+    border: none;
+    selection-background-color: $raised;
+    font-size: 13px;
+}
+QHeaderView::section {
+    background-color: $window;
+    color: $muted;
+    border: none;
+    border-bottom: 1px solid $raised;
+    padding: 6px;
+}
+QListWidget {
+    background-color: $window;
+    color: $text;
+    border: none;
+    font-size: 13px;
+}
+QListWidget::item {
+    padding: 6px;
+}
+QListWidget::item:selected {
+    background-color: $raised;
+}
+QPushButton[role="pill"] {
+    background-color: $raised;
+    color: $text;
+    border: none;
+    padding: 8px 16px;
+    border-radius: 16px;
+    font-size: 13px;
+}
+QPushButton[role="pill"]:hover {
+    background-color: $hover;
+}
+QDialog {
+    background-color: $window;
+}
+QPlainTextEdit {
+    background-color: $surface;
+    color: $text;
+    border: none;
+    font-family: monospace;
+    font-size: 12px;
+}
+QMenu {
+    background-color: $raised;
+    color: $text;
+    padding: 4px;
+}
+QMenu::item {
+    padding: 6px 16px;
+}
+QMenu::item:selected {
+    background-color: $hover;
+}
+#groupCover {
+    background-color: $raised;
+    border-radius: 8px;
+    font-size: 48px;
+}
+#groupName {
+    color: $text;
+    font-size: 22px;
+    font-weight: bold;
+}
+#groupStats {
+    color: $muted;
+    font-size: 13px;
+}
+
+/* cards */
+MusicCard {
+    background-color: $surface;
+    border-radius: 8px;
+}
+MusicCard:hover {
+    background-color: $raised;
+}
+#cardArt {
+    background-color: $raised;
+    border-radius: 8px;
+    font-size: 48px;
+}
+#cardTitle {
+    color: $text;
+    font-weight: bold;
+    font-size: 13px;
+}
+
+/* now playing */
+#albumThumb {
+    background-color: $raised;
+    border-radius: 4px;
+    font-size: 24px;
+}
+#songTitle {
+    color: $text;
+    font-size: 14px;
+    font-weight: 500;
+}
+#lyricsLine {
+    color: $text;
+    font-size: 13px;
+}
+#lyricsNext {
+    color: $faint;
+    font-size: 12px;
+}
+#volumeIcon {
+    color: $muted;
+}
+QLabel[role="time"] {
+    color: $muted;
+    font-size: 11px;
+}
+QPushButton[role="control"] {
+    background-color: transparent;
+    border: none;
+    color: $muted;
+    font-size: 22px;
+    border-radius: 15px;
+}
+QPushButton[role="control"]:hover {
+    color: $text;
+    background-color: $control_hover;
+}
+#playButton {
+    font-size: 28px;
+    border-radius: 18px;
+}
+QSlider::groove:horizontal {
+    background: $track;
+    height: 4px;
+    border-radius: 2px;
+}
+QSlider::handle:horizontal {
+    background: $handle;
+    width: 12px;
+    height: 12px;
+    margin: -4px 0;
+    border-radius: 6px;
+}
+QSlider::sub-page:horizontal {
+    background: $accent;
+    border-radius: 2px;
+}
+/* groove left clear so the waveform painted underneath shows */
+QSlider[waveform="true"]::groove:horizontal {
+    background: transparent;
+    height: 24px;
+}
+QSlider[waveform="true"]::handle:horizontal {
+    width: 4px;
+    height: 24px;
+    margin: 0;
+    border-radius: 2px;
+}
+QSlider[waveform="true"]::sub-page:horizontal {
+    background: transparent;
+}
+""")
+
+# the palette in use, for what is painted by hand rather than styled
+colors = dict(PALETTES['dark'])
+
+def stylesheet(name='dark'):
+    return STYLESHEET.substitute(PALETTES[name])
+
+def apply(app, name='dark'):
+    if name not in PALETTES:
+        print(f"Unknown theme {name!r}, using dark")
+        name = 'dark'
+    colors.clear()
+    colors.update(PALETTES[name])
+    app.setStyleSheet(stylesheet(name))